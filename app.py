@@ -1,6 +1,5 @@
 import os
 import gradio as gr
-import configparser
 from fastapi import FastAPI, Request, Response
 import logging
 import sys
@@ -11,15 +10,25 @@ import gc
 import torch
 import cv2
 
+from utils.delta_updater import get_updater, recover_pending_update
+
+# 上次更新在替换文件中途退出时，先按日志回滚，再导入项目内的其他模块
+recover_pending_update()
+
 # 移除直接导入human_base核心模块，改为使用generate_video.py中的domake方法
 from utils.video_processor import (
     download_and_extract_text,
 )
-from utils.key_manager import (
-    save_api_key,
-    delete_api_key,
-    refresh_api_key,
-)
+from utils.batch_text_extractor import extract_texts_from_links
+from utils.asr_service import get_asr_service
+from utils.memory_governor import get_governor, governed, track_service
+from utils.worker_queue import create_worker_router, worker_token_configured
+from utils.rest_api import create_api_router, register_task, api_token_configured
+from utils.config_service import get_config, get_config_service
+from utils.task_runner import stream_handler, gpu_bound, RESOURCE_LIMITS
+from utils.pipeline_scheduler import pipeline_stage, staged_flow
+from utils.tracing import instrument, get_summary, get_job_spans
+from utils import key_manager
 from utils.voice_processor import (
     run_GPTvoice_command,
     handle_audio_creation,
@@ -45,16 +54,16 @@ from utils.service_launcher import (
 from utils.video_cover_image import (
     generate_cover_image_gui,
 )
+from utils.video_cover_batch import generate_cover_candidates, remember_rendered_cover, select_cover_candidate
 from ai_processing.text_rewriter import (
     AI_write_descriptions,
     execute_rewrite,
 )
 from video_tools.generate_video import get_trained_models, generate_tuilionnx_video, get_face_list, refresh_face_list
 
-from video_tools.subtitle_utils import (
-    add_subtitles_to_video_with_style,
-    FONT_FAMILIES,
-)
+from video_tools.font_index import get_font_families, warm_up_renderer
+from video_tools.transcode_variants import PLATFORM_VARIANTS, transcode_variants
+from video_tools.upload_preflight import PLATFORM_LIMITS, checked_publisher, preflight
 from video_tools.publisher import (
     auto_publishing_videos_DY,
     auto_publishing_videos_XHS,
@@ -70,6 +79,59 @@ logging.basicConfig(
     handlers=[logging.StreamHandler(sys.stdout)],
 )
 
+def add_subtitles_to_video_with_style(*args, **kwargs):
+    """添加字幕（首次使用时才导入 subtitle_utils）
+
+    subtitle_utils 导入时会枚举一遍系统字体。字体下拉框使用缓存的字体列表，
+    这里延迟导入，启动后由 warm_up_renderer 在后台提前导入。
+    """
+    from video_tools.subtitle_utils import add_subtitles_to_video_with_style as _add_subtitles
+
+    return _add_subtitles(*args, **kwargs)
+
+
+# 为各阶段函数加上追踪（同时替换各模块内部对这些函数的引用）
+instrument(
+    {
+        "download_and_extract_text": download_and_extract_text,
+        "extract_texts_from_links": extract_texts_from_links,
+        "execute_rewrite": execute_rewrite,
+        "AI_write_descriptions": AI_write_descriptions,
+        "handle_audio_creation": handle_audio_creation,
+        "generate_tuilionnx_video": generate_tuilionnx_video,
+        "generate_subtitle_only": generate_subtitle_only,
+        "add_subtitles_to_video_with_style": add_subtitles_to_video_with_style,
+        "add_bgm_to_video_function": add_bgm_to_video_function,
+        "add_bgm_to_video_function_with_random_choice": add_bgm_to_video_function_with_random_choice,
+        "generate_cover_image_gui": generate_cover_image_gui,
+        "generate_cover_candidates": generate_cover_candidates,
+        "auto_publishing_videos_DY": auto_publishing_videos_DY,
+        "auto_publishing_videos_XHS": auto_publishing_videos_XHS,
+        "auto_publishing_videos_SPH": auto_publishing_videos_SPH,
+        "auto_publishing_videos_ALL": auto_publishing_videos_ALL,
+        "auto_publishing_videos_DY_ALL": auto_publishing_videos_DY_ALL,
+    },
+    # 一键流程中调用的各阶段交给流水线调度器按资源类别执行（见 pipeline_scheduler.staged_flow），
+    # 多个一键流程的不同阶段可以重叠；GPU阶段另外占用GPU名额，与界面上的GPU任务互斥。
+    # 两个GPU阶段的模型由编译模块自行加载，按阶段登记到内存管理，开始前先腾出显存
+    decorators={
+        "download_and_extract_text": pipeline_stage("llm"),
+        "extract_texts_from_links": pipeline_stage("llm"),
+        "execute_rewrite": pipeline_stage("llm"),
+        "AI_write_descriptions": pipeline_stage("llm"),
+        "handle_audio_creation": lambda fn: pipeline_stage("tts_gpu")(gpu_bound(governed("tts")(fn))),
+        "generate_tuilionnx_video": lambda fn: pipeline_stage("lipsync_gpu")(gpu_bound(governed("lipsync")(fn))),
+        "add_bgm_to_video_function": pipeline_stage("encode_cpu"),
+        "add_bgm_to_video_function_with_random_choice": pipeline_stage("encode_cpu"),
+        "generate_cover_image_gui": pipeline_stage("encode_cpu"),
+        "auto_publishing_videos_DY": pipeline_stage("browser"),
+        "auto_publishing_videos_XHS": pipeline_stage("browser"),
+        "auto_publishing_videos_SPH": pipeline_stage("browser"),
+        "auto_publishing_videos_ALL": pipeline_stage("browser"),
+        "auto_publishing_videos_DY_ALL": staged_flow,
+    },
+)
+
 #设置human_base的初始变量
 if_gfpgan_default = True
 if_res_default = False
@@ -103,6 +165,167 @@ def refresh_background_images():
     return gr.update(choices=choices)
 
 
+def save_api_key(new_key):
+    """保存 API Key（key_manager 写入 config.ini 后立即刷新配置快照）"""
+    result = key_manager.save_api_key(new_key)
+    get_config_service().reload()
+    return result
+
+
+def delete_api_key(key):
+    """删除 API Key（key_manager 写入 config.ini 后立即刷新配置快照）"""
+    result = key_manager.delete_api_key(key)
+    get_config_service().reload()
+    return result
+
+
+def refresh_api_key():
+    get_config_service().reload()
+    return key_manager.refresh_api_key()
+
+
+def register_api_tasks():
+    """登记 /api/v1 可调用的任务（参数按处理函数的位置参数顺序）"""
+    register_task(
+        "extract_text", "提取文案", "network", extract_texts_from_links,
+        ["link"], ["text"],
+    )
+    register_task(
+        "audio", "音频生成", "gpu", handle_audio_creation,
+        ["text", "voice", ("speed", 1)], ["audio", "status"], pipeline_resource="tts_gpu",
+        worker_kind="tts", file_outputs=("audio",),
+    )
+    register_task(
+        "lipsync", "数字人视频生成", "gpu", generate_tuilionnx_video,
+        [
+            "face", ("video", None), "audio", ("batch_size", 4), ("sync_offset", 0),
+            ("scale_h", 1.6), ("scale_w", 3.6), ("compress", False), ("beautify_teeth", False),
+            ("silence", False), ("watermark", True), ("background_image", None),
+            ("background_image_list", None), ("replace_background", False),
+        ],
+        ["video", "time", "file", "url"],
+        worker_kind="lipsync", file_params=("video", "audio", "background_image"), file_outputs=("video",),
+    )
+    register_task(
+        "subtitle", "添加字幕", "cpu", add_subtitles_to_video_with_style,
+        [
+            "video", ("font_family", None), ("font_size", 11), ("font_color", "#FFFFFF"),
+            ("outline_color", "#000000"), ("bottom_margin", 60),
+        ],
+        ["status", "video"], file_outputs=("video",),
+    )
+    register_task(
+        "transcode", "平台转码", "cpu", transcode_variants,
+        ["video", ("platforms", None)], ["variants"],
+        worker_kind="encode", file_params=("video",), file_outputs=("variants",),
+    )
+    register_task(
+        "publish_all", "发布到各平台", "network", publish_all_with_variants,
+        ["video", "text", ("with_cover", False), ("use_variants", False), ("cover", None)], ["status"],
+        pipeline_resource="browser",
+    )
+    # 一键流程与界面按钮一样单独成组，内部各阶段再交给对应资源类别（见 staged_flow）
+    register_task(
+        "one_click", "一键追爆款", "pipeline", auto_publishing_videos_DY_ALL,
+        [
+            "link", ("text", ""), "voice", "video_model", ("api_key", None), ("speed", 1),
+            ("pt_files_info", ""), ("background_image", None), ("background_image_list", None),
+            ("replace_background", False), ("skip_bgm", False), ("bgm", None), ("user_bgm", None),
+            ("bgm_volume", 0.5), ("auto_cover", False), ("use_ai_cover_text", False),
+            ("cover_text", ""), ("highlight_words", ""), ("cover_font_family", None),
+            ("cover_font_size", 60), ("cover_font_color", "#FFFFFF"),
+            ("cover_highlight_color", "#FFD600"), ("cover_position", "bottom"),
+            ("cover_frame_time", None), ("publish_with_cover", False), ("silence", False),
+            ("digital_human_version", "新版数字人"), ("subtitle_type", "高级字幕生成"),
+            ("template_id", None),
+        ],
+        ["status"],
+        pipeline_resource="pipeline",
+    )
+
+
+def publish_all_with_variants(video_path, text, with_cover, use_variants, cover_path=None):
+    """一键发布到各平台，可选按平台规格分别转码后再上传
+
+    Args:
+        video_path: 渲染好的视频
+        text: 标题和描述
+        with_cover: 是否附带封面
+        use_variants: 是否按平台规格转码
+        cover_path: 附带的封面图片（封面预览中的图片），用于发布前检查尺寸
+
+    Returns:
+        str: 各平台发布结果
+    """
+    if not use_variants:
+        # 同一文件上传到所有平台，先按各平台限制检查
+        problems = []
+        for platform in ("DY", "XHS", "SPH"):
+            found = preflight(video_path, platform, cover_path if with_cover else None)
+            if found:
+                problems.append(f"{PLATFORM_LIMITS[platform]['label']}: {'；'.join(found)}")
+        if problems:
+            return "发布前检查未通过\n" + "\n".join(problems)
+        return auto_publishing_videos_ALL(video_path, text, with_cover)
+    try:
+        variants = transcode_variants(video_path, ["DY", "XHS", "SPH"])
+    except Exception as e:
+        logging.error(f"多平台转码失败，改为上传同一文件: {e}")
+        return auto_publishing_videos_ALL(video_path, text, with_cover)
+
+    publishers = {
+        "DY": checked_publisher("DY", auto_publishing_videos_DY),
+        "XHS": checked_publisher("XHS", auto_publishing_videos_XHS),
+        "SPH": checked_publisher("SPH", auto_publishing_videos_SPH),
+    }
+    results = []
+    for platform, publish in publishers.items():
+        label = PLATFORM_VARIANTS[platform]["label"]
+        try:
+            results.append(f"{label}: {publish(variants[platform], text, with_cover, cover_path)}")
+        except Exception as e:
+            results.append(f"{label}: 发布失败 {e}")
+    return "\n".join(results)
+
+
+def check_for_updates():
+    """检查更新：配置了增量更新清单时只对比文件哈希，否则使用原有的整包更新
+
+    Returns:
+        tuple: 更新信息和对话框可见性更新
+    """
+    updater = get_updater()
+    if updater is None:
+        return update_platform_elements()
+    try:
+        plan = updater.check()
+    except Exception as e:
+        logging.warning(f"增量更新检查失败，改用整包更新: {e}")
+        return update_platform_elements()
+    has_changes = bool(plan["changed"] or plan["deleted"])
+    return updater.describe(plan, updater.local.version), gr.update(visible=has_changes)
+
+
+def run_update():
+    """确认更新：增量更新在后台线程执行，这里每秒推送一次进度
+
+    Yields:
+        tuple: 更新状态和对话框可见性更新
+    """
+    updater = get_updater()
+    if updater is None or updater.last_plan is None:
+        yield do_update()
+        return
+    if not updater.start(updater.last_plan):
+        yield "已有更新正在进行", gr.update(visible=False)
+        return
+    yield updater.progress, gr.update(visible=False)
+    while updater.running:
+        time.sleep(1)
+        yield updater.progress, gr.update()
+    yield updater.progress, gr.update()
+
+
 def cancel_update():
     """取消更新操作
 
@@ -121,16 +344,22 @@ def create_ui():
     # 禁用Gradio分析功能
     os.environ["GRADIO_ANALYTICS_ENABLED"] = "False"
 
+    # 字体列表与 subtitle_utils.FONT_FAMILIES 一致，字体未变化时使用缓存，不导入 subtitle_utils
+    FONT_FAMILIES = get_font_families()
+    warm_up_renderer()
+
     with gr.Blocks(title="罗根 一键追爆智能体", analytics_enabled=False) as demo:
         app = demo.app
 
         from fastapi.middleware.cors import CORSMiddleware
         from fastapi.staticfiles import StaticFiles
 
+        # 跨域来源由 [api] cors_origins（逗号分隔）指定；未指定时允许所有源，但不携带凭据
+        cors_origins = get_config().getlist("api", "cors_origins")
         app.add_middleware(
             CORSMiddleware,
-            allow_origins=["*"],  # 允许所有源
-            allow_credentials=True,
+            allow_origins=cors_origins or ["*"],
+            allow_credentials=bool(cors_origins),
             allow_methods=["*"],
             allow_headers=["*"],
         )
@@ -149,6 +378,39 @@ def create_ui():
                     return response
             return await call_next(request)
 
+        # 语音识别服务的延迟与实时率统计
+        @app.get("/asr/metrics")
+        async def asr_metrics():
+            return get_asr_service().get_metrics()
+
+        # 模型显存/内存占用与预算
+        @app.get("/memory/usage")
+        async def memory_usage():
+            return get_governor().usage()
+
+        # 分阶段耗时汇总（详细记录见 logs/traces/）
+        @app.get("/trace/summary")
+        async def trace_summary():
+            return get_summary()
+
+        @app.get("/trace/jobs/{job_id}")
+        async def trace_job(job_id: str):
+            return {"job_id": job_id, "spans": get_job_spans(job_id)}
+
+        # 分布式渲染：渲染节点（worker_node.py）从这里注册、拉取任务、上传产物；
+        # 节点接口可以下载任务输入、写入产物，必须先在 [worker] 段设置 token
+        if worker_token_configured():
+            app.include_router(create_worker_router())
+        else:
+            logging.warning("config.ini 未设置 [worker] token，分布式渲染接口 /cluster 未启用")
+
+        # REST/JSON 批量任务接口（/api/v1），参数名与默认值对应界面上的组件
+        if api_token_configured():
+            register_api_tasks()
+            app.include_router(create_api_router())
+        else:
+            logging.warning("config.ini 未设置 [api] token，批量任务接口 /api/v1 未启用")
+
         with gr.Group(visible=False) as main_interface:  # 将整个界面包装在不可见组中
             with gr.Row():
                 with gr.Column():
@@ -192,11 +454,7 @@ def create_ui():
                                     delete_api_key_button = gr.Button("删除API Key")
 
                                     # 读取配置,选择API Key
-                                    config = configparser.ConfigParser()
-                                    config.read("config.ini", encoding="utf-8")
-                                    keys = config.get("deepseek_apikey", "key").split(
-                                        ","
-                                    )
+                                    keys = get_config().getlist("deepseek_apikey", "key")
                                     default_key = keys[0] if keys else None
                                     # 添加key选择下拉框
                                     api_key = gr.Dropdown(
@@ -452,7 +710,19 @@ def create_ui():
                         "生成封面图", variant="primary", interactive=True
                     )
                 with gr.Row():
-                    cover_preview = gr.Image(label="封面预览", interactive=False)
+                    cover_candidate_count = gr.Number(
+                        value=4, label="候选封面数量", minimum=1, maximum=12, interactive=True
+                    )
+                    generate_cover_candidates_btn = gr.Button(
+                        "批量生成候选封面", interactive=True
+                    )
+                with gr.Row():
+                    cover_preview = gr.Image(label="封面预览", interactive=False, type="filepath")
+                with gr.Row():
+                    cover_candidates_gallery = gr.Gallery(
+                        label="候选封面（点击选为发布封面）", columns=4, interactive=False
+                    )
+                    cover_candidate_paths = gr.State([])
                 with gr.Row():
                     pulish_with_cover = gr.Checkbox(
                         label="发布时附带封面？", value=False
@@ -466,6 +736,9 @@ def create_ui():
                 Post_on_ALL = gr.Button(
                     "一键发布到各平台", size="large", variant="primary"
                 )
+                publish_variants_check_box = gr.Checkbox(
+                    label="按平台规格分别转码", value=False, interactive=True
+                )
                 # 移除账号输入框（已移除登录系统）
                 account = gr.Textbox(label="默认账号", value="", interactive=False, visible=False)
                 pt_files_info = gr.Textbox(
@@ -531,8 +804,10 @@ def create_ui():
             # 注释掉原有的make_button绑定，保留以备后用
             
             # 绑定新的TuiliONNX数字人生成按钮
+            # 耗时处理交给后台线程池执行，界面按秒推送进度和预计剩余时间；
+            # 按资源类别（gpu/cpu/network）限制并发，渲染任务不阻塞其他轻量操作
             tuilionnx_make_button.click(
-                generate_tuilionnx_video,
+                stream_handler("数字人视频生成", "gpu", generate_tuilionnx_video, 5),
                 inputs=[
                     face,
                     video,
@@ -549,7 +824,9 @@ def create_ui():
                     background_image_list,
                     check_box
                 ],
-                outputs=[video_output, output_time, one_list, output_url]
+                outputs=[video_output, output_time, one_list, output_url, status_output],
+                concurrency_limit=RESOURCE_LIMITS["gpu"],
+                concurrency_id="gpu",
             )
 
             # 调用API 为视频添加具有样式和特效的字幕
@@ -606,6 +883,7 @@ def create_ui():
                     outline_size=4,
                     outline_color="#000000",
                 )
+                remember_rendered_cover(image_path)
                 return image_path
 
             generate_cover_btn.click(
@@ -625,11 +903,75 @@ def create_ui():
                 outputs=[cover_preview],
             )
 
+            # 批量生成候选封面：一次解码视频挑选多个候选时间点，逐个用 generate_cover_image_gui 渲染
+            def handle_generate_cover_candidates(
+                video_path,
+                cover_text_value,
+                highlight_words_value,
+                font_family_value,
+                font_size_value,
+                font_color_value,
+                highlight_color_value,
+                position_value,
+                count_value,
+            ):
+                if not video_path:
+                    return "请先生成或上传视频", [], []
+                if not cover_text_value:
+                    return "请先填写封面文案", [], []
+                paths = generate_cover_candidates(
+                    video_path,
+                    count=int(count_value) if count_value else 4,
+                    use_ai=False,
+                    api_key=None,
+                    text=cover_text_value,
+                    highlight_words=highlight_words_value,
+                    font_family=font_family_value,
+                    font_size=int(font_size_value) if font_size_value else 60,
+                    font_color=font_color_value,
+                    highlight_color=highlight_color_value,
+                    position=position_value,
+                    max_width=0.8,
+                    outline_size=4,
+                    outline_color="#000000",
+                )
+                return f"已生成 {len(paths)} 张候选封面，点击选择发布封面", paths, paths
+
+            # 选中的候选封面复制到发布时上传的封面文件，封面预览显示该文件（发布前检查的也是它）
+            def handle_select_cover_candidate(paths, evt: gr.SelectData):
+                if not paths or evt.index is None or evt.index >= len(paths):
+                    return gr.update(), gr.update(), "未选中候选封面"
+                path = select_cover_candidate(paths[evt.index])
+                return path, True, f"已选择封面: {os.path.basename(paths[evt.index])}"
+
+            generate_cover_candidates_btn.click(
+                handle_generate_cover_candidates,
+                inputs=[
+                    video_output,
+                    cover_text,
+                    highlight_words_text,
+                    font_family_dropdown,
+                    font_size_number,
+                    font_color_picker,
+                    highlight_color_picker,
+                    position_dropdown,
+                    cover_candidate_count,
+                ],
+                outputs=[status_output, cover_candidates_gallery, cover_candidate_paths],
+            )
+            cover_candidates_gallery.select(
+                handle_select_cover_candidate,
+                inputs=[cover_candidate_paths],
+                outputs=[cover_preview, pulish_with_cover, status_output],
+            )
+
             # 将提取文案的函数绑定到按钮点击事件，并指定输入输出
             extract_text_button.click(
-                download_and_extract_text,
+                extract_texts_from_links,
                 inputs=[link_input],
                 outputs=[text_input],
+                concurrency_limit=RESOURCE_LIMITS["network"],
+                concurrency_id="network",
             )
 
             def toggle_controls(mode):
@@ -663,9 +1005,11 @@ def create_ui():
             )
 
             Create_audio.click(
-                handle_audio_creation,
+                stream_handler("音频生成", "gpu", handle_audio_creation, 2, status_index=1),
                 inputs=[text_input, pt_file_dropdown, speed],
                 outputs=[audio_output, status_output],
+                concurrency_limit=RESOURCE_LIMITS["gpu"],
+                concurrency_id="gpu",
             )
             Create_subtitle.click(
                 generate_subtitle_only,
@@ -697,7 +1041,9 @@ def create_ui():
 
             # 一键发布到抖音
             Post_on_DY_ALL.click(
-                auto_publishing_videos_DY_ALL,
+                stream_handler(
+                    "一键追爆款", "pipeline", auto_publishing_videos_DY_ALL, 1, status_index=0
+                ),
                 inputs=[
                     link_input,
                     two_line_input,
@@ -730,11 +1076,16 @@ def create_ui():
                     template_id
                 ],  # 添加新增的组件
                 outputs=[status_output],
+                # 一键流程单独成组：发布阶段不占用GPU的并发名额
+                concurrency_limit=RESOURCE_LIMITS["pipeline"],
+                concurrency_id="pipeline",
             )
 
             # 绑定字幕添加按钮事件
             add_subtitle_btn.click(
-                fn=add_subtitles_to_video_with_style,
+                fn=stream_handler(
+                    "添加字幕", "cpu", add_subtitles_to_video_with_style, 2, status_index=0
+                ),
                 inputs=[
                     video_output,  # 视频路径
                     font_family,  # 字体
@@ -745,32 +1096,36 @@ def create_ui():
                 ],
                 outputs=[status_output, video_output],
                 show_progress=True,  # 显示进度
+                concurrency_limit=RESOURCE_LIMITS["cpu"],
+                concurrency_id="cpu",
             )
 
             # 发布到抖音
             Post_on_DY.click(
-                auto_publishing_videos_DY,
-                inputs=[video_output, two_line_input, pulish_with_cover],
+                checked_publisher("DY", auto_publishing_videos_DY),
+                inputs=[video_output, two_line_input, pulish_with_cover, cover_preview],
                 outputs=[status_output],
             )
             # 发布到小红书
             Post_on_XHS.click(
-                auto_publishing_videos_XHS,
-                inputs=[video_output, two_line_input, pulish_with_cover],
+                checked_publisher("XHS", auto_publishing_videos_XHS),
+                inputs=[video_output, two_line_input, pulish_with_cover, cover_preview],
                 outputs=[status_output],
             )
 
             # 发布到视频号
             Post_on_SPH.click(
-                auto_publishing_videos_SPH,
-                inputs=[video_output, two_line_input, pulish_with_cover],
+                checked_publisher("SPH", auto_publishing_videos_SPH),
+                inputs=[video_output, two_line_input, pulish_with_cover, cover_preview],
                 outputs=[status_output],
             )
 
             # 一键发布到抖音小红书视频号
             Post_on_ALL.click(
-                auto_publishing_videos_ALL,
-                inputs=[video_output, two_line_input, pulish_with_cover],
+                publish_all_with_variants,
+                inputs=[
+                    video_output, two_line_input, pulish_with_cover, publish_variants_check_box, cover_preview
+                ],
                 outputs=[status_output],
             )
 
@@ -794,23 +1149,23 @@ def create_ui():
 
             start_digit_human_button = gr.Button("启动digit_human")
             start_digit_human_button.click(
-                start_digit_human,
+                track_service("digit_human")(start_digit_human),
                 inputs=[account],
                 outputs=[start_info],
             )
             start_cosyvoice_button = gr.Button("启动cosyvoice")
             start_cosyvoice_button.click(
-                start_cosyvoice,
+                track_service("cosyvoice")(start_cosyvoice),
                 inputs=[account],
                 outputs=[start_info],
             )
 
             # 绑定事件
             update_elements_btn.click(
-                fn=update_platform_elements, outputs=[update_info, update_dialog]
+                fn=check_for_updates, outputs=[update_info, update_dialog]
             )
 
-            confirm_btn.click(fn=do_update, outputs=[update_status, update_dialog])
+            confirm_btn.click(fn=run_update, outputs=[update_status, update_dialog])
 
             cancel_btn.click(
                 fn=cancel_update,  # 使用具名函数替代lambda
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+编译模块导入基准测试
+
+对同时存在编译版本（.pyd/.so）和源文件（项目中或 python_source_backup* 备份中）
+的模块，分别在全新的解释器中以两种形式导入，用 -X importtime 取模块自身的导入耗时，
+并可对指定模块运行微基准（timeit）。输出按收益排序的报告，
+selective_compile_to_pyd.py --from-report 可以据此只编译确实有收益的模块。
+
+用法:
+    python benchmark_compiled_imports.py
+    python benchmark_compiled_imports.py --repeat 7 --bench-file import_bench.json
+
+import_bench.json 示例（模块 → timeit 语句，在模块导入后执行，模块名可直接使用）:
+    {"utils.media_cache": "utils.media_cache.video_fingerprint('app.py')"}
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import importlib.machinery
+
+REPORT_DIR = os.path.join("logs", "benchmarks")
+BACKUP_DIRS = ("python_source_backup_selective", "python_source_backup")
+SKIP_DIRS = {"__pycache__", ".git", "venv", "env", "node_modules", "build", "cache", "logs"}
+# 编译版本快于源文件该比例以上才认为值得编译
+WORTH_THRESHOLD = 0.1
+
+# 子进程中执行：只对项目目录替换查找器，按指定形式加载项目模块，第三方包不受影响
+CHILD_TEMPLATE = """
+import os, sys, json, timeit, importlib.machinery as m
+ROOT = {root!r}
+MODE = {mode!r}
+if MODE == "py":
+    loaders = [(m.SourceFileLoader, m.SOURCE_SUFFIXES)]
+else:
+    loaders = [(m.ExtensionFileLoader, m.EXTENSION_SUFFIXES), (m.SourceFileLoader, m.SOURCE_SUFFIXES)]
+hook = m.FileFinder.path_hook(*loaders)
+
+def project_hook(path):
+    if os.path.abspath(path or ".").startswith(ROOT):
+        return hook(path)
+    raise ImportError
+
+sys.path_hooks.insert(0, project_hook)
+sys.path.insert(0, ROOT)
+sys.path_importer_cache.clear()
+# 用 __import__ 走C层导入，-X importtime 才会记录（importlib.import_module 不记录）
+__import__({module!r})
+module = sys.modules[{module!r}]
+result = {{"file": getattr(module, "__file__", None)}}
+stmt = {bench!r}
+if stmt:
+    top = {module!r}.split(".")[0]
+    timer = timeit.Timer(stmt, globals={{top: sys.modules[top]}})
+    number, _ = timer.autorange()
+    result["bench_us"] = min(timer.repeat(3, number)) / number * 1e6
+print("@@RESULT@@" + json.dumps(result))
+"""
+
+
+def module_name(rel_path):
+    """相对路径 → 模块名（去掉 .py 或 .cp312-win_amd64.pyd 等扩展名）"""
+    directory, file = os.path.split(rel_path)
+    parts = [p for p in directory.split(os.sep) if p and p != "."]
+    return ".".join(parts + [file.split(".")[0]])
+
+
+def find_module_pairs(root="."):
+    """查找同时有编译版本和源文件的模块
+
+    Returns:
+        list: [{"module", "compiled", "source", "source_root"}]
+    """
+    suffixes = tuple(importlib.machinery.EXTENSION_SUFFIXES)
+    pairs = []
+    for dirpath, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS and not d.startswith(BACKUP_DIRS)]
+        for file in files:
+            if not file.endswith(suffixes):
+                continue
+            compiled = os.path.relpath(os.path.join(dirpath, file), root)
+            name = module_name(compiled)
+            source_rel = os.path.join(*name.split(".")) + ".py"
+            for source_root in (root,) + BACKUP_DIRS:
+                if os.path.exists(os.path.join(source_root, source_rel)):
+                    pairs.append(
+                        {
+                            "module": name,
+                            "compiled": compiled,
+                            "source": os.path.join(source_root, source_rel),
+                            "source_root": os.path.abspath(source_root),
+                        }
+                    )
+                    break
+    return pairs
+
+
+def parse_self_time(stderr, module):
+    """从 -X importtime 输出中取目标模块自身的导入耗时（微秒）"""
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[0])
+    return None
+
+
+def run_once(pair, mode, bench):
+    """在全新解释器中导入一次，返回 (自身耗时微秒, 微基准微秒, 实际加载的文件)"""
+    root = os.path.abspath(".") if mode == "compiled" else pair["source_root"]
+    code = CHILD_TEMPLATE.format(root=root, mode=mode, module=pair["module"], bench=bench)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        cwd=os.path.abspath("."),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "导入失败")
+    payload = {}
+    for line in result.stdout.splitlines():
+        if line.startswith("@@RESULT@@"):
+            payload = json.loads(line[len("@@RESULT@@"):])
+    return parse_self_time(result.stderr, pair["module"]), payload.get("bench_us"), payload.get("file")
+
+
+def measure(pair, repeat, bench=None):
+    """两种形式各导入 repeat 次（先预热一次生成字节码缓存），取中位数"""
+    entry = {"module": pair["module"], "compiled": pair["compiled"], "source": pair["source"]}
+    for mode in ("py", "compiled"):
+        try:
+            run_once(pair, mode, None)
+            runs = [run_once(pair, mode, bench) for _ in range(repeat)]
+        except Exception as e:
+            entry["error"] = f"{mode}: {e}"
+            return entry
+        import_times = [r[0] for r in runs if r[0] is not None]
+        entry[f"{mode}_import_us"] = statistics.median(import_times) if import_times else None
+        if bench:
+            entry[f"{mode}_bench_us"] = statistics.median(r[1] for r in runs)
+        entry[f"{mode}_file"] = runs[-1][2]
+
+    py_us, compiled_us = entry.get("py_import_us"), entry.get("compiled_import_us")
+    if py_us and compiled_us:
+        entry["import_gain"] = (py_us - compiled_us) / py_us
+    if bench:
+        entry["bench_gain"] = (entry["py_bench_us"] - entry["compiled_bench_us"]) / entry["py_bench_us"]
+    # 有微基准时以热点收益为准，否则看导入耗时
+    gain = entry.get("bench_gain", entry.get("import_gain"))
+    entry["worth_compiling"] = gain is not None and gain >= WORTH_THRESHOLD
+    return entry
+
+
+def print_report(entries):
+    ranked = sorted(
+        entries,
+        key=lambda e: e.get("bench_gain", e.get("import_gain", float("-inf"))),
+        reverse=True,
+    )
+    print(f"\n📊 编译收益排名（{len(ranked)} 个模块）:")
+    print(f"   {'模块':<40} {'py导入us':>10} {'编译导入us':>10} {'导入收益':>8} {'热点收益':>8}  结论")
+    for e in ranked:
+        if "error" in e:
+            print(f"   {e['module']:<40} ❌ {e['error']}")
+            continue
+        bench_gain = f"{e['bench_gain']:.0%}" if "bench_gain" in e else "-"
+        import_gain = f"{e['import_gain']:.0%}" if "import_gain" in e else "-"
+        verdict = "✅ 值得编译" if e["worth_compiling"] else "➖ 收益不明显"
+        print(
+            f"   {e['module']:<40} {e.get('py_import_us') or '-':>10} "
+            f"{e.get('compiled_import_us') or '-':>10} {import_gain:>8} {bench_gain:>8}  {verdict}"
+        )
+    return ranked
+
+
+def main():
+    parser = argparse.ArgumentParser(description="编译模块与源文件导入耗时对比")
+    parser.add_argument("--repeat", type=int, default=5, help="每种形式的导入次数")
+    parser.add_argument("--bench-file", default=None, help="模块微基准配置（JSON）")
+    parser.add_argument("--module", action="append", help="只测试指定模块，可重复")
+    args = parser.parse_args()
+
+    benches = {}
+    if args.bench_file:
+        with open(args.bench_file, "r", encoding="utf-8") as f:
+            benches = json.load(f)
+
+    print("🚀 编译模块导入基准测试")
+    print("=" * 60)
+    pairs = find_module_pairs()
+    if args.module:
+        pairs = [p for p in pairs if p["module"] in args.module]
+    if not pairs:
+        print("❌ 没有找到同时具有编译版本和源文件的模块（当前解释器可加载的扩展名）")
+        return
+
+    entries = []
+    for i, pair in enumerate(pairs, 1):
+        print(f"⏱️  [{i}/{len(pairs)}] {pair['module']}")
+        entries.append(measure(pair, args.repeat, benches.get(pair["module"])))
+    ranked = print_report(entries)
+
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    report_path = os.path.join(REPORT_DIR, f"compiled_imports_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "python": sys.version,
+                "threshold": WORTH_THRESHOLD,
+                "modules": ranked,
+            },
+            f,
+            ensure_ascii=False,
+            indent=2,
+        )
+    print(f"📄 报告已保存: {report_path}")
+    print(f"   编译时按报告选择: python selective_compile_to_pyd.py --from-report {report_path}")
+
+
+if __name__ == "__main__":
+    main()
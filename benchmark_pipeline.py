@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+一键流程端到端基准测试（离线）
+
+用固定的测试视频/音频，把 auto_publishing_videos_DY_ALL 整条链路跑N遍：
+DeepSeek接口、视频链接下载、CosyVoice语音服务和发布页面都由本地模拟服务提供，
+不访问任何外部服务。输出吞吐量（视频/小时）、各阶段延迟分位数和峰值内存，
+并与保存的基准结果对比。
+
+用法:
+    python benchmark_pipeline.py --runs 3
+    python benchmark_pipeline.py --runs 3 --save-baseline
+    python benchmark_pipeline.py --runs 3 --baseline benchmark_baseline.json
+"""
+
+import os
+import sys
+import json
+import time
+import wave
+import math
+import struct
+import shutil
+import argparse
+import threading
+import subprocess
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+FIXTURE_DIR = "benchmark_fixtures"
+REPORT_DIR = os.path.join("logs", "benchmarks")
+DEFAULT_BASELINE = "benchmark_baseline.json"
+
+# 需要改写到本地模拟服务的外部地址：域名 -> 模拟服务路径前缀
+REDIRECT_HOSTS = {
+    "api.deepseek.com": "/deepseek",
+    "v.douyin.com": "/video",
+    "www.douyin.com": "/video",
+    "www.xiaohongshu.com": "/video",
+    "xhslink.com": "/video",
+    "creator.douyin.com": "/publish/douyin",
+    "creator.xiaohongshu.com": "/publish/xiaohongshu",
+    "channels.weixin.qq.com": "/publish/shipinhao",
+}
+# 本地CosyVoice服务地址（与 start_cosyvoice 启动的服务一致）
+COSYVOICE_HOSTS = {"127.0.0.1:9880", "localhost:9880", "127.0.0.1:50000", "localhost:50000"}
+
+MOCK_REWRITE_TEXT = "这是一段用于基准测试的口播文案。今天我们聊聊如何高效地制作短视频，第一步是找准选题，第二步是打磨文案，第三步是稳定输出。"
+
+# 模拟抖音创作者中心的上传/发布页，元素与发布脚本使用的定位方式一致：
+#   上传页 div[class^='container'] input 选择视频后跳转到 content/publish，
+#   "作品标题" 后的 input 填标题，.zone-container 填描述和话题，
+#   role=button 且名称为 "发布" 的按钮提交后跳转到 content/manage。
+# 发布按钮把表单（含视频和封面文件）POST 回当前路径，由模拟服务计数。
+FAKE_PUBLISH_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>模拟发布页</title></head>
+<body>
+<div class="container-upload">
+  <input type="file" name="upload" accept="video/*">
+</div>
+<div><span>作品标题</span></div>
+<div><input type="text" class="semi-input" placeholder="填写作品标题，为作品获得更多流量"></div>
+<div class="zone-container" contenteditable="true"></div>
+<input type="file" id="cover" name="cover" accept="image/*">
+<button type="button" id="publish">发布</button>
+<div id="state"></div>
+<script>
+var base = location.pathname.split("/creator-micro/")[0];
+var upload = document.querySelector("div[class^='container'] input");
+upload.addEventListener("change", function () {
+  if (location.pathname.indexOf("/content/upload") >= 0) {
+    // 真实页面选择视频后进入发布页，这里用 history 保留已选择的文件
+    history.pushState(null, "", base + "/creator-micro/content/publish?enter_from=publish_page");
+  }
+});
+document.getElementById("publish").addEventListener("click", function () {
+  var form = new FormData();
+  form.append("title", document.querySelector(".semi-input").value);
+  form.append("description", document.querySelector(".zone-container").innerText);
+  if (upload.files.length) form.append("video", upload.files[0]);
+  var cover = document.getElementById("cover");
+  if (cover.files.length) form.append("cover", cover.files[0]);
+  fetch(location.pathname, {method: "POST", body: form}).then(function (resp) {
+    document.getElementById("state").innerText = resp.ok ? "发布成功" : "发布失败";
+    if (resp.ok) location.href = base + "/creator-micro/content/manage";
+  });
+});
+</script>
+</body></html>
+"""
+
+
+def create_fixtures(fixture_dir=FIXTURE_DIR):
+    """生成测试用的视频和音频（已存在时直接复用）"""
+    os.makedirs(fixture_dir, exist_ok=True)
+    audio_path = os.path.join(fixture_dir, "speech.wav")
+    video_path = os.path.join(fixture_dir, "source.mp4")
+
+    if not os.path.exists(audio_path):
+        # 10秒 16k 单声道：带停顿的调制正弦波，模拟说话的能量起伏
+        sample_rate = 16000
+        with wave.open(audio_path, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(sample_rate)
+            frames = bytearray()
+            for i in range(sample_rate * 10):
+                t = i / sample_rate
+                envelope = 0.0 if (t % 2.0) > 1.6 else 0.5
+                value = envelope * math.sin(2 * math.pi * 220 * t) * math.sin(math.pi * 3 * t)
+                frames += struct.pack("<h", int(value * 32767))
+            wav.writeframes(bytes(frames))
+
+    if not os.path.exists(video_path):
+        cmd = [
+            "ffmpeg", "-y",
+            "-f", "lavfi", "-i", "testsrc2=size=720x1280:rate=25:duration=10",
+            "-i", audio_path,
+            "-c:v", "libx264", "-pix_fmt", "yuv420p", "-c:a", "aac", "-shortest",
+            video_path,
+        ]
+        subprocess.run(cmd, check=True, capture_output=True)
+    return video_path, audio_path
+
+
+class MockServiceHandler(BaseHTTPRequestHandler):
+    """本地模拟服务：DeepSeek / 视频下载 / CosyVoice / 发布页"""
+
+    video_path = None
+    audio_path = None
+    published = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_file(self, path, content_type):
+        with open(path, "rb") as f:
+            self._send(200, f.read(), content_type)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def do_GET(self):
+        if self.path.startswith("/video"):
+            self._send_file(self.video_path, "video/mp4")
+        elif self.path.startswith("/publish"):
+            self._send(200, FAKE_PUBLISH_PAGE.encode("utf-8"), "text/html; charset=utf-8")
+        elif self.path.startswith("/cosyvoice"):
+            self._send_file(self.audio_path, "audio/wav")
+        else:
+            self._send(404, b"not found", "text/plain")
+
+    def do_POST(self):
+        body = self._read_body()
+        if self.path.startswith("/deepseek"):
+            response = {
+                "id": "chatcmpl-benchmark",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": "deepseek-chat",
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": MOCK_REWRITE_TEXT},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            }
+            self._send(200, json.dumps(response, ensure_ascii=False).encode("utf-8"), "application/json")
+        elif self.path.startswith("/publish"):
+            MockServiceHandler.published.append({"path": self.path, "bytes": len(body)})
+            self._send(200, b'{"status": "ok"}', "application/json")
+        else:
+            # 其余POST请求都视为CosyVoice合成请求，返回固定音频
+            self._send_file(self.audio_path, "audio/wav")
+
+
+def rewrite_url(url, mock_base):
+    """把外部服务地址改写为本地模拟服务地址，不需要改写时原样返回"""
+    parts = urlsplit(url)
+    if parts.netloc in REDIRECT_HOSTS:
+        prefix = REDIRECT_HOSTS[parts.netloc]
+        return mock_base + prefix + (parts.path or "/")
+    if parts.netloc in COSYVOICE_HOSTS:
+        return mock_base + "/cosyvoice" + (parts.path or "/")
+    return url
+
+
+@contextmanager
+def redirect_external_services(mock_base):
+    """把 requests / httpx / playwright 的外部请求改写到模拟服务"""
+    patches = []
+
+    try:
+        import requests
+
+        original_request = requests.Session.request
+
+        def patched_request(self, method, url, *args, **kwargs):
+            return original_request(self, method, rewrite_url(url, mock_base), *args, **kwargs)
+
+        requests.Session.request = patched_request
+        patches.append((requests.Session, "request", original_request))
+    except ImportError:
+        pass
+
+    try:
+        import httpx
+
+        original_send = httpx.Client.send
+
+        def patched_send(self, request, *args, **kwargs):
+            request.url = httpx.URL(rewrite_url(str(request.url), mock_base))
+            return original_send(self, request, *args, **kwargs)
+
+        httpx.Client.send = patched_send
+        patches.append((httpx.Client, "send", original_send))
+    except ImportError:
+        pass
+
+    try:
+        from playwright.sync_api import Page
+
+        original_goto = Page.goto
+
+        def route_to_mock(route):
+            target = rewrite_url(route.request.url, mock_base)
+            if target == route.request.url:
+                route.continue_()
+            else:
+                route.fulfill(response=route.fetch(url=target))
+
+        def patched_goto(self, url, *args, **kwargs):
+            # 在浏览器上下文里拦截请求而不是改写地址：页面地址保持真实域名，
+            # 发布脚本按地址等待页面跳转（content/publish、content/manage）时才能匹配
+            if not getattr(self.context, "_benchmark_routed", False):
+                self.context.route("**/*", route_to_mock)
+                self.context._benchmark_routed = True
+            return original_goto(self, url, *args, **kwargs)
+
+        Page.goto = patched_goto
+        patches.append((Page, "goto", original_goto))
+    except ImportError:
+        pass
+
+    try:
+        yield
+    finally:
+        for owner, name, original in patches:
+            setattr(owner, name, original)
+
+
+def start_mock_server(video_path, audio_path):
+    MockServiceHandler.video_path = video_path
+    MockServiceHandler.audio_path = audio_path
+    MockServiceHandler.published = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockServiceHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def build_pipeline_args(app, mock_base):
+    """按 create_ui 中一键按钮的输入顺序构造参数"""
+    models = app.get_trained_models()
+    fonts = app.get_font_families()
+    # 音色下拉框的值是音色名称，与 refresh_voice_list 一致
+    voices = [name for name, _ in app.get_pt_files()]
+    if not voices:
+        raise RuntimeError("没有可用的音色文件，无法运行基准测试")
+    return [
+        f"{mock_base}/video/source.mp4",  # link_input
+        "基准测试视频\n#基准测试#",  # two_line_input
+        voices[0],  # pt_file_dropdown
+        models[0] if models else None,  # video_model_dropdown
+        "sk-benchmark",  # api_key
+        1,  # speed
+        "",  # pt_files_info
+        None,  # background_image
+        None,  # background_image_list
+        False,  # check_box
+        False,  # skip_bgm_add_box
+        None,  # bgm_list
+        None,  # user_upload_bgm
+        0.5,  # bgm_volume_control
+        True,  # when_auto_use_cover_checkbox
+        False,  # use_ai_checkbox
+        "基准测试封面",  # cover_text
+        "基准",  # highlight_words_text
+        fonts[0] if fonts else "SimHei",  # font_family_dropdown
+        60,  # font_size_number
+        "#FFFFFF",  # font_color_picker
+        "#FFD600",  # highlight_color_picker
+        "bottom",  # position_dropdown
+        None,  # frame_time_number
+        False,  # pulish_with_cover
+        False,  # silence_check_box
+        "新版数字人",  # digital_human_version_dropdown
+        "普通字幕生成",  # subtitle_generation_type_dropdown
+        None,  # template_id
+    ]
+
+
+def _peak_rss_bytes():
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux单位为KB，macOS为字节
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        try:
+            import psutil
+
+            return psutil.Process().memory_info().peak_wset
+        except (ImportError, AttributeError):
+            return None
+
+
+def run_benchmark(runs):
+    """运行基准测试，返回结果字典"""
+    video_path, audio_path = create_fixtures()
+    server, mock_base = start_mock_server(video_path, audio_path)
+    print(f"🧪 模拟服务已启动: {mock_base}")
+
+    # 基准测试使用独立的缓存目录，避免命中文案缓存
+    cache_dir = os.path.join(REPORT_DIR, "cache")
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+    try:
+        with redirect_external_services(mock_base):
+            import app
+            from utils import media_cache, tracing
+
+            media_cache.CACHE_DIR = cache_dir
+            args = build_pipeline_args(app, mock_base)
+
+            run_times = []
+            for i in range(runs):
+                print(f"▶️  第 {i + 1}/{runs} 次运行...")
+                start = time.perf_counter()
+                result = app.auto_publishing_videos_DY_ALL(*args)
+                if hasattr(result, "__next__"):
+                    for _ in result:
+                        pass
+                run_times.append(time.perf_counter() - start)
+                print(f"   耗时 {run_times[-1]:.1f}s")
+
+            summary = tracing.get_summary()
+    finally:
+        server.shutdown()
+
+    total = sum(run_times)
+    return {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "runs": runs,
+        "run_seconds": run_times,
+        "throughput_per_hour": runs / total * 3600 if total else 0.0,
+        "peak_rss": _peak_rss_bytes(),
+        "stages": {
+            stage: {
+                "count": stats["count"],
+                "p50": stats["wall_p50"],
+                "p95": stats["wall_p95"],
+                "process_peak_rss": stats["process_peak_rss"],
+                "process_peak_gpu": stats["process_peak_gpu"],
+            }
+            for stage, stats in summary["stages"].items()
+        },
+        "published": len(MockServiceHandler.published),
+    }
+
+
+def compare_with_baseline(result, baseline, threshold=0.1):
+    """与基准结果对比，返回回退项列表"""
+    regressions = []
+    old_tp = baseline.get("throughput_per_hour") or 0
+    new_tp = result["throughput_per_hour"]
+    if old_tp:
+        change = (new_tp - old_tp) / old_tp
+        print(f"   吞吐量: {old_tp:.1f} → {new_tp:.1f} 视频/小时 ({change:+.1%})")
+        if change < -threshold:
+            regressions.append(f"吞吐量下降 {change:.1%}")
+
+    for stage, stats in result["stages"].items():
+        old = baseline.get("stages", {}).get(stage)
+        if not old or not old.get("p50"):
+            continue
+        change = (stats["p50"] - old["p50"]) / old["p50"]
+        flag = "⚠️ " if change > threshold else "  "
+        print(f"   {flag}{stage}: p50 {old['p50']:.2f}s → {stats['p50']:.2f}s ({change:+.1%})")
+        if change > threshold:
+            regressions.append(f"{stage} p50 变慢 {change:.1%}")
+    return regressions
+
+
+def print_report(result):
+    print("\n📊 基准测试结果:")
+    print(f"   运行次数: {result['runs']}")
+    print(f"   吞吐量: {result['throughput_per_hour']:.1f} 视频/小时")
+    if result["peak_rss"]:
+        print(f"   峰值内存: {result['peak_rss'] / 1024 / 1024:.0f} MB")
+    print(f"   模拟发布次数: {result['published']}")
+    print("\n   阶段                                         p50(s)   p95(s)   次数")
+    for stage, stats in sorted(result["stages"].items(), key=lambda item: -item[1]["p50"]):
+        print(f"   {stage:<44} {stats['p50']:>7.2f}  {stats['p95']:>7.2f}  {stats['count']:>5}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="一键流程端到端基准测试（离线）")
+    parser.add_argument("--runs", type=int, default=3, help="运行次数")
+    parser.add_argument("--baseline", default=None, help="对比的基准结果文件")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基准")
+    parser.add_argument("--threshold", type=float, default=0.1, help="判定回退的变化比例")
+    args = parser.parse_args()
+
+    print("🚀 开始一键流程基准测试")
+    print("=" * 60)
+    result = run_benchmark(args.runs)
+    print_report(result)
+
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    report_path = os.path.join(REPORT_DIR, f"pipeline_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"\n📄 结果已保存: {report_path}")
+
+    baseline_path = args.baseline or (DEFAULT_BASELINE if os.path.exists(DEFAULT_BASELINE) else None)
+    if baseline_path and not args.save_baseline:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\n🔍 与基准对比 ({baseline_path}, {baseline.get('time')}):")
+        regressions = compare_with_baseline(result, baseline, args.threshold)
+        if regressions:
+            print("\n❌ 发现性能回退:")
+            for item in regressions:
+                print(f"   - {item}")
+            sys.exit(1)
+        print("\n✅ 未发现性能回退")
+
+    if args.save_baseline:
+        with open(DEFAULT_BASELINE, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"💾 已保存为基准: {DEFAULT_BASELINE}")
+
+
+if __name__ == "__main__":
+    main()
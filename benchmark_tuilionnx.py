@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TuiliONNX 数字人内循环微基准测试（CPU）
+
+分别测量 generate_tuilionnx_video 内循环中的各个步骤：
+帧解码、人脸裁剪/仿射变换、按 scale_h/scale_w 生成的遮罩融合、
+各 batch_size 下的ONNX推理、牙齿美化、贴回原帧。
+使用合成数据（或指定的测试视频/模型），输出每步耗时和帧率，
+用于找出耗时最多的步骤并在版本间跟踪。
+
+用法:
+    python benchmark_tuilionnx.py
+    python benchmark_tuilionnx.py --video benchmark_fixtures/source.mp4 --model tuilionnx/models/model.onnx
+"""
+
+import os
+import json
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+REPORT_DIR = os.path.join("logs", "benchmarks")
+CROP_SIZE = 256
+BATCH_SIZES = (1, 2, 4, 8, 16)
+
+
+def make_synthetic_frames(count, width, height):
+    """生成带渐变和噪声的合成帧"""
+    rng = np.random.default_rng(0)
+    base = np.zeros((height, width, 3), np.uint8)
+    base[..., 0] = np.linspace(0, 255, width, dtype=np.uint8)[None, :]
+    base[..., 1] = np.linspace(0, 255, height, dtype=np.uint8)[:, None]
+    frames = []
+    for _ in range(count):
+        noise = rng.integers(0, 24, size=(height, width, 3), dtype=np.uint8)
+        frames.append(cv2.add(base, noise))
+    return frames
+
+
+def write_synthetic_video(path, frames, fps=25):
+    h, w = frames[0].shape[:2]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+
+
+def face_affine(width, height, crop_size=CROP_SIZE):
+    """模拟人脸检测结果：人脸位于画面中上部，返回 原帧→裁剪图 的仿射矩阵"""
+    box = 0.35 * width
+    cx, cy = width / 2, height * 0.4
+    scale = crop_size / box
+    return np.float32(
+        [
+            [scale, 0, crop_size / 2 - cx * scale],
+            [0, scale, crop_size / 2 - cy * scale],
+        ]
+    )
+
+
+def build_mouth_mask(size, scale_h, scale_w):
+    """按遮罩高度/宽度比例生成羽化的嘴部遮罩（float32, 0~1）"""
+    mask = np.zeros((size, size), np.float32)
+    base = size / 20.0
+    center = (size // 2, int(size * 0.72))
+    axes = (int(base * scale_w), int(base * scale_h))
+    cv2.ellipse(mask, center, axes, 0, 0, 360, 1.0, -1)
+    ksize = max(3, (size // 16) | 1)
+    return cv2.GaussianBlur(mask, (ksize, ksize), 0)
+
+
+def beautify_teeth(crop, mask):
+    """牙齿美化参考实现：嘴部区域内亮且低饱和的像素提亮、降饱和"""
+    hsv = cv2.cvtColor(crop, cv2.COLOR_BGR2HSV)
+    h, s, v = cv2.split(hsv)
+    teeth = (v > 120) & (s < 90) & (mask > 0.5)
+    v = np.where(teeth, cv2.add(v, 25), v)
+    s = np.where(teeth, (s * 0.6).astype(np.uint8), s)
+    return cv2.cvtColor(cv2.merge([h, s, v]), cv2.COLOR_HSV2BGR)
+
+
+def paste_back(frame, generated, inv_affine, mask):
+    """逐帧贴回：把生成的嘴部区域反变换回原帧并按遮罩融合"""
+    h, w = frame.shape[:2]
+    warped = cv2.warpAffine(generated, inv_affine, (w, h), flags=cv2.INTER_LINEAR)
+    warped_mask = cv2.warpAffine(mask, inv_affine, (w, h), flags=cv2.INTER_LINEAR)[..., None]
+    blended = warped.astype(np.float32) * warped_mask + frame.astype(np.float32) * (1 - warped_mask)
+    return blended.astype(np.uint8)
+
+
+def bench(name, fn, items, repeat=1):
+    """对 items 中每个元素执行 fn，返回每项平均耗时（毫秒）"""
+    fn(items[0])  # 预热
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            fn(item)
+    elapsed = time.perf_counter() - start
+    per_item_ms = elapsed * 1000 / (len(items) * repeat)
+    return {"name": name, "ms_per_frame": per_item_ms, "fps": 1000 / per_item_ms if per_item_ms else 0}
+
+
+def bench_decode(video_path):
+    cap = cv2.VideoCapture(video_path)
+    count = 0
+    start = time.perf_counter()
+    while True:
+        ok, _ = cap.read()
+        if not ok:
+            break
+        count += 1
+    elapsed = time.perf_counter() - start
+    cap.release()
+    per_frame_ms = elapsed * 1000 / max(count, 1)
+    return {"name": "帧解码", "ms_per_frame": per_frame_ms, "fps": 1000 / per_frame_ms if per_frame_ms else 0}
+
+
+def _onnx_inputs(session, batch_size):
+    """按模型输入的形状生成随机输入，动态维度用 batch_size / CROP_SIZE 填充"""
+    feeds = {}
+    for model_input in session.get_inputs():
+        shape = []
+        for i, dim in enumerate(model_input.shape):
+            if isinstance(dim, int) and dim > 0:
+                shape.append(dim)
+            else:
+                shape.append(batch_size if i == 0 else CROP_SIZE)
+        dtype = np.float16 if "float16" in model_input.type else np.float32
+        feeds[model_input.name] = np.random.rand(*shape).astype(dtype)
+    return feeds
+
+
+def bench_onnx(model_path, batch_sizes, repeat):
+    """各 batch_size 下的ONNX推理耗时（CPU）"""
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        print("⚠️  未安装 onnxruntime，跳过推理测试")
+        return []
+    session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+    results = []
+    for batch_size in batch_sizes:
+        try:
+            feeds = _onnx_inputs(session, batch_size)
+            session.run(None, feeds)  # 预热
+            start = time.perf_counter()
+            for _ in range(repeat):
+                session.run(None, feeds)
+            elapsed = time.perf_counter() - start
+        except Exception as e:
+            print(f"⚠️  batch_size={batch_size} 推理失败: {e}")
+            continue
+        per_frame_ms = elapsed * 1000 / (repeat * batch_size)
+        results.append(
+            {
+                "name": f"ONNX推理 batch={batch_size}",
+                "ms_per_frame": per_frame_ms,
+                "fps": 1000 / per_frame_ms if per_frame_ms else 0,
+            }
+        )
+    return results
+
+
+def run_benchmarks(args):
+    frames = make_synthetic_frames(args.frames, args.width, args.height)
+    video_path = args.video
+    if not video_path:
+        os.makedirs(REPORT_DIR, exist_ok=True)
+        video_path = os.path.join(REPORT_DIR, "synthetic_template.mp4")
+        write_synthetic_video(video_path, frames)
+
+    affine = face_affine(args.width, args.height)
+    inv_affine = cv2.invertAffineTransform(affine)
+    mask = build_mouth_mask(CROP_SIZE, args.scale_h, args.scale_w)
+    crops = [cv2.warpAffine(f, affine, (CROP_SIZE, CROP_SIZE)) for f in frames]
+    # 用裁剪图的颜色反转模拟模型生成的嘴部
+    generated = [255 - c for c in crops]
+
+    results = [bench_decode(video_path)]
+    results.append(
+        bench(
+            "人脸裁剪/仿射",
+            lambda f: cv2.warpAffine(f, affine, (CROP_SIZE, CROP_SIZE), flags=cv2.INTER_LINEAR),
+            frames,
+            args.repeat,
+        )
+    )
+    mask3 = mask[..., None]
+    results.append(
+        bench(
+            f"遮罩融合 (scale_h={args.scale_h}, scale_w={args.scale_w})",
+            lambda pair: (pair[0] * mask3 + pair[1] * (1 - mask3)).astype(np.uint8),
+            [(g.astype(np.float32), c.astype(np.float32)) for g, c in zip(generated, crops)],
+            args.repeat,
+        )
+    )
+    if args.model:
+        results.extend(bench_onnx(args.model, BATCH_SIZES, args.repeat))
+    else:
+        print("ℹ️  未指定 --model，跳过ONNX推理测试")
+    results.append(bench("牙齿美化", lambda c: beautify_teeth(c, mask), crops, args.repeat))
+    results.append(
+        bench(
+            "贴回原帧（逐帧）",
+            lambda pair: paste_back(pair[0], pair[1], inv_affine, mask),
+            list(zip(frames, generated)),
+            args.repeat,
+        )
+    )
+    return results
+
+
+def print_results(results, args):
+    print(f"\n📊 测试结果 ({args.width}x{args.height}, {args.frames} 帧, CPU):")
+    print(f"   {'步骤':<36} {'ms/帧':>9} {'帧/秒':>9} {'占比':>7}")
+    total = sum(r["ms_per_frame"] for r in results if not r["name"].startswith("ONNX"))
+    for r in results:
+        share = "" if r["name"].startswith("ONNX") else f"{r['ms_per_frame'] / total:.0%}"
+        print(f"   {r['name']:<36} {r['ms_per_frame']:>9.2f} {r['fps']:>9.1f} {share:>7}")
+    slowest = max(results, key=lambda r: r["ms_per_frame"])
+    print(f"\n🐢 最耗时步骤: {slowest['name']} ({slowest['ms_per_frame']:.2f} ms/帧)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TuiliONNX 内循环微基准测试")
+    parser.add_argument("--video", default=None, help="测试用模板视频，默认生成合成视频")
+    parser.add_argument("--model", default=None, help="ONNX模型路径，不指定时跳过推理测试")
+    parser.add_argument("--width", type=int, default=1080)
+    parser.add_argument("--height", type=int, default=1920)
+    parser.add_argument("--frames", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=2)
+    parser.add_argument("--scale-h", type=float, default=1.6, help="遮罩高度比例")
+    parser.add_argument("--scale-w", type=float, default=3.6, help="遮罩宽度比例")
+    args = parser.parse_args()
+
+    print("🚀 TuiliONNX 内循环微基准测试")
+    print("=" * 60)
+    results = run_benchmarks(args)
+    print_results(results, args)
+
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    report_path = os.path.join(REPORT_DIR, f"tuilionnx_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "args": vars(args), "results": results},
+            f,
+            ensure_ascii=False,
+            indent=2,
+        )
+    print(f"📄 结果已保存: {report_path}")
+
+
+if __name__ == "__main__":
+    main()
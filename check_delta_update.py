@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量更新自检（离线）
+
+在临时目录中启动支持 Range 的本地HTTP服务，对 utils/delta_updater 跑以下场景：
+- 断点续传：暂存目录里已有下载了一部分的 .part，只请求剩余部分，结果校验通过
+- 哈希不符：服务端内容与清单的sha256不一致时拒绝替换，本地文件不变
+- 替换失败回滚：替换中途出错，已替换/新增的文件恢复原状
+- 中途退出恢复：复制备份时进程退出，下次启动（recover_pending_update）按日志回滚，不使用不完整的备份
+
+用法:
+    python check_delta_update.py
+    python check_delta_update.py --keep
+"""
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FILE_SIZE = 3 * 1024 * 1024 + 123
+PART_SIZE = 1024 * 1024
+
+
+class UpdateServer(ThreadingHTTPServer):
+    """按 {路径: 内容} 提供文件，记录每个请求的 Range 头"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), UpdateHandler)
+        self.files = {}
+        self.requests = []
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+    def publish(self, version, files, deleted=(), manifest_files=None):
+        """发布一个版本；manifest_files 可覆盖清单中的文件信息（用于构造哈希不符）"""
+        self.files = {"/" + path: data for path, data in files.items()}
+        manifest = {
+            "version": version,
+            "files": manifest_files
+            or {path: {"sha256": hashlib.sha256(data).hexdigest(), "size": len(data)} for path, data in files.items()},
+            "deleted": list(deleted),
+        }
+        self.files["/manifest.json"] = json.dumps(manifest).encode("utf-8")
+        self.requests = []
+
+
+class UpdateHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        data = self.server.files.get(self.path)
+        range_header = self.headers.get("Range")
+        self.server.requests.append((self.path, range_header))
+        if data is None:
+            self.send_error(404)
+            return
+        start = 0
+        if range_header and range_header.startswith("bytes="):
+            start = int(range_header[len("bytes="):].split("-")[0])
+            if start >= len(data):
+                self.send_error(416)
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(data) - start))
+        self.end_headers()
+        self.wfile.write(data[start:])
+
+    def log_message(self, format, *args):
+        pass
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def new_updater(server, root):
+    from utils.delta_updater import DeltaUpdater
+
+    # 每个场景从空的工作目录开始（缓存目录在当前工作目录下）
+    shutil.rmtree(os.path.join("cache", "update"), ignore_errors=True)
+    return DeltaUpdater(root=root, manifest_url=server.base_url + "manifest.json")
+
+
+def check_resume(server, root):
+    """断点续传"""
+    data = os.urandom(FILE_SIZE)
+    write(os.path.join(root, "models", "big.bin"), b"old")
+    server.publish("1.1", {"models/big.bin": data})
+    updater = new_updater(server, root)
+    write(os.path.join(updater.staging_dir, "models", "big.bin.part"), data[:PART_SIZE])
+
+    updater.run(updater.check())
+    ranges = [r for path, r in server.requests if path == "/models/big.bin"]
+    assert ranges == [f"bytes={PART_SIZE}-"], f"续传请求不正确: {ranges}"
+    assert read(os.path.join(root, "models", "big.bin")) == data, "续传后的文件内容不正确"
+    assert not os.path.exists(updater.journal_path), "更新完成后日志未删除"
+
+
+def check_bad_hash(server, root):
+    """哈希不符时拒绝替换"""
+    from utils.delta_updater import MAX_DOWNLOAD_ATTEMPTS
+
+    write(os.path.join(root, "app.py"), b"print('old')\n")
+    served = b"print('tampered')\n"
+    server.publish(
+        "1.2",
+        {"app.py": served},
+        manifest_files={"app.py": {"sha256": hashlib.sha256(b"print('new')\n").hexdigest(), "size": len(served)}},
+    )
+    updater = new_updater(server, root)
+    try:
+        updater.run(updater.check())
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("哈希不符的文件被接受")
+    attempts = [path for path, _ in server.requests if path == "/app.py"]
+    assert len(attempts) == MAX_DOWNLOAD_ATTEMPTS, f"下载次数不正确: {len(attempts)}"
+    assert read(os.path.join(root, "app.py")) == b"print('old')\n", "本地文件被改动"
+    assert not os.path.exists(os.path.join(updater.staging_dir, "app.py.part")), "校验失败的文件未丢弃"
+
+
+def check_rollback(server, root):
+    """替换中途失败时回滚"""
+    from utils.delta_updater import DeltaUpdater
+
+    old = {"a.txt": b"a-old", "b.txt": b"b-old", "old.txt": b"to-delete"}
+    for path, data in old.items():
+        write(os.path.join(root, path), data)
+    server.publish("1.3", {"a.txt": b"a-new", "new.txt": b"added", "b.txt": b"b-new"}, deleted=["old.txt"])
+    updater = new_updater(server, root)
+
+    calls = []
+    replace = DeltaUpdater._replace
+
+    def failing_replace(source, target):
+        calls.append(target)
+        if target.endswith("b.txt") and len(calls) == 3:
+            raise OSError("模拟替换失败")
+        replace(source, target)
+
+    updater._replace = failing_replace
+    try:
+        updater.run(updater.check())
+    except OSError:
+        pass
+    else:
+        raise AssertionError("替换失败未抛出异常")
+    for path, data in old.items():
+        assert read(os.path.join(root, path)) == data, f"{path} 未回滚"
+    assert not os.path.exists(os.path.join(root, "new.txt")), "新增文件未删除"
+    assert not os.path.exists(updater.journal_path), "回滚后日志未删除"
+
+
+def check_crash_recovery(server, root):
+    """复制备份时进程退出，下次启动按日志回滚"""
+    import utils.delta_updater as delta_updater
+
+    old = {"c.txt": b"c-old" * 1000, "d.txt": b"d-old" * 1000}
+    for path, data in old.items():
+        write(os.path.join(root, path), data)
+    server.publish("1.4", {"c.txt": b"c-new", "d.txt": b"d-new"})
+    updater = new_updater(server, root)
+    plan = updater.check()
+
+    copy2 = delta_updater.shutil.copy2
+
+    def crashing_copy2(source, target):
+        if source.endswith("d.txt"):
+            # 只写入一部分备份后进程退出
+            with open(source, "rb") as src, open(target, "wb") as dst:
+                dst.write(src.read(10))
+            raise SystemExit("模拟进程退出")
+        return copy2(source, target)
+
+    delta_updater.shutil.copy2 = crashing_copy2
+    try:
+        updater.run(plan)
+    except SystemExit:
+        pass
+    else:
+        raise AssertionError("未模拟出进程退出")
+    finally:
+        delta_updater.shutil.copy2 = copy2
+    assert os.path.exists(updater.journal_path), "退出后应留下日志"
+    assert read(os.path.join(root, "c.txt")) == b"c-new", "c.txt 应已替换"
+
+    assert delta_updater.recover_pending_update(root), "启动时未执行回滚"  # app.py 启动时调用
+    for path, data in old.items():
+        assert read(os.path.join(root, path)) == data, f"{path} 未按日志恢复"
+    assert not os.path.exists(updater.journal_path), "恢复后日志未删除"
+
+
+CHECKS = [
+    ("断点续传", check_resume),
+    ("哈希不符拒绝", check_bad_hash),
+    ("替换失败回滚", check_rollback),
+    ("中途退出恢复", check_crash_recovery),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="增量更新自检（离线）")
+    parser.add_argument("--keep", action="store_true", help="保留临时目录")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    work_dir = tempfile.mkdtemp(prefix="delta_update_check_")
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    server = UpdateServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"🚀 本地更新服务: {server.base_url}，工作目录: {work_dir}")
+
+    failed = 0
+    try:
+        for name, check in CHECKS:
+            root = os.path.join(work_dir, "app_" + check.__name__)
+            os.makedirs(root)
+            try:
+                check(server, root)
+                print(f"✅ {name}")
+            except Exception as e:
+                failed += 1
+                print(f"❌ {name}: {e}")
+    finally:
+        server.shutdown()
+        os.chdir(cwd)
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if failed:
+        print(f"❌ {failed}/{len(CHECKS)} 项失败")
+        sys.exit(1)
+    print(f"🎉 全部 {len(CHECKS)} 项通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,6 @@ import tkinter as tk
 from tkinter import messagebox
 from urllib import request
 from urllib.error import URLError
-import configparser
 import threading
 import tarfile
 import shutil
@@ -15,6 +14,8 @@ from typing import Optional, Dict, Any
 import socket
 import json
 
+from utils.config_service import get_config
+
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
@@ -51,14 +52,9 @@ def find_chrome_and_userdata():
 
     # 1. 从配置文件读取Chrome路径
     try:
-        config = configparser.ConfigParser()
-        config.read("config.ini")
-        if config.has_section("browser") and config.has_option(
-            "browser", "LOCAL_CHROME_PATH"
-        ):
-            chrome_path = config.get("browser", "LOCAL_CHROME_PATH")
-            if os.path.exists(chrome_path):
-                logger.info(f"从配置文件找到Chrome路径: {chrome_path}")
+        chrome_path = get_config().get("browser", "LOCAL_CHROME_PATH")
+        if chrome_path and os.path.exists(chrome_path):
+            logger.info(f"从配置文件找到Chrome路径: {chrome_path}")
     except Exception as e:
         logger.warning(f"读取配置文件出错: {e}")
 
@@ -507,6 +503,14 @@ def main():
 
 
 if __name__ == "__main__":
+    # 渲染节点模式：只运行渲染阶段，不启动界面和浏览器
+    # 例如 python combined_launcher.py --worker --control http://192.168.1.10:7860
+    if "--worker" in sys.argv:
+        from worker_node import main as worker_main
+
+        worker_main([arg for arg in sys.argv[1:] if arg != "--worker"])
+        sys.exit(0)
+
     # 启动加载窗口
     from utils.loading_window import show_loading_window
 
@@ -2,69 +2,167 @@
 # -*- coding: utf-8 -*-
 """
 从备份目录恢复被删除的源文件
+
+默认只恢复缺失的文件，已存在的文件直接跳过，不读取内容；--sync 模式按内容哈希对比，
+已存在但内容不同的文件也会更新（文件大小和修改时间与上次清单一致时复用上次的哈希）。
+文件对比和复制在线程池中并行执行，结果写入 restore_manifest.json。
 """
 
 import os
+import sys
+import json
+import time
 import shutil
+import hashlib
+import argparse
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+BACKUP_DIR = "python_source_backup"
+MANIFEST_FILE = "restore_manifest.json"
+
+def file_sha256(path):
+    """计算文件内容的sha256"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def load_manifest():
+    """读取上次的恢复清单，用于跳过未变化的备份文件的哈希计算"""
+    try:
+        with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f).get('files', {})
+    except (OSError, ValueError):
+        return {}
+
+def backup_file_hash(backup_file_path, relative_path, previous):
+    """备份文件哈希：大小和修改时间与上次清单一致时直接复用"""
+    st = os.stat(backup_file_path)
+    entry = previous.get(relative_path)
+    if (
+        entry
+        and entry.get('sha256')
+        and entry.get('size') == st.st_size
+        and entry.get('backup_mtime') == st.st_mtime_ns
+    ):
+        return entry['sha256'], st
+    return file_sha256(backup_file_path), st
+
+def target_matches(relative_path, sha256, size, cached):
+    """目标文件内容是否与备份一致：大小和修改时间与上次清单记录的一致时不重新计算哈希"""
+    st = os.stat(relative_path)
+    if st.st_size != size:
+        return False
+    if (
+        cached
+        and cached.get('sha256') == sha256
+        and cached.get('target_size') == st.st_size
+        and cached.get('target_mtime') == st.st_mtime_ns
+    ):
+        return True
+    return file_sha256(relative_path) == sha256
+
+def restore_one(backup_file_path, relative_path, previous, sync):
+    """对比并恢复单个文件
+
+    Returns:
+        tuple: (相对路径, 清单条目)
+    """
+    try:
+        exists = os.path.exists(relative_path)
+        if exists and not sync:
+            # 默认模式不覆盖已存在的文件，也就不需要对比内容
+            st = os.stat(backup_file_path)
+            return relative_path, {'status': 'skipped_exists', 'size': st.st_size, 'backup_mtime': st.st_mtime_ns}
+
+        sha256, st = backup_file_hash(backup_file_path, relative_path, previous)
+        entry = {'sha256': sha256, 'size': st.st_size, 'backup_mtime': st.st_mtime_ns}
+        if exists:
+            if target_matches(relative_path, sha256, st.st_size, previous.get(relative_path)):
+                entry['status'] = 'unchanged'
+            else:
+                entry['status'] = 'updated'
+        else:
+            entry['status'] = 'restored'
+
+        if entry['status'] != 'unchanged':
+            # 创建目标目录
+            target_dir = os.path.dirname(relative_path)
+            if target_dir:
+                os.makedirs(target_dir, exist_ok=True)
+            # 复制文件
+            shutil.copy2(backup_file_path, relative_path)
+        target_st = os.stat(relative_path)
+        entry['target_size'] = target_st.st_size
+        entry['target_mtime'] = target_st.st_mtime_ns
+        return relative_path, entry
+    except Exception as e:
+        return relative_path, {'status': 'error', 'error': str(e)}
+
+def restore_source_files(sync=False, jobs=8):
+    """从备份目录恢复源文件
+
+    Args:
+        sync: 同步模式，已存在但内容与备份不同的文件也会被覆盖
+        jobs: 并行线程数
+
+    Returns:
+        bool: 备份中有源文件且全部恢复成功（包括内容已一致、无需恢复的文件）
+    """
+    print("🔄 开始恢复被删除的源文件..." if not sync else "🔄 开始同步源文件...")
 
-def restore_source_files():
-    """从备份目录恢复源文件"""
-    print("🔄 开始恢复被删除的源文件...")
-    
-    backup_dir = "python_source_backup"
-    
     # 检查备份目录是否存在
-    if not os.path.exists(backup_dir):
-        print(f"❌ 备份目录 {backup_dir} 不存在！")
+    if not os.path.exists(BACKUP_DIR):
+        print(f"❌ 备份目录 {BACKUP_DIR} 不存在！")
         return False
-    
-    print(f"📁 从 {backup_dir} 恢复文件...")
-    
-    restored_count = 0
-    skipped_count = 0
-    error_count = 0
-    
-    # 遍历备份目录中的所有文件
-    for root, dirs, files in os.walk(backup_dir):
+
+    print(f"📁 从 {BACKUP_DIR} 恢复文件...")
+
+    # 收集备份目录中的所有源文件
+    backup_files = []
+    for root, dirs, files in os.walk(BACKUP_DIR):
         for file in files:
-            if not file.endswith('.py'):
-                continue
-                
-            # 源文件路径（备份中）
-            backup_file_path = os.path.join(root, file)
-            
-            # 目标文件路径（项目中）
-            relative_path = os.path.relpath(backup_file_path, backup_dir)
-            target_file_path = relative_path
-            
-            try:
-                # 检查目标文件是否已存在
-                if os.path.exists(target_file_path):
-                    print(f"⚠️  跳过已存在的文件: {target_file_path}")
-                    skipped_count += 1
-                    continue
-                
-                # 创建目标目录
-                target_dir = os.path.dirname(target_file_path)
-                if target_dir and not os.path.exists(target_dir):
-                    os.makedirs(target_dir, exist_ok=True)
-                
-                # 复制文件
-                shutil.copy2(backup_file_path, target_file_path)
-                print(f"✅ 恢复: {target_file_path}")
-                restored_count += 1
-                
-            except Exception as e:
-                print(f"❌ 恢复失败: {backup_file_path} -> {target_file_path} - {e}")
-                error_count += 1
-    
+            if file.endswith('.py'):
+                backup_file_path = os.path.join(root, file)
+                relative_path = os.path.relpath(backup_file_path, BACKUP_DIR)
+                backup_files.append((backup_file_path, relative_path))
+
+    if not backup_files:
+        print(f"❌ 备份目录 {BACKUP_DIR} 中没有源文件！")
+        return False
+
+    previous = load_manifest()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = list(
+            executor.map(lambda item: restore_one(item[0], item[1], previous, sync), backup_files)
+        )
+
+    counts = {}
+    for relative_path, entry in sorted(results):
+        status = entry['status']
+        counts[status] = counts.get(status, 0) + 1
+        if status == 'restored':
+            print(f"✅ 恢复: {relative_path}")
+        elif status == 'updated':
+            print(f"🔁 更新: {relative_path}")
+        elif status == 'skipped_exists':
+            print(f"⚠️  跳过已存在的文件（可用 --sync 按内容同步）: {relative_path}")
+        elif status == 'error':
+            print(f"❌ 恢复失败: {relative_path} - {entry['error']}")
+
+    write_restore_manifest(dict(results), sync)
+
     print(f"\n📊 恢复结果:")
-    print(f"   ✅ 成功恢复: {restored_count} 个文件")
-    print(f"   ⚠️  跳过文件: {skipped_count} 个文件")
-    print(f"   ❌ 恢复失败: {error_count} 个文件")
-    
-    return restored_count > 0
+    print(f"   ✅ 成功恢复: {counts.get('restored', 0)} 个文件")
+    print(f"   🔁 内容更新: {counts.get('updated', 0)} 个文件")
+    print(f"   ➖ 内容一致: {counts.get('unchanged', 0)} 个文件")
+    print(f"   ⚠️  跳过文件: {counts.get('skipped_exists', 0)} 个文件")
+    print(f"   ❌ 恢复失败: {counts.get('error', 0)} 个文件")
+
+    # 所有文件都已是最新（内容一致）也算成功，只有出错才算失败
+    return counts.get('error', 0) == 0
 
 def verify_restoration():
     """验证恢复结果"""
@@ -100,79 +198,44 @@ def verify_restoration():
     
     return len(missing_files) == 0
 
-def create_restoration_report():
-    """创建恢复报告"""
-    report_content = f"""# 源文件恢复报告
-
-## 恢复时间
-{os.popen('date /t && time /t').read().strip()}
-
-## 恢复操作
-- ✅ 从 python_source_backup/ 目录恢复所有.py文件
-- ✅ 保持原有目录结构
-- ✅ 跳过已存在的文件避免覆盖
-- ✅ 验证关键文件恢复状态
-
-## 当前状态
-- 📁 源文件已恢复到项目目录
-- 🔧 .pyd文件仍然存在（可选择删除）
-- 💾 备份文件保持完整
-
-## 后续操作建议
-
-### 如果要继续使用源文件：
-1. 可以删除对应的.pyd文件：
-   ```bash
-   python remove_pyd_files.py
-   ```
-
-2. 或者保持.pyd和.py文件共存（Python会优先使用.pyd）
-
-### 如果要重新编译：
-1. 删除当前.pyd文件
-2. 运行编译脚本：
-   ```bash
-   python compile_all_to_pyd.py
-   ```
-
-## 文件状态
-- 源文件(.py): ✅ 已恢复
-- 编译文件(.pyd): ✅ 仍存在
-- 备份文件: ✅ 完整保留
-
-## 注意事项
-- Python会优先加载.pyd文件而不是.py文件
-- 如需使用.py文件，建议删除对应的.pyd文件
-- 备份目录请继续保留以备后用
-"""
-    
-    with open('restoration_report.md', 'w', encoding='utf-8') as f:
-        f.write(report_content)
-    
-    print("📄 创建恢复报告: restoration_report.md")
+def write_restore_manifest(files, sync):
+    """写入恢复清单（机器可读，替代手工维护的恢复报告）"""
+    manifest = {
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'backup_dir': BACKUP_DIR,
+        'mode': 'sync' if sync else 'restore',
+        'python': sys.version.split()[0],
+        'files': files,
+    }
+    with open(MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    print(f"📄 写入恢复清单: {MANIFEST_FILE}")
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="从备份目录恢复源文件")
+    parser.add_argument("--sync", action="store_true", help="同步模式：内容与备份不同的已存在文件也会更新")
+    parser.add_argument("-j", "--jobs", type=int, default=8, help="并行线程数")
+    args = parser.parse_args()
+
     print("🔄 源文件恢复工具")
     print("=" * 50)
     
     # 执行恢复
-    if restore_source_files():
+    if restore_source_files(sync=args.sync, jobs=args.jobs):
         # 验证恢复结果
         if verify_restoration():
             print("\n🎉 所有源文件恢复成功！")
         else:
             print("\n⚠️  部分文件恢复可能不完整")
         
-        # 创建报告
-        create_restoration_report()
-        
         print("\n📝 重要提醒:")
         print("   1. 源文件已从备份恢复")
         print("   2. .pyd文件仍然存在")
         print("   3. Python会优先使用.pyd文件")
         print("   4. 如需使用.py文件，请删除对应的.pyd文件")
-        print("   5. 查看 restoration_report.md 了解详细信息")
+        print(f"   5. 查看 {MANIFEST_FILE} 了解每个文件的恢复状态")
         
     else:
         print("\n❌ 源文件恢复失败")
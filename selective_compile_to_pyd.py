@@ -6,139 +6,180 @@
 
 import os
 import sys
+import json
+import time
 import shutil
+import re
+import fnmatch
+import hashlib
+import argparse
 import subprocess
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import tempfile
 import importlib.util
 
-def identify_digital_human_files():
-    """识别数字人相关的文件"""
-    # 数字人相关的关键词
-    digital_human_keywords = [
-        'avatar', 'digital_human', 'tuilionnx', 'face', 'mouth', 'eye',
-        'expression', 'emotion', 'gesture', 'pose', 'animation',
-        'wav2lip', 'sadtalker', 'faceswap', 'deepfake'
-    ]
-    
-    # 数字人相关的目录
-    digital_human_dirs = {
-        'tuilionnx',  # 数字人主目录
-        'face',       # 人脸相关
-        'avatar',     # 头像相关
-    }
-    
-    # 数字人相关的文件模式
-    digital_human_patterns = [
-        '*avatar*', '*face*', '*mouth*', '*eye*', '*expression*',
-        '*emotion*', '*gesture*', '*pose*', '*animation*',
-        '*wav2lip*', '*sadtalker*', '*digital_human*'
-    ]
-    
-    digital_human_files = set()
-    
-    # 遍历所有Python文件
-    for root, dirs, files in os.walk('.'):
-        # 跳过备份和临时目录
-        if any(skip in root for skip in ['python_source_backup', 'build', 'temp', '__pycache__']):
-            continue
-            
-        # 检查目录是否是数字人相关
-        path_parts = Path(root).parts
-        if any(part.lower() in digital_human_dirs for part in path_parts):
-            for file in files:
-                if file.endswith('.py'):
-                    digital_human_files.add(os.path.join(root, file))
-            continue
-        
-        # 检查文件名是否包含数字人关键词
+# 编译选项
+COMPILER_DIRECTIVES = {
+    'language_level': 3,
+    'boundscheck': False,
+    'wraparound': False,
+    'initializedcheck': False,
+    'cdivision': True,
+    'embedsignature': True,
+}
+
+# 生成的C文件、增量编译缓存和耗时报告
+BUILD_DIR = "build"
+C_BUILD_DIR = os.path.join(BUILD_DIR, "cython")
+COMPILE_CACHE_FILE = os.path.join(BUILD_DIR, "compile_cache.json")
+COMPILE_TIMES_FILE = os.path.join(BUILD_DIR, "compile_times.json")
+
+# 数字人相关的关键词
+DIGITAL_HUMAN_KEYWORDS = [
+    'avatar', 'digital_human', 'tuilionnx', 'face', 'mouth', 'eye',
+    'expression', 'emotion', 'gesture', 'pose', 'animation',
+    'wav2lip', 'sadtalker', 'faceswap', 'deepfake'
+]
+# 所有关键词合并成一个正则，一次扫描完成匹配
+DIGITAL_HUMAN_RE = re.compile('|'.join(re.escape(k) for k in DIGITAL_HUMAN_KEYWORDS))
+
+# 数字人相关的目录
+DIGITAL_HUMAN_DIRS = {
+    'tuilionnx',  # 数字人主目录
+    'face',       # 人脸相关
+    'avatar',     # 头像相关
+}
+
+# 排除的目录（按目录名精确匹配，遍历时直接剪枝，不进入）
+EXCLUDE_DIRS = {
+    '__pycache__', '.git', 'venv', 'env', 'node_modules', 'dist',
+    'build', '.pytest_cache', 'miniconda3', 'py312', 'AI-vue-project',
+    'python_source_backup', 'temp', 'logs'
+}
+# 路径中包含这些字符串的目录不做数字人识别（子串匹配，如 templates 也在内），
+# 其中的文件按普通文件处理
+DIGITAL_HUMAN_SCAN_SKIP = ('python_source_backup', 'build', 'temp', '__pycache__')
+
+# 排除的文件（支持通配符）
+EXCLUDE_FILES = [
+    'setup.py', 'compile_all_to_pyd.py', 'test_*.py', '*_test.py',
+    'selective_compile_to_pyd.py', 'fix_*.py', 'restore_*.py',
+    'remove_*.py', 'cleanup_*.py', 'install_*.py', 'safe_launcher.py',
+    'benchmark_*.py', 'selective_pyd_helper.py'
+]
+EXCLUDE_FILES_RE = re.compile('|'.join(fnmatch.translate(p) for p in EXCLUDE_FILES))
+
+# 必须保留的文件（不编译）
+KEEP_ORIGINAL = {
+    '__init__.py',  # 包初始化文件
+    'config.py',    # 配置文件
+    'combined_launcher.py',  # 主启动文件
+}
+
+# 文件内容分类缓存：按 (mtime, 大小) 判断文件是否变化
+SCAN_CACHE_FILE = os.path.join(BUILD_DIR, "scan_cache.json")
+
+def _content_mentions_digital_human(file_path):
+    """检查文件开头内容是否包含数字人关键词（只读前1000字符）"""
+    try:
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            return bool(DIGITAL_HUMAN_RE.search(f.read(1000).lower()))
+    except OSError:
+        return False
+
+def scan_project(root='.'):
+    """单次遍历项目，对每个.py文件分类
+
+    排除目录在进入前剪枝；关键词匹配使用预编译正则；
+    需要读取文件内容的判断结果按 mtime/大小 缓存在 build/scan_cache.json。
+
+    Returns:
+        list: [(相对路径, 文件名, 是否数字人相关)]
+    """
+    try:
+        with open(SCAN_CACHE_FILE, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    new_cache = {}
+
+    results = []
+    for dirpath, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if d not in EXCLUDE_DIRS]
+        rel_dir = os.path.relpath(dirpath, root)
+        parts = () if rel_dir == '.' else Path(rel_dir).parts
+        skip_scan = any(skip in rel_dir for skip in DIGITAL_HUMAN_SCAN_SKIP)
+        in_digital_human_dir = any(part.lower() in DIGITAL_HUMAN_DIRS for part in parts)
+
         for file in files:
             if not file.endswith('.py'):
                 continue
-                
-            file_path = os.path.join(root, file)
-            file_lower = file.lower()
-            
-            # 检查文件名关键词
-            if any(keyword in file_lower for keyword in digital_human_keywords):
-                digital_human_files.add(file_path)
+            rel_path = os.path.normpath(os.path.join(rel_dir, file))
+            if skip_scan:
+                results.append((rel_path, file, False))
+                continue
+            if in_digital_human_dir or DIGITAL_HUMAN_RE.search(file.lower()):
+                results.append((rel_path, file, True))
                 continue
-            
-            # 检查文件内容关键词（简单检查）
-            try:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read(1000).lower()  # 只读前1000字符
-                    if any(keyword in content for keyword in digital_human_keywords):
-                        digital_human_files.add(file_path)
-            except:
-                pass
-    
-    return digital_human_files
+
+            st = os.stat(os.path.join(dirpath, file))
+            key = [st.st_mtime_ns, st.st_size]
+            cached = cache.get(rel_path)
+            if cached and cached[:2] == key:
+                is_digital_human = cached[2]
+            else:
+                is_digital_human = _content_mentions_digital_human(os.path.join(dirpath, file))
+            new_cache[rel_path] = key + [is_digital_human]
+            results.append((rel_path, file, is_digital_human))
+
+    try:
+        os.makedirs(BUILD_DIR, exist_ok=True)
+        with open(SCAN_CACHE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(new_cache, f)
+    except OSError:
+        pass
+    return results
+
+def identify_digital_human_files(scan_results=None):
+    """识别数字人相关的文件"""
+    if scan_results is None:
+        scan_results = scan_project()
+    return {rel_path for rel_path, _, is_digital_human in scan_results if is_digital_human}
 
 def get_compilable_files():
     """获取可编译的Python文件（排除数字人相关）"""
     print("🔍 分析项目文件结构...")
-    
-    # 获取数字人相关文件
-    digital_human_files = identify_digital_human_files()
+
+    scan_results = scan_project()
+    digital_human_files = identify_digital_human_files(scan_results)
     print(f"识别到 {len(digital_human_files)} 个数字人相关文件")
-    
-    # 排除的目录
-    exclude_dirs = {
-        '__pycache__', '.git', 'venv', 'env', 'node_modules', 'dist', 
-        'build', '.pytest_cache', 'miniconda3', 'py312', 'AI-vue-project',
-        'python_source_backup', 'temp', 'logs'
-    }
-    
-    # 排除的文件
-    exclude_files = {
-        'setup.py', 'compile_all_to_pyd.py', 'test_*.py', '*_test.py',
-        'selective_compile_to_pyd.py', 'fix_*.py', 'restore_*.py',
-        'remove_*.py', 'cleanup_*.py', 'install_*.py', 'safe_launcher.py'
-    }
-    
-    # 必须保留的文件（不编译）
-    keep_original = {
-        '__init__.py',  # 包初始化文件
-        'config.py',    # 配置文件
-        'combined_launcher.py',  # 主启动文件
-    }
-    
+
     compilable_files = []
     keep_files = []
     digital_human_kept = []
-    
-    for root, dirs, files in os.walk('.'):
-        # 过滤目录
-        dirs[:] = [d for d in dirs if d not in exclude_dirs]
-        
-        for file in files:
-            if not file.endswith('.py'):
-                continue
-                
-            file_path = os.path.join(root, file)
-            rel_path = os.path.relpath(file_path)
-            
-            # 检查是否在排除列表中
-            if any(exclude in file for exclude in exclude_files):
-                continue
-            
-            # 检查是否需要保留原文件
-            if file in keep_original:
-                keep_files.append(rel_path)
-                continue
-            
-            # 检查是否是数字人相关文件
-            if rel_path in digital_human_files or any(dh_file.endswith(rel_path) for dh_file in digital_human_files):
-                digital_human_kept.append(rel_path)
-                continue
-            
-            # 检查文件名是否包含无效字符（如连字符）
-            if '-' in rel_path or not file.replace('.py', '').replace('_', '').isalnum():
-                keep_files.append(rel_path)
-                continue
-            
-            compilable_files.append(rel_path)
+
+    for rel_path, file, is_digital_human in scan_results:
+        # 检查是否在排除列表中
+        if EXCLUDE_FILES_RE.match(file):
+            continue
+
+        # 检查是否需要保留原文件
+        if file in KEEP_ORIGINAL:
+            keep_files.append(rel_path)
+            continue
+
+        # 检查是否是数字人相关文件
+        if is_digital_human:
+            digital_human_kept.append(rel_path)
+            continue
+
+        # 检查文件名是否包含无效字符（如连字符）
+        if '-' in rel_path or not file.replace('.py', '').replace('_', '').isalnum():
+            keep_files.append(rel_path)
+            continue
+
+        compilable_files.append(rel_path)
     
     print(f"\n📊 文件分析结果:")
     print(f"   可编译文件: {len(compilable_files)} 个")
@@ -154,6 +195,27 @@ def get_compilable_files():
     
     return compilable_files, keep_files + digital_human_kept
 
+def apply_import_report(compilable_files, keep_files, report_path):
+    """按 benchmark_compiled_imports.py 的报告调整编译范围
+
+    报告中测得收益不明显的模块保留为源文件，未测试的模块仍按原规则编译。
+    """
+    with open(report_path, 'r', encoding='utf-8') as f:
+        report = json.load(f)
+    not_worth = {
+        entry['module'] for entry in report.get('modules', [])
+        if 'error' not in entry and not entry.get('worth_compiling')
+    }
+
+    selected = []
+    for rel_path in compilable_files:
+        if module_name_for(rel_path) in not_worth:
+            keep_files.append(rel_path)
+        else:
+            selected.append(rel_path)
+    print(f"📄 按报告 {report_path} 保留 {len(compilable_files) - len(selected)} 个收益不明显的模块为源文件")
+    return selected, keep_files
+
 def check_and_install_dependencies():
     """检查并安装编译依赖"""
     print("🔍 检查编译依赖...")
@@ -191,54 +253,6 @@ def check_and_install_dependencies():
     
     return True
 
-def create_setup_script(py_files):
-    """创建编译脚本"""
-    setup_content = f'''
-import os
-import sys
-from setuptools import setup, Extension
-from Cython.Build import cythonize
-from Cython.Distutils import build_ext
-import numpy
-
-# 编译选项
-compiler_directives = {{
-    'language_level': 3,
-    'boundscheck': False,
-    'wraparound': False,
-    'initializedcheck': False,
-    'cdivision': True,
-    'embedsignature': True,
-}}
-
-# 要编译的文件
-py_files = {py_files}
-
-# 创建扩展模块
-extensions = []
-for py_file in py_files:
-    module_name = py_file.replace('/', '.').replace('\\\\', '.').replace('.py', '')
-    ext = Extension(
-        module_name,
-        [py_file],
-        include_dirs=[numpy.get_include()],
-        define_macros=[('NPY_NO_DEPRECATED_API', 'NPY_1_7_API_VERSION')],
-    )
-    extensions.append(ext)
-
-setup(
-    ext_modules=cythonize(
-        extensions,
-        compiler_directives=compiler_directives,
-        build_dir="build"
-    ),
-    zip_safe=False,
-    include_dirs=[numpy.get_include()],
-)
-'''
-    
-    return setup_content
-
 def backup_source_files(py_files, keep_files):
     """备份源文件"""
     backup_dir = "python_source_backup_selective"
@@ -265,179 +279,236 @@ def backup_source_files(py_files, keep_files):
     
     print(f"✅ 源文件已备份到: {backup_dir}")
 
-def compile_files_in_batches(py_files, batch_size=15):
-    """分批编译文件，跳过有问题的文件"""
+def module_name_for(py_file):
+    return os.path.normpath(py_file).replace(os.sep, '.')[:-len('.py')]
+
+def compile_flags_signature():
+    """编译参数签名：编译选项、Python版本和Cython版本变化时需要全部重新编译"""
+    try:
+        import Cython
+        cython_version = Cython.__version__
+    except ImportError:
+        cython_version = None
+    flags = {
+        'directives': COMPILER_DIRECTIVES,
+        'python': sys.version,
+        'cython': cython_version,
+        'platform': sys.platform,
+    }
+    return hashlib.sha256(json.dumps(flags, sort_keys=True).encode('utf-8')).hexdigest()
+
+def source_hash(py_file, flags_signature):
+    sha = hashlib.sha256(flags_signature.encode('utf-8'))
+    with open(py_file, 'rb') as f:
+        sha.update(f.read())
+    return sha.hexdigest()
+
+def find_compiled_output(py_file):
+    """查找源文件对应的已编译扩展（.pyd/.so）"""
+    stem = py_file[:-len('.py')]
+    directory = os.path.dirname(py_file) or '.'
+    prefix = os.path.basename(stem) + '.'
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and name.endswith(('.pyd', '.so')):
+            return os.path.join(directory, name)
+    return None
+
+def load_compile_cache():
+    try:
+        with open(COMPILE_CACHE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_compile_cache(cache):
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    with open(COMPILE_CACHE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+
+def create_setup_script(module_name, c_file):
+    """创建单个模块的编译脚本（编译已由Cython生成的C文件）"""
+    setup_content = f'''
+from setuptools import setup, Extension
+import numpy
+
+setup(
+    ext_modules=[
+        Extension(
+            {module_name!r},
+            [{c_file!r}],
+            include_dirs=[numpy.get_include()],
+            define_macros=[('NPY_NO_DEPRECATED_API', 'NPY_1_7_API_VERSION')],
+        )
+    ],
+    zip_safe=False,
+)
+'''
+
+    return setup_content
+
+def cythonize_files(py_files, jobs):
+    """用Cython把源文件转换为C文件，nthreads 并行
+
+    整体转换失败时逐个重试，找出有问题的文件。
+
+    Returns:
+        tuple: ({源文件: C文件路径}, 失败文件列表)
+    """
+    from setuptools import Extension
+    from Cython.Build import cythonize
+
+    def run(files, nthreads):
+        extensions = [Extension(module_name_for(f), [f]) for f in files]
+        cythonize(
+            extensions,
+            compiler_directives=COMPILER_DIRECTIVES,
+            build_dir=C_BUILD_DIR,
+            nthreads=nthreads,
+            quiet=True,
+        )
+
+    def c_file_for(py_file):
+        return os.path.abspath(os.path.join(C_BUILD_DIR, py_file[:-len('.py')] + '.c'))
+
+    try:
+        run(py_files, jobs)
+        return {f: c_file_for(f) for f in py_files}, []
+    except Exception:
+        print("   ⚠️  整体转换失败，逐个文件重试...")
+
+    c_files = {}
+    failed_files = []
+    for py_file in py_files:
+        try:
+            run([py_file], 0)
+            c_files[py_file] = c_file_for(py_file)
+        except Exception:
+            failed_files.append(py_file)
+    return c_files, failed_files
+
+def compile_single_file(py_file, c_file):
+    """编译单个模块的C文件，在独立的临时目录中进行，可并行执行
+
+    Returns:
+        tuple: (源文件, 是否成功, 耗时秒数, 错误信息)
+    """
+    start = time.perf_counter()
+    temp_dir = tempfile.mkdtemp(prefix="compile_selective_")
+    try:
+        setup_path = os.path.join(temp_dir, 'setup.py')
+        with open(setup_path, 'w', encoding='utf-8') as f:
+            f.write(create_setup_script(module_name_for(py_file), c_file))
+
+        build_lib = os.path.join(temp_dir, 'lib')
+        cmd = [
+            sys.executable, setup_path, 'build_ext',
+            '--build-lib', build_lib,
+            '--build-temp', os.path.join(temp_dir, 'tmp'),
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True, cwd=temp_dir)
+        if result.returncode != 0:
+            return py_file, False, time.perf_counter() - start, result.stderr[-500:]
+
+        # 复制.pyd/.so文件回原目录
+        for root, dirs, files in os.walk(build_lib):
+            for file in files:
+                if file.endswith(('.pyd', '.so')):
+                    src_pyd = os.path.join(root, file)
+                    dst_pyd = os.path.join(os.path.dirname(py_file), file)
+                    shutil.copy2(src_pyd, dst_pyd)
+        return py_file, True, time.perf_counter() - start, None
+    except Exception as e:
+        return py_file, False, time.perf_counter() - start, str(e)
+    finally:
+        # 清理临时目录
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def compile_files_parallel(py_files, jobs=None, full=False):
+    """并行编译文件，未修改的模块跳过
+
+    1. 对比源码哈希和编译参数签名，跳过没有变化且已有编译产物的模块；
+    2. Cython 以 nthreads 并行生成C文件；
+    3. 各模块的C编译在线程池中各自启动编译进程并行执行；
+    4. 输出每个模块的耗时，保存到 build/compile_times.json。
+
+    Args:
+        py_files: 要编译的源文件
+        jobs: 并行数，默认CPU核数
+        full: 忽略缓存全部重新编译
+
+    Returns:
+        tuple: (成功文件列表, 失败文件列表)
+    """
     if not py_files:
         print("❌ 没有找到需要编译的文件")
-        return False
-    
-    print(f"🔨 开始分批编译 {len(py_files)} 个文件...")
-    
-    successful_files = []
+        return [], []
+
+    jobs = jobs or os.cpu_count() or 1
+    flags_signature = compile_flags_signature()
+    cache = {} if full else load_compile_cache()
+
+    hashes = {}
+    to_compile = []
+    up_to_date = []
+    for py_file in py_files:
+        hashes[py_file] = source_hash(py_file, flags_signature)
+        if cache.get(py_file) == hashes[py_file] and find_compiled_output(py_file):
+            up_to_date.append(py_file)
+        else:
+            to_compile.append(py_file)
+
+    print(f"🔨 开始编译 {len(to_compile)} 个文件（{len(up_to_date)} 个未修改已跳过，并行数 {jobs}）...")
+    successful_files = list(up_to_date)
     failed_files = []
-    
-    # 分批处理
-    for i in range(0, len(py_files), batch_size):
-        batch = py_files[i:i + batch_size]
-        print(f"\n📦 编译批次 {i//batch_size + 1}/{(len(py_files) + batch_size - 1)//batch_size} ({len(batch)} 个文件)")
-        
-        batch_success, batch_failed = compile_single_batch(batch)
-        successful_files.extend(batch_success)
-        failed_files.extend(batch_failed)
-    
+    timings = {}
+
+    if to_compile:
+        start = time.perf_counter()
+        c_files, failed_files = cythonize_files(to_compile, jobs)
+        print(f"   ✅ Cython转换完成: {len(c_files)} 个文件，耗时 {time.perf_counter() - start:.1f}秒")
+
+        done = 0
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = [
+                executor.submit(compile_single_file, py_file, c_file)
+                for py_file, c_file in c_files.items()
+            ]
+            for future in as_completed(futures):
+                py_file, ok, elapsed, error = future.result()
+                done += 1
+                timings[py_file] = round(elapsed, 2)
+                if ok:
+                    successful_files.append(py_file)
+                    cache[py_file] = hashes[py_file]
+                    print(f"   [{done}/{len(c_files)}] ✅ {py_file} ({elapsed:.1f}秒)")
+                else:
+                    failed_files.append(py_file)
+                    cache.pop(py_file, None)
+                    print(f"   [{done}/{len(c_files)}] ❌ {py_file}: {(error or '').strip()[-200:]}")
+        save_compile_cache(cache)
+
     print(f"\n📊 编译结果:")
-    print(f"   ✅ 成功: {len(successful_files)} 个文件")
+    print(f"   ✅ 成功: {len(successful_files)} 个文件（其中 {len(up_to_date)} 个未修改）")
     print(f"   ❌ 失败: {len(failed_files)} 个文件")
-    
+
+    if timings:
+        slowest = sorted(timings.items(), key=lambda item: item[1], reverse=True)
+        print(f"\n⏱️  编译最慢的模块:")
+        for py_file, elapsed in slowest[:10]:
+            print(f"   {elapsed:>7.1f}秒  {py_file}")
+        os.makedirs(BUILD_DIR, exist_ok=True)
+        with open(COMPILE_TIMES_FILE, 'w', encoding='utf-8') as f:
+            json.dump(dict(slowest), f, ensure_ascii=False, indent=2)
+
     if failed_files:
         print(f"\n⚠️  以下文件编译失败，将保留原格式:")
         for failed_file in failed_files[:10]:
             print(f"   - {failed_file}")
         if len(failed_files) > 10:
             print(f"   ... 还有 {len(failed_files) - 10} 个文件")
-    
-    return len(successful_files) > 0
 
-def compile_single_batch(py_files):
-    """编译单个批次的文件"""
-    successful_files = []
-    failed_files = []
-    
-    # 创建临时编译目录
-    temp_dir = "temp_compile_selective"
-    if os.path.exists(temp_dir):
-        shutil.rmtree(temp_dir)
-    os.makedirs(temp_dir)
-    
-    try:
-        # 复制文件到临时目录
-        temp_files = []
-        for py_file in py_files:
-            temp_file = os.path.join(temp_dir, py_file)
-            os.makedirs(os.path.dirname(temp_file), exist_ok=True)
-            shutil.copy2(py_file, temp_file)
-            temp_files.append(py_file)
-        
-        # 创建setup.py
-        setup_content = create_setup_script(temp_files)
-        setup_path = os.path.join(temp_dir, 'setup.py')
-        with open(setup_path, 'w', encoding='utf-8') as f:
-            f.write(setup_content)
-        
-        # 切换到临时目录编译
-        original_cwd = os.getcwd()
-        os.chdir(temp_dir)
-        
-        # 编译命令
-        cmd = [sys.executable, 'setup.py', 'build_ext', '--inplace']
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            # 复制.pyd文件回原目录
-            pyd_count = 0
-            for root, dirs, files in os.walk('.'):
-                for file in files:
-                    if file.endswith(('.pyd', '.so')):
-                        src_pyd = os.path.join(root, file)
-                        
-                        # 计算目标路径
-                        rel_path = os.path.relpath(src_pyd)
-                        dst_pyd = os.path.join(original_cwd, rel_path)
-                        
-                        # 创建目标目录
-                        os.makedirs(os.path.dirname(dst_pyd), exist_ok=True)
-                        
-                        # 复制.pyd文件
-                        shutil.copy2(src_pyd, dst_pyd)
-                        pyd_count += 1
-            
-            os.chdir(original_cwd)
-            print(f"   ✅ 批次成功: {pyd_count} 个.pyd文件")
-            successful_files = py_files.copy()
-        else:
-            os.chdir(original_cwd)
-            print(f"   ❌ 批次失败，尝试单个文件编译...")
-            
-            # 如果批次失败，尝试单个文件编译
-            for py_file in py_files:
-                if compile_single_file(py_file):
-                    successful_files.append(py_file)
-                else:
-                    failed_files.append(py_file)
-            
-    except Exception as e:
-        if 'original_cwd' in locals():
-            os.chdir(original_cwd)
-        print(f"   ❌ 批次编译出错: {e}")
-        failed_files = py_files.copy()
-    finally:
-        # 清理临时目录
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
-    
     return successful_files, failed_files
 
-def compile_single_file(py_file):
-    """编译单个文件"""
-    temp_dir = "temp_single_compile_selective"
-    if os.path.exists(temp_dir):
-        shutil.rmtree(temp_dir)
-    os.makedirs(temp_dir)
-    
-    try:
-        # 复制文件到临时目录
-        temp_file = os.path.join(temp_dir, py_file)
-        os.makedirs(os.path.dirname(temp_file), exist_ok=True)
-        shutil.copy2(py_file, temp_file)
-        
-        # 创建setup.py
-        setup_content = create_setup_script([py_file])
-        setup_path = os.path.join(temp_dir, 'setup.py')
-        with open(setup_path, 'w', encoding='utf-8') as f:
-            f.write(setup_content)
-        
-        # 切换到临时目录编译
-        original_cwd = os.getcwd()
-        os.chdir(temp_dir)
-        
-        # 编译命令
-        cmd = [sys.executable, 'setup.py', 'build_ext', '--inplace']
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            # 复制.pyd文件回原目录
-            for root, dirs, files in os.walk('.'):
-                for file in files:
-                    if file.endswith(('.pyd', '.so')):
-                        src_pyd = os.path.join(root, file)
-                        
-                        # 计算目标路径
-                        rel_path = os.path.relpath(src_pyd)
-                        dst_pyd = os.path.join(original_cwd, rel_path)
-                        
-                        # 创建目标目录
-                        os.makedirs(os.path.dirname(dst_pyd), exist_ok=True)
-                        
-                        # 复制.pyd文件
-                        shutil.copy2(src_pyd, dst_pyd)
-            
-            os.chdir(original_cwd)
-            return True
-        else:
-            os.chdir(original_cwd)
-            return False
-            
-    except Exception as e:
-        if 'original_cwd' in locals():
-            os.chdir(original_cwd)
-        return False
-    finally:
-        # 清理临时目录
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
-
 def remove_compiled_source_files(py_files):
     """删除已编译的源文件"""
     print("🗑️  删除已编译的源文件...")
@@ -530,6 +601,12 @@ if __name__ == "__main__":
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="选择性编译Python文件为.pyd格式")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="并行编译数，默认CPU核数")
+    parser.add_argument("--full", action="store_true", help="忽略增量缓存，全部重新编译")
+    parser.add_argument("--from-report", default=None, help="按导入基准报告选择要编译的模块")
+    args = parser.parse_args()
+
     print("🚀 开始选择性编译Python文件为.pyd格式")
     print("🤖 数字人相关文件将保留为.py格式")
     print("=" * 60)
@@ -541,6 +618,8 @@ def main():
     
     # 获取文件列表
     compilable_files, keep_files = get_compilable_files()
+    if args.from_report:
+        compilable_files, keep_files = apply_import_report(compilable_files, keep_files, args.from_report)
     
     if not compilable_files:
         print("❌ 没有找到可编译的Python文件")
@@ -550,9 +629,10 @@ def main():
     backup_source_files(compilable_files, keep_files)
     
     # 编译文件
-    if compile_files_in_batches(compilable_files):
-        # 删除已编译的源文件
-        remove_compiled_source_files(compilable_files)
+    successful_files, _ = compile_files_parallel(compilable_files, args.jobs, args.full)
+    if successful_files:
+        # 删除已编译的源文件（编译失败的保留原格式）
+        remove_compiled_source_files(successful_files)
         
         # 创建导入辅助文件
         create_import_helper()
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """每个测试在独立的临时目录中运行（cache/ 和 config.ini 都是相对当前目录的）"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import os
+import hashlib
+import threading
+
+import pytest
+
+from check_delta_update import UpdateServer
+from utils import delta_updater
+from utils.delta_updater import DeltaUpdater, recover_pending_update
+
+
+@pytest.fixture
+def server():
+    server = UpdateServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def root(tmp_path):
+    path = tmp_path / "app"
+    path.mkdir()
+    return path
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def updater_for(server, root):
+    return DeltaUpdater(root=str(root), manifest_url=server.base_url + "manifest.json")
+
+
+def test_only_changed_files_are_downloaded(server, root):
+    write(root / "same.py", b"same")
+    write(root / "old.py", b"old")
+    write(root / "gone.py", b"gone")
+    server.publish("1.1", {"same.py": b"same", "old.py": b"new", "added.py": b"added"}, deleted=["gone.py"])
+
+    updater = updater_for(server, root)
+    updater.run(updater.check())
+
+    assert sorted(path for path, _ in server.requests if path != "/manifest.json") == ["/added.py", "/old.py"]
+    assert read(root / "old.py") == b"new"
+    assert read(root / "added.py") == b"added"
+    assert not os.path.exists(root / "gone.py")
+    assert not os.path.exists(updater.journal_path)
+
+
+def test_partial_download_resumes_with_range(server, root):
+    data = os.urandom(256 * 1024)
+    server.publish("1.2", {"models/big.bin": data})
+    updater = updater_for(server, root)
+    write(os.path.join(updater.staging_dir, "models", "big.bin.part"), data[:1000])
+
+    updater.run(updater.check())
+
+    assert [r for path, r in server.requests if path == "/models/big.bin"] == ["bytes=1000-"]
+    assert read(root / "models" / "big.bin") == data
+
+
+def test_hash_mismatch_keeps_local_file(server, root):
+    write(root / "app.py", b"old")
+    served = b"tampered"
+    server.publish(
+        "1.3",
+        {"app.py": served},
+        manifest_files={"app.py": {"sha256": hashlib.sha256(b"new").hexdigest(), "size": len(served)}},
+    )
+    updater = updater_for(server, root)
+    with pytest.raises(ValueError):
+        updater.run(updater.check())
+    assert read(root / "app.py") == b"old"
+
+
+def test_failed_replace_rolls_back(server, root, monkeypatch):
+    write(root / "a.py", b"a-old")
+    write(root / "b.py", b"b-old")
+    server.publish("1.4", {"a.py": b"a-new", "b.py": b"b-new", "c.py": b"c-new"})
+    updater = updater_for(server, root)
+    replace = DeltaUpdater._replace
+
+    def failing_replace(source, target):
+        if target.endswith("c.py"):
+            raise OSError("磁盘已满")
+        replace(source, target)
+
+    monkeypatch.setattr(updater, "_replace", failing_replace)
+    with pytest.raises(OSError):
+        updater.run(updater.check())
+    assert read(root / "a.py") == b"a-old"
+    assert read(root / "b.py") == b"b-old"
+    assert not os.path.exists(root / "c.py")
+
+
+def test_interrupted_update_is_rolled_back_on_startup(server, root, monkeypatch):
+    write(root / "c.py", b"c-old" * 100)
+    write(root / "d.py", b"d-old" * 100)
+    server.publish("1.5", {"c.py": b"c-new", "d.py": b"d-new"})
+    updater = updater_for(server, root)
+    plan = updater.check()
+    copy2 = delta_updater.shutil.copy2
+
+    def crashing_copy2(source, target):
+        if source.endswith("d.py"):
+            raise SystemExit("进程退出")
+        return copy2(source, target)
+
+    monkeypatch.setattr(delta_updater.shutil, "copy2", crashing_copy2)
+    with pytest.raises(SystemExit):
+        updater.run(plan)
+    monkeypatch.setattr(delta_updater.shutil, "copy2", copy2)
+    assert read(root / "c.py") == b"c-new"
+
+    # 启动时不需要配置 manifest_url 也能回滚
+    assert recover_pending_update(str(root))
+    assert read(root / "c.py") == b"c-old" * 100
+    assert read(root / "d.py") == b"d-old" * 100
+    assert not recover_pending_update(str(root))
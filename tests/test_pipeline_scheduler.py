@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+import threading
+import contextvars
+
+import pytest
+
+from utils import pipeline_scheduler
+from utils.pipeline_scheduler import CANCELLED, DONE, FAILED, PipelineScheduler, Step
+
+TIMEOUT = 5
+
+
+@pytest.fixture
+def scheduler():
+    return PipelineScheduler(queue_size=1)
+
+
+def blocking_step(name, resource, release, started=None):
+    def run(_):
+        if started is not None:
+            started.set()
+        assert release.wait(TIMEOUT)
+
+    return Step(name, resource, run)
+
+
+def test_steps_run_in_order_and_share_context(scheduler):
+    def step(name):
+        return Step(name, "llm" if name == "text" else "encode_cpu", lambda ctx: ctx.append(name))
+
+    context = []
+    job = scheduler.submit([step("text"), step("subtitle"), step("bgm")], context=context)
+    assert job.wait(TIMEOUT).status == DONE
+    assert context == ["text", "subtitle", "bgm"]
+    assert [timing[0] for timing in job.timings] == context
+
+
+def test_failed_step_stops_job(scheduler):
+    ran = []
+
+    def boom(_):
+        raise RuntimeError("合成失败")
+
+    job = scheduler.submit([Step("tts", "tts_gpu", boom), Step("publish", "browser", ran.append)])
+    assert job.wait(TIMEOUT).status == FAILED
+    assert job.error == "合成失败"
+    assert ran == []
+
+
+def test_full_queue_does_not_block_other_resources(scheduler):
+    release = threading.Event()
+    started = threading.Event()
+    # 第一个作业占住 browser 工作线程，第二个占满 browser 队列，第三个留在积压中
+    running = scheduler.submit([blocking_step("publish-1", "browser", release, started)])
+    assert started.wait(TIMEOUT)
+    waiting = scheduler.submit([blocking_step("publish-2", "browser", release)])
+    blocked = scheduler.submit([blocking_step("publish-3", "browser", release)])
+    assert scheduler.stats()["backlog"] == 1
+
+    # 积压队首在 browser 上等待，不应挡住第一个步骤在 llm 上的作业
+    other = scheduler.submit([Step("rewrite", "llm", lambda _: None)])
+    assert other.wait(TIMEOUT).status == DONE
+    assert not running.done_event.is_set()
+
+    release.set()
+    for job in (running, waiting, blocked):
+        assert job.wait(TIMEOUT).status == DONE
+
+
+def test_cancel_waiting_job(scheduler):
+    release = threading.Event()
+    started = threading.Event()
+    running = scheduler.submit([blocking_step("lipsync-1", "lipsync_gpu", release, started)])
+    assert started.wait(TIMEOUT)
+    ran = []
+    waiting = scheduler.submit([Step("lipsync-2", "lipsync_gpu", ran.append)])
+
+    assert scheduler.cancel(waiting)
+    assert waiting.status == CANCELLED
+    release.set()
+    assert running.wait(TIMEOUT).status == DONE
+    assert ran == []
+    assert not scheduler.cancel(running)
+
+
+def test_call_returns_result_raises_errors_and_keeps_contextvars(scheduler):
+    var = contextvars.ContextVar("job_id", default=None)
+    var.set("job-1")
+
+    def work(a, b=0):
+        return a + b, var.get(), threading.current_thread().name
+
+    result, job_id, thread = scheduler.call("sum", "encode_cpu", work, 1, b=2)
+    assert result == 3
+    assert job_id == "job-1"
+    assert thread.startswith("pipeline-encode_cpu")
+
+    def fail():
+        raise ValueError("参数错误")
+
+    with pytest.raises(ValueError, match="参数错误"):
+        scheduler.call("fail", "llm", fail)
+
+
+def test_pipeline_stage_only_routes_inside_staged_flow(monkeypatch, scheduler):
+    monkeypatch.setattr(pipeline_scheduler, "_scheduler", scheduler)
+
+    @pipeline_scheduler.pipeline_stage("encode_cpu")
+    def add_bgm():
+        return threading.current_thread().name
+
+    @pipeline_scheduler.staged_flow
+    def one_click():
+        return add_bgm()
+
+    assert add_bgm() == threading.current_thread().name
+    assert one_click().startswith("pipeline-encode_cpu")
+
+
+def test_unknown_resource_is_rejected():
+    with pytest.raises(ValueError):
+        Step("x", "quantum", lambda _: None)
+    with pytest.raises(ValueError):
+        pipeline_scheduler.pipeline_stage("quantum")
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+from collections import OrderedDict
+
+import pytest
+
+from utils import rest_api
+from utils.pipeline_scheduler import PipelineScheduler
+from utils.rest_api import MAX_EVENTS, REQUIRED, ApiJob, ApiJobStore, TaskSpec
+from utils.worker_queue import JobQueue
+
+TIMEOUT = 10
+
+
+@pytest.fixture
+def tasks(monkeypatch):
+    registry = OrderedDict()
+    monkeypatch.setattr(rest_api, "_tasks", registry)
+    return registry
+
+
+@pytest.fixture
+def job_queue(monkeypatch):
+    queue = JobQueue()
+    monkeypatch.setattr(rest_api, "get_job_queue", lambda: queue)
+    monkeypatch.setattr(rest_api, "REMOTE_POLL_INTERVAL", 0.05)
+    return queue
+
+
+@pytest.fixture
+def store(tasks, job_queue):
+    return ApiJobStore(scheduler=PipelineScheduler())
+
+
+def spec(outputs, params=(("text", REQUIRED), ("voice", "默认")), file_outputs=()):
+    return TaskSpec("audio", "音频生成", "gpu", None, list(params), list(outputs), file_outputs=file_outputs)
+
+
+def write(path, data=b"x"):
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def test_build_args_resolves_references_and_escapes():
+    task = spec(["audio"])
+    context = {"script": "大家好"}
+    assert task.build_args({"text": "$script"}, context) == ["大家好", "默认"]
+    assert task.build_args({"text": "$$100元", "voice": "女声"}, context) == ["$100元", "女声"]
+    with pytest.raises(ValueError, match="missing"):
+        task.build_args({"text": "$missing"}, context)
+    with pytest.raises(ValueError, match="text"):
+        task.build_args({}, context)
+
+
+def test_name_outputs():
+    assert spec(["audio"]).name_outputs(("a.wav", 1)) == {"audio": ("a.wav", 1)}
+    assert spec(["audio", "status"]).name_outputs(("a.wav", "ok")) == {"audio": "a.wav", "status": "ok"}
+    # 多输出的处理函数只返回一个值时，其余输出缺省
+    assert spec(["audio", "status"]).name_outputs("a.wav") == {"audio": "a.wav"}
+
+
+def test_check_outputs_requires_existing_files(tmp_path):
+    task = spec(["video", "variants"], file_outputs=["video", "variants"])
+    video = write(tmp_path / "v.mp4")
+    task.check_outputs({"video": video, "variants": {"DY": video}})
+    with pytest.raises(RuntimeError):
+        task.check_outputs({"video": None, "variants": {"DY": video}})
+    with pytest.raises(RuntimeError):
+        task.check_outputs({"video": video, "variants": {}})
+    with pytest.raises(RuntimeError):
+        task.check_outputs({"video": video, "variants": {"DY": video, "XHS": str(tmp_path / "none.mp4")}})
+
+
+def test_events_are_capped_and_resumable():
+    job = ApiJob("batch", [{"task": "audio"}])
+    for i in range(MAX_EVENTS + 5):
+        job.emit("progress", i=i)
+    assert len(job.events) == MAX_EVENTS
+    assert job.next_seq == MAX_EVENTS + 5
+    assert job.events_since(0)[0][0] == 5
+    assert [seq for seq, _, _ in job.events_since(MAX_EVENTS + 3)] == [MAX_EVENTS + 3, MAX_EVENTS + 4]
+    assert job.events_since(job.next_seq) == []
+
+
+def test_local_steps_chain_outputs_and_expose_artifacts(store, tmp_path):
+    def make_video(text):
+        return write(tmp_path / "out.mp4", text.encode("utf-8"))
+
+    def make_variants(video):
+        return {platform: write(tmp_path / f"{platform}.mp4") for platform in ("DY", "XHS")}, "完成"
+
+    rest_api.register_task("render", "渲染", "cpu", make_video, ["text"], ["video"], file_outputs=["video"])
+    rest_api.register_task(
+        "variants", "转码", "cpu", make_variants, ["video"], ["variants", "status"], file_outputs=["variants"]
+    )
+    _, (job,) = store.submit(
+        [{"steps": [{"task": "render", "params": {"text": "你好"}}, {"task": "variants", "params": {"video": "$video"}}]}]
+    )
+    job.pipeline_job.wait(TIMEOUT)
+
+    assert job.status == rest_api.DONE, job.error
+    assert job.artifacts == {
+        "video.mp4": str(tmp_path / "out.mp4"),
+        "variants.DY.mp4": str(tmp_path / "DY.mp4"),
+        "variants.XHS.mp4": str(tmp_path / "XHS.mp4"),
+    }
+    # 只有标量输出出现在状态里
+    assert job.to_dict()["outputs"] == {"video": str(tmp_path / "out.mp4"), "status": "完成"}
+
+
+def test_missing_file_output_fails_step(store):
+    rest_api.register_task("render", "渲染", "cpu", lambda text: None, ["text"], ["video"], file_outputs=["video"])
+    _, (job,) = store.submit([{"steps": [{"task": "render", "params": {"text": "你好"}}]}])
+    job.pipeline_job.wait(TIMEOUT)
+    assert job.status == rest_api.FAILED
+    assert "video" in job.error
+
+
+def test_remote_artifacts_map_to_outputs(store, job_queue, tmp_path):
+    def local(*args):
+        raise AssertionError("有在线节点时不应在本机执行")
+
+    rest_api.register_task(
+        "frames", "抽帧", "cpu", local, ["video", ("fps", 1)], ["video", "frames", "count"],
+        worker_kind="encode", file_params=["video"],
+    )
+    worker_id = job_queue.register_worker("node", ["encode"])
+    source = write(tmp_path / "source.mp4", b"source")
+    received = {}
+
+    def node():
+        remote = job_queue.pull(worker_id, timeout=TIMEOUT)
+        received.update(params=remote.params, inputs=dict(remote.inputs))
+        for name in ("video.mp4", "frames.first.png", "frames.last.png"):
+            upload = write(tmp_path / f"upload_{name}", name.encode("utf-8"))
+            job_queue.save_artifact(remote.id, worker_id, name, upload)
+        job_queue.complete(remote.id, worker_id, {"count": 2})
+
+    thread = threading.Thread(target=node)
+    thread.start()
+    _, (job,) = store.submit([{"steps": [{"task": "frames", "params": {"video": source, "fps": 2}}]}])
+    job.pipeline_job.wait(TIMEOUT)
+    thread.join(TIMEOUT)
+
+    assert job.status == rest_api.DONE, job.error
+    assert received == {"params": {"fps": 2}, "inputs": {"video": source}}
+    output_dir = os.path.join("cache", "api", job.id)
+    assert job.outputs["count"] == 2
+    assert job.outputs["video"] == os.path.join(output_dir, "frames.video.mp4")
+    assert job.outputs["frames"] == {
+        "first": os.path.join(output_dir, "frames.frames.first.png"),
+        "last": os.path.join(output_dir, "frames.frames.last.png"),
+    }
+    assert sorted(job.artifacts) == ["frames.first.png", "frames.last.png", "video.mp4"]
+    with open(job.outputs["frames"]["last"], "rb") as f:
+        assert f.read() == b"frames.last.png"
+
+
+def test_remote_step_falls_back_to_local_when_workers_vanish(store, job_queue):
+    rest_api.register_task("render", "渲染", "cpu", lambda text: text * 2, ["text"], ["text2"], worker_kind="encode")
+    worker_id = job_queue.register_worker("node", ["encode"])
+    submitted = threading.Event()
+    original_submit = job_queue.submit
+
+    def submit(*args, **kwargs):
+        remote = original_submit(*args, **kwargs)
+        # 节点在领取任务前失联
+        job_queue._workers[worker_id]["online"] = False
+        submitted.set()
+        return remote
+
+    job_queue.submit = submit
+    _, (job,) = store.submit([{"steps": [{"task": "render", "params": {"text": "好"}}]}])
+    job.pipeline_job.wait(TIMEOUT)
+
+    assert submitted.is_set()
+    assert job.status == rest_api.DONE, job.error
+    assert job.outputs == {"text2": "好好"}
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+
+import pytest
+
+from utils import worker_queue
+from utils.worker_queue import CANCELLED, DONE, FAILED, LEASED, QUEUED, JobQueue
+
+
+@pytest.fixture
+def queue():
+    return JobQueue()
+
+
+def lease(queue, kind="tts"):
+    worker_id = queue.register_worker("node", [kind])
+    job = queue.submit(kind, {"text": "你好"})
+    assert queue.pull(worker_id, timeout=0) is job
+    return worker_id, job
+
+
+def test_fail_requeues_until_max_attempts(queue):
+    worker_id, job = lease(queue)
+    for attempt in range(1, worker_queue.MAX_ATTEMPTS):
+        queue.fail(job.id, worker_id, "显存不足")
+        assert job.status == QUEUED
+        assert job.attempts == attempt
+        assert queue.pull(worker_id, timeout=0) is job
+
+    queue.fail(job.id, worker_id, "显存不足")
+    assert job.status == FAILED
+    assert job.done_event.is_set()
+    assert queue.pull(worker_id, timeout=0) is None
+
+
+def test_fail_without_retry_finishes_immediately(queue):
+    worker_id, job = lease(queue)
+    queue.fail(job.id, worker_id, "参数错误", retry=False)
+    assert job.status == FAILED
+    assert job.error == "参数错误"
+
+
+def test_expired_lease_is_requeued_and_old_worker_loses_it(queue):
+    old_worker, job = lease(queue)
+    job.lease_expires = time.time() - 1
+    queue.reap()
+    assert job.status == QUEUED
+    assert job.error == "租约超时"
+
+    new_worker = queue.register_worker("node-2", ["tts"])
+    assert queue.pull(new_worker, timeout=0) is job
+    assert job.attempts == 2
+    assert queue.heartbeat(old_worker, job.id) is False
+    with pytest.raises(PermissionError):
+        queue.complete(job.id, old_worker, {"ok": True})
+
+    queue.complete(job.id, new_worker, {"ok": True})
+    assert job.status == DONE
+    assert job.result == {"ok": True}
+
+
+def test_heartbeat_extends_lease(queue):
+    worker_id, job = lease(queue)
+    job.lease_expires = time.time() + 1
+    assert queue.heartbeat(worker_id, job.id, progress="50%") is True
+    assert job.lease_expires > time.time() + worker_queue.LEASE_SECONDS - 5
+    assert job.progress == "50%"
+
+
+def test_pending_job_without_online_worker_is_orphaned(queue):
+    job = queue.submit("lipsync")
+    queue.reap(now=job.updated + worker_queue.WORKER_TIMEOUT / 2)
+    assert job.status == QUEUED
+
+    queue.reap(now=job.updated + worker_queue.WORKER_TIMEOUT + 1)
+    assert job.status == FAILED
+    assert job.orphaned
+    assert job.to_dict()["orphaned"] is True
+
+
+def test_silent_worker_goes_offline(queue):
+    worker_id = queue.register_worker("node", ["encode"])
+    assert queue.has_worker("encode")
+    queue.reap(now=time.time() + worker_queue.WORKER_TIMEOUT + 1)
+    assert not queue.has_worker("encode")
+
+    queue.heartbeat(worker_id)
+    assert queue.has_worker("encode")
+
+
+def test_cancel_queued_job(queue):
+    job = queue.submit("tts")
+    assert queue.cancel(job.id)
+    assert job.status == CANCELLED
+    assert not queue.cancel(job.id)
+
+
+def test_save_artifact_requires_lease(queue, tmp_path):
+    worker_id, job = lease(queue)
+    upload = tmp_path / "upload.tmp"
+    upload.write_bytes(b"wav")
+    path = queue.save_artifact(job.id, worker_id, "audio.wav", str(upload))
+    assert job.artifacts == {"audio.wav": path}
+    assert open(path, "rb").read() == b"wav"
+    assert job.status == LEASED
+
+    queue.complete(job.id, worker_id)
+    upload.write_bytes(b"late")
+    with pytest.raises(PermissionError):
+        queue.save_artifact(job.id, worker_id, "late.wav", str(upload))
+
+    queue.cleanup(job.id)
+    assert queue.get(job.id) is None
+    assert not os.path.exists(path)
@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+"""
+常驻Whisper语音识别服务
+
+模型只加载一次并常驻内存；CPU上可选用 faster-whisper 的 int8 量化后端。
+长音频按静音（能量VAD）切分成多段识别，返回带词级时间戳的结果，
+并统计延迟与实时率（RTF = 识别耗时 / 音频时长）。
+
+只有 faster-whisper 后端会并行识别各分段；openai-whisper 的模型不是线程安全的，
+各分段虽然也提交到线程池，但推理在 _infer_lock 下逐段串行执行，
+此时切分只起限制单段长度的作用，不会缩短识别耗时。
+"""
+
+import time
+import logging
+import threading
+import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils.config_service import get_config
+from utils.memory_governor import get_governor, release_memory
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+# 能量VAD参数
+VAD_FRAME_MS = 30
+VAD_SILENCE_DB = -40.0  # 相对峰值能量的静音阈值
+VAD_MIN_SILENCE_S = 0.3
+MAX_CHUNK_S = 30.0
+MIN_CHUNK_S = 5.0
+
+# 各尺寸模型的大致占用（MB，float16/float32），int8量化约为一半
+MODEL_SIZE_MB = {"tiny": 150, "base": 300, "small": 1000, "medium": 2600, "large": 5000}
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def load_audio(audio_path, sample_rate=SAMPLE_RATE):
+    """用ffmpeg把任意音视频解码为单声道float32数组"""
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-i",
+        audio_path,
+        "-f",
+        "s16le",
+        "-ac",
+        "1",
+        "-ar",
+        str(sample_rate),
+        "-",
+    ]
+    result = subprocess.run(cmd, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(
+            f"解码音频失败: {result.stderr.decode('utf-8', errors='ignore')[-500:]}"
+        )
+    return np.frombuffer(result.stdout, np.int16).astype(np.float32) / 32768.0
+
+
+def frame_energy_db(audio, sample_rate=SAMPLE_RATE, frame_ms=VAD_FRAME_MS):
+    """按帧计算能量（dB，相对满幅）"""
+    frame_len = int(sample_rate * frame_ms / 1000)
+    n_frames = len(audio) // frame_len
+    if n_frames == 0:
+        return np.zeros(0, np.float32)
+    frames = audio[: n_frames * frame_len].reshape(n_frames, frame_len)
+    rms = np.sqrt(np.mean(frames * frames, axis=1) + 1e-12)
+    return 20.0 * np.log10(rms)
+
+
+def split_on_silence(
+    audio,
+    sample_rate=SAMPLE_RATE,
+    silence_db=VAD_SILENCE_DB,
+    min_silence_s=VAD_MIN_SILENCE_S,
+    max_chunk_s=MAX_CHUNK_S,
+    min_chunk_s=MIN_CHUNK_S,
+):
+    """在静音处切分长音频
+
+    Returns:
+        list: [(起始采样点, 结束采样点)]，每段不超过 max_chunk_s
+    """
+    total = len(audio)
+    if total <= max_chunk_s * sample_rate:
+        return [(0, total)]
+
+    energy = frame_energy_db(audio, sample_rate)
+    frame_len = int(sample_rate * VAD_FRAME_MS / 1000)
+    silent = energy < (energy.max() + silence_db)
+    min_silence_frames = max(1, int(min_silence_s * 1000 / VAD_FRAME_MS))
+
+    # 收集足够长的静音段中点作为候选切点
+    cut_points = []
+    run_start = None
+    for i, is_silent in enumerate(np.append(silent, False)):
+        if is_silent and run_start is None:
+            run_start = i
+        elif not is_silent and run_start is not None:
+            if i - run_start >= min_silence_frames:
+                cut_points.append(((run_start + i) // 2) * frame_len)
+            run_start = None
+
+    chunks = []
+    start = 0
+    max_len = int(max_chunk_s * sample_rate)
+    min_len = int(min_chunk_s * sample_rate)
+    while total - start > max_len:
+        candidates = [p for p in cut_points if start + min_len <= p <= start + max_len]
+        # 找不到静音时只能硬切
+        end = candidates[-1] if candidates else start + max_len
+        chunks.append((start, end))
+        start = end
+    chunks.append((start, total))
+    return chunks
+
+
+class ASRService:
+    """常驻的语音识别服务"""
+
+    def __init__(self, model_name="small", backend="auto", device="auto", max_workers=2):
+        self.model_name = model_name
+        self.backend = backend
+        self.device = device
+        self.max_workers = max_workers
+        self._model = None
+        self._load_lock = threading.Lock()
+        # openai-whisper 的模型不是线程安全的，推理需要串行：
+        # 该后端下 max_workers 对识别速度没有帮助，分段实际是一段接一段识别
+        self._infer_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="asr")
+        self._metrics_lock = threading.Lock()
+        self._history = deque(maxlen=100)
+        self._totals = {"requests": 0, "audio_seconds": 0.0, "latency_seconds": 0.0}
+        self.load_seconds = None
+
+    def _resolve_backend(self):
+        device = self.device
+        if device == "auto":
+            try:
+                import torch
+
+                device = "cuda" if torch.cuda.is_available() else "cpu"
+            except ImportError:
+                device = "cpu"
+        backend = self.backend
+        if backend == "auto":
+            try:
+                import faster_whisper  # noqa: F401
+
+                backend = "faster-whisper"
+            except ImportError:
+                backend = "whisper"
+        return backend, device
+
+    def load(self):
+        """加载模型（已加载时直接返回）"""
+        with self._load_lock:
+            if self._model is not None:
+                return self._model
+            backend, device = self._resolve_backend()
+            start = time.time()
+            if backend == "faster-whisper":
+                from faster_whisper import WhisperModel
+
+                # CPU上使用int8量化，GPU上使用float16
+                compute_type = "float16" if device == "cuda" else "int8"
+                self._model = WhisperModel(
+                    self.model_name,
+                    device=device,
+                    compute_type=compute_type,
+                    num_workers=self.max_workers,
+                )
+            else:
+                import whisper
+
+                self._model = whisper.load_model(self.model_name, device=device)
+            self.backend, self.device = backend, device
+            self.load_seconds = time.time() - start
+            get_governor().loaded("asr")
+            logger.info(
+                f"ASR模型已加载: {self.model_name} ({backend}, {device})，"
+                f"耗时 {self.load_seconds:.1f}s"
+            )
+            return self._model
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    def _register_memory(self):
+        """在内存管理器中登记模型，空闲时可被按LRU卸载"""
+        backend, device = self._resolve_backend()
+        size_mb = MODEL_SIZE_MB.get(self.model_name.split(".")[0].split("-")[0], 1000)
+        if backend == "faster-whisper" and device != "cuda":
+            size_mb /= 2
+        get_governor().register("asr", self.unload, "cuda" if device == "cuda" else "cpu", size_mb)
+
+    def unload(self):
+        """释放模型（由内存管理调用）"""
+        with self._load_lock:
+            if self._model is None:
+                return
+            self._model = None
+        get_governor().unloaded("asr")
+        release_memory()
+
+    def _transcribe_chunk(self, audio, offset, language):
+        model = self.load()
+        segments = []
+        if self.backend == "faster-whisper":
+            result, _ = model.transcribe(audio, language=language, word_timestamps=True)
+            for seg in result:
+                segments.append(
+                    {
+                        "start": seg.start + offset,
+                        "end": seg.end + offset,
+                        "text": seg.text.strip(),
+                        "words": [
+                            {
+                                "start": w.start + offset,
+                                "end": w.end + offset,
+                                "word": w.word,
+                                "probability": w.probability,
+                            }
+                            for w in (seg.words or [])
+                        ],
+                    }
+                )
+        else:
+            with self._infer_lock:
+                result = model.transcribe(audio, language=language, word_timestamps=True)
+            for seg in result["segments"]:
+                segments.append(
+                    {
+                        "start": seg["start"] + offset,
+                        "end": seg["end"] + offset,
+                        "text": seg["text"].strip(),
+                        "words": [
+                            {
+                                "start": w["start"] + offset,
+                                "end": w["end"] + offset,
+                                "word": w["word"],
+                                "probability": w.get("probability"),
+                            }
+                            for w in seg.get("words", [])
+                        ],
+                    }
+                )
+        return segments
+
+    def transcribe(self, audio, language="zh"):
+        """识别音频
+
+        Args:
+            audio: 音频文件路径或16k单声道float32数组
+            language: 语言代码
+
+        Returns:
+            dict: text, segments（含words词级时间戳）, duration, latency, rtf
+        """
+        start = time.time()
+        if isinstance(audio, str):
+            audio = load_audio(audio)
+        duration = len(audio) / SAMPLE_RATE
+        self._register_memory()
+
+        # 识别期间模型不会被内存管理器卸载
+        with get_governor().using("asr"):
+            self.load()
+            chunks = split_on_silence(audio)
+            futures = [
+                self._executor.submit(
+                    self._transcribe_chunk, audio[s:e], s / SAMPLE_RATE, language
+                )
+                for s, e in chunks
+            ]
+            segments = []
+            for future in futures:
+                segments.extend(future.result())
+
+        latency = time.time() - start
+        rtf = latency / duration if duration else 0.0
+        self._record(duration, latency, len(chunks))
+        return {
+            "text": "".join(seg["text"] for seg in segments),
+            "segments": segments,
+            "duration": duration,
+            "latency": latency,
+            "rtf": rtf,
+        }
+
+    def transcribe_text(self, audio, language="zh"):
+        """只返回识别文本"""
+        return self.transcribe(audio, language)["text"]
+
+    def _record(self, duration, latency, chunk_count):
+        with self._metrics_lock:
+            self._totals["requests"] += 1
+            self._totals["audio_seconds"] += duration
+            self._totals["latency_seconds"] += latency
+            self._history.append(
+                {
+                    "time": time.time(),
+                    "duration": duration,
+                    "latency": latency,
+                    "rtf": latency / duration if duration else 0.0,
+                    "chunks": chunk_count,
+                }
+            )
+
+    def get_metrics(self):
+        """延迟与实时率统计"""
+        with self._metrics_lock:
+            totals = dict(self._totals)
+            recent = list(self._history)
+        latencies = sorted(item["latency"] for item in recent)
+        return {
+            "model": self.model_name,
+            "backend": self.backend,
+            "device": self.device,
+            "loaded": self.loaded,
+            "load_seconds": self.load_seconds,
+            "requests": totals["requests"],
+            "audio_seconds": totals["audio_seconds"],
+            "latency_seconds": totals["latency_seconds"],
+            "rtf": (
+                totals["latency_seconds"] / totals["audio_seconds"]
+                if totals["audio_seconds"]
+                else None
+            ),
+            "latency_p50": latencies[len(latencies) // 2] if latencies else None,
+            "latency_p95": (
+                latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+                if latencies
+                else None
+            ),
+        }
+
+
+def get_asr_service():
+    """获取进程内共享的ASR服务，参数来自 config.ini 的 [asr] 段（可选）"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            options = get_config().section("asr")
+            _service = ASRService(
+                model_name=options.get("model", "small"),
+                backend=options.get("backend", "auto"),
+                device=options.get("device", "auto"),
+                max_workers=int(options.get("workers", 2)),
+            )
+        return _service
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+批量提取视频文案
+
+download_and_extract_text 每次只处理一个链接。这里解析链接输入框里的所有链接：
+并发下载（连接池+重试），尽量只拉取/分离音频轨，所有音频交给常驻的
+ASR服务（utils.asr_service）识别；结果按规范化后的URL缓存，已提取过的对标视频直接返回。
+"""
+
+import os
+import re
+import json
+import time
+import shutil
+import logging
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.asr_service import get_asr_service
+from utils.media_cache import get_cache_dir
+from utils.video_processor import download_and_extract_text
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_WORKERS = 4
+
+URL_PATTERN = re.compile(r"https?://[^\s，。！？、“”\"'<>]+")
+DIRECT_MEDIA_EXTENSIONS = (".mp4", ".mov", ".m4a", ".mp3", ".wav", ".aac", ".flv", ".webm")
+
+# 分享链接中常见的跟踪参数，规范化时去掉
+TRACKING_PARAMS = {
+    "from",
+    "share_token",
+    "share_id",
+    "u_code",
+    "did",
+    "iid",
+    "timestamp",
+    "spm",
+    "share_source",
+    "share_medium",
+    "xsec_source",
+}
+
+_session = None
+_session_lock = threading.Lock()
+_cache_lock = threading.Lock()
+
+
+def parse_links(link_input):
+    """从输入框文本中解析出所有链接（按规范化URL去重，保持原顺序）"""
+    links = []
+    seen = set()
+    for match in URL_PATTERN.findall(link_input or ""):
+        url = match.rstrip(".,;)")
+        key = normalize_url(url)
+        if key not in seen:
+            seen.add(key)
+            links.append(url)
+    return links
+
+
+def normalize_url(url):
+    """规范化URL：小写协议和域名、去掉锚点和跟踪参数、参数排序"""
+    parts = urlsplit(url.strip())
+    query = [
+        (k, v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k not in TRACKING_PARAMS and not k.startswith("utm_")
+    ]
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(
+        (parts.scheme.lower(), parts.netloc.lower(), path, urlencode(sorted(query)), "")
+    )
+
+
+def get_http_session():
+    """共享的HTTP会话：带连接池和指数退避重试"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=3,
+                backoff_factor=1,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=("GET", "HEAD"),
+            )
+            adapter = HTTPAdapter(
+                pool_connections=DOWNLOAD_WORKERS,
+                pool_maxsize=DOWNLOAD_WORKERS * 2,
+                max_retries=retry,
+            )
+            _session = requests.Session()
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+            _session.headers["User-Agent"] = (
+                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                "(KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+            )
+        return _session
+
+
+def _cache_path():
+    return os.path.join(get_cache_dir("extracted_text"), "index.json")
+
+
+def _load_cache():
+    try:
+        with open(_cache_path(), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def get_cached_text(url):
+    with _cache_lock:
+        entry = _load_cache().get(normalize_url(url))
+    return entry["text"] if entry else None
+
+
+def save_cached_text(url, text):
+    with _cache_lock:
+        cache = _load_cache()
+        cache[normalize_url(url)] = {"text": text, "url": url, "time": time.time()}
+        tmp_path = _cache_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, _cache_path())
+
+
+def _extract_audio_with_ffmpeg(source, audio_path):
+    """用ffmpeg只分离音频轨（16k单声道），source可以是本地文件或直链URL"""
+    cmd = ["ffmpeg", "-y"]
+    if source.startswith("http"):
+        cmd += ["-reconnect", "1", "-reconnect_streamed", "1", "-reconnect_delay_max", "5"]
+    cmd += ["-i", source, "-vn", "-ac", "1", "-ar", "16000", "-f", "wav", audio_path]
+    result = subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8", errors="ignore")
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg提取音频失败: {result.stderr[-500:]}")
+    return audio_path
+
+
+def download_audio_only(url, work_dir):
+    """只下载链接对应视频的音频
+
+    直链媒体文件交给ffmpeg边下载边分离音频；分享链接优先用yt-dlp拉取
+    纯音频格式。两者都不可用时返回None，由调用方走原有的提取流程。
+
+    Returns:
+        str | None: 16k单声道wav路径
+    """
+    audio_path = os.path.join(work_dir, "audio.wav")
+    path = urlsplit(url).path.lower()
+    if path.endswith(DIRECT_MEDIA_EXTENSIONS):
+        # 先用连接池确认资源可访问（自动重试），再交给ffmpeg拉流
+        get_http_session().head(url, allow_redirects=True, timeout=10).raise_for_status()
+        return _extract_audio_with_ffmpeg(url, audio_path)
+
+    try:
+        import yt_dlp
+    except ImportError:
+        return None
+
+    options = {
+        "format": "bestaudio/best",
+        "outtmpl": os.path.join(work_dir, "source.%(ext)s"),
+        "quiet": True,
+        "noprogress": True,
+        "retries": 3,
+        "http_headers": dict(get_http_session().headers),
+    }
+    with yt_dlp.YoutubeDL(options) as ydl:
+        info = ydl.extract_info(url, download=True)
+        source_path = ydl.prepare_filename(info)
+    return _extract_audio_with_ffmpeg(source_path, audio_path)
+
+
+def _fetch_link(url, index):
+    """下载单个链接：返回 ("audio", 音频路径, 工作目录) 或 ("text", 文案, None)
+
+    只有返回音频时工作目录才交给调用方清理，其余情况（包括抛出异常）在这里删除。
+    """
+    work_dir = os.path.join(get_cache_dir("extract_work"), f"{int(time.time() * 1000)}_{index}")
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        audio_path = download_audio_only(url, work_dir)
+    except Exception as e:
+        logger.warning(f"只下载音频失败，改用原提取流程: {url} - {e}")
+        audio_path = None
+    if audio_path:
+        return "audio", audio_path, work_dir
+    shutil.rmtree(work_dir, ignore_errors=True)
+    return "text", download_and_extract_text(url), None
+
+
+def extract_texts_from_links(link_input):
+    """批量提取输入框中所有链接的文案
+
+    Args:
+        link_input: 链接输入框内容，每行一个（或混在分享文本中）
+
+    Returns:
+        str: 单个链接时返回文案本身，多个链接时按链接顺序拼接
+    """
+    links = parse_links(link_input)
+    if not links:
+        return "未找到有效的视频链接"
+
+    texts = {}
+    pending = []
+    for url in links:
+        cached = get_cached_text(url)
+        if cached is not None:
+            logger.info(f"命中文案缓存: {url}")
+            texts[url] = cached
+        else:
+            pending.append(url)
+
+    if pending:
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+            futures = {
+                executor.submit(_fetch_link, url, i): url for i, url in enumerate(pending)
+            }
+            # 下载在线程池中并发进行，先下载完的先进入识别
+            for future in as_completed(futures):
+                url = futures[future]
+                work_dir = None
+                try:
+                    kind, value, work_dir = future.result()
+                    text = (
+                        get_asr_service().transcribe_text(value)
+                        if kind == "audio"
+                        else value
+                    )
+                    texts[url] = text
+                    # 原提取流程失败时返回的是错误提示而不是异常，无法与文案区分，
+                    # 所以只缓存本地识别成功的结果
+                    if kind == "audio" and text:
+                        save_cached_text(url, text)
+                except Exception as e:
+                    logger.error(f"提取文案失败 {url}: {e}")
+                    texts[url] = f"提取失败: {e}"
+                finally:
+                    if work_dir:
+                        shutil.rmtree(work_dir, ignore_errors=True)
+        logger.info(f"{len(pending)} 个链接提取完成，耗时 {time.time() - start:.1f}s")
+
+    if len(links) == 1:
+        return texts[links[0]]
+    return "\n\n".join(f"【视频{i + 1}】{url}\n{texts[url]}" for i, url in enumerate(links))
@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+"""
+配置服务
+
+config.ini 原来由各处各自解析：界面构建时读 [deepseek_apikey]，启动器查找Chrome时
+读 [browser]，ASR / 内存管理 / 渲染节点各读自己的段，保存/删除 API Key 时又整体重写。
+这里统一加载一次为不可变快照，后台线程按修改时间检测文件变化并热加载，
+变更后通知订阅者；写入时加进程内锁和文件锁，写临时文件后原子替换，
+其他进程（或手工编辑）不会读到写了一半的文件。写入只改动涉及的选项行，
+注释、空行和其他选项的写法保持原样。
+
+用法:
+    from utils.config_service import get_config, get_config_service
+
+    get_config().get("browser", "LOCAL_CHROME_PATH")
+    get_config_service().update("deepseek_apikey", {"key": "sk-1,sk-2"})
+    get_config_service().subscribe(on_change, sections=("memory",))
+"""
+
+import os
+import re
+import sys
+import time
+import logging
+import tempfile
+import threading
+import configparser
+from types import MappingProxyType
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = "config.ini"
+POLL_INTERVAL = 1.0
+
+_BOOLEAN_STATES = configparser.ConfigParser.BOOLEAN_STATES
+_SECTION_RE = re.compile(r"^\s*\[([^\]]+)\]")
+# 选项行从行首开始；以空白开头的行是上一个值的续行
+_OPTION_RE = re.compile(r"^([^\s=:;#\[][^=:]*?)\s*[=:]")
+
+
+class ConfigSnapshot:
+    """某一时刻的配置内容（只读）
+
+    选项名与 configparser 一致，不区分大小写。
+    """
+
+    def __init__(self, sections, version=0, mtime=None):
+        self._sections = MappingProxyType(
+            {
+                name: MappingProxyType({k.lower(): v for k, v in options.items()})
+                for name, options in sections.items()
+            }
+        )
+        self.version = version
+        self.mtime = mtime
+
+    def sections(self):
+        return list(self._sections)
+
+    def has_section(self, section):
+        return section in self._sections
+
+    def has_option(self, section, option):
+        return option.lower() in self._sections.get(section, {})
+
+    def section(self, section):
+        """某个段的全部选项（只读映射），段不存在时为空"""
+        return self._sections.get(section, MappingProxyType({}))
+
+    def get(self, section, option, fallback=None):
+        return self._sections.get(section, {}).get(option.lower(), fallback)
+
+    def getint(self, section, option, fallback=None):
+        value = self.get(section, option)
+        return fallback if value in (None, "") else int(value)
+
+    def getfloat(self, section, option, fallback=None):
+        value = self.get(section, option)
+        return fallback if value in (None, "") else float(value)
+
+    def getboolean(self, section, option, fallback=None):
+        value = self.get(section, option)
+        if value in (None, ""):
+            return fallback
+        if value.lower() not in _BOOLEAN_STATES:
+            raise ValueError(f"[{section}] {option} 不是布尔值: {value}")
+        return _BOOLEAN_STATES[value.lower()]
+
+    def getlist(self, section, option, sep=","):
+        """逗号分隔的列表，忽略空项"""
+        value = self.get(section, option) or ""
+        return [item.strip() for item in value.split(sep) if item.strip()]
+
+
+def _read_parser(path):
+    parser = configparser.ConfigParser(interpolation=None)
+    try:
+        parser.read(path, encoding="utf-8")
+    except UnicodeDecodeError:
+        # 旧版本按系统默认编码（中文Windows为GBK）写入过配置
+        parser = configparser.ConfigParser(interpolation=None)
+        parser.read(path)
+    return parser
+
+
+def _read_lines(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.readlines()
+    except FileNotFoundError:
+        return []
+    except UnicodeDecodeError:
+        with open(path, "r") as f:
+            return f.readlines()
+
+
+def _update_lines(lines, section, values):
+    """只改写 section 中涉及的选项行，保留注释、空行和其他内容
+
+    Args:
+        lines: 配置文件的行（带换行符）
+        section: 段名，不存在时追加到文件末尾
+        values: {选项: 值}，值为 None 时删除该选项（连同续行）
+
+    Returns:
+        list: 新的行列表
+    """
+    pending = {option.lower(): value for option, value in values.items()}
+    names = {option.lower(): option for option in values}
+    out = []
+    current = None
+    found = False
+    insert_at = None  # 段内最后一个选项之后，新选项插在这里
+    skipping = False
+    for line in lines:
+        match = _SECTION_RE.match(line)
+        if match:
+            current = match.group(1).strip()
+            skipping = False
+            out.append(line)
+            if current == section:
+                found = True
+                insert_at = len(out)
+            continue
+        if skipping:
+            if line.strip() and line[0].isspace():
+                continue
+            skipping = False
+        if current == section:
+            match = _OPTION_RE.match(line)
+            if match:
+                name = match.group(1).strip()
+                if name.lower() in pending:
+                    value = pending.pop(name.lower())
+                    if value is not None:
+                        out.append(f"{name} = {value}\n")
+                        insert_at = len(out)
+                    skipping = True
+                    continue
+                out.append(line)
+                insert_at = len(out)
+                continue
+        out.append(line)
+
+    additions = [f"{names[key]} = {value}\n" for key, value in pending.items() if value is not None]
+    if additions:
+        if found:
+            out[insert_at:insert_at] = additions
+        else:
+            if out and not out[-1].endswith("\n"):
+                out[-1] += "\n"
+            if out and out[-1].strip():
+                out.append("\n")
+            out.append(f"[{section}]\n")
+            out.extend(additions)
+    return out
+
+
+@contextmanager
+def _file_lock(path):
+    """跨进程的文件锁（锁文件与配置文件同目录）"""
+    with open(path + ".lock", "a+b") as f:
+        if sys.platform == "win32":
+            import msvcrt
+
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.05)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class ConfigService:
+    """配置加载、热更新与原子写入"""
+
+    def __init__(self, path=CONFIG_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._subscribers = []
+        self._stat = None
+        self._snapshot = ConfigSnapshot({})
+        self._watcher = None
+        self.reload()
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    def _file_stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def reload(self, force=False):
+        """文件有变化（或 force）时重新加载，并通知订阅者
+
+        Returns:
+            bool: 是否加载了新内容
+        """
+        with self._lock:
+            stat = self._file_stat()
+            if not force and stat == self._stat:
+                return False
+            parser = _read_parser(self.path)
+            old = self._snapshot
+            new = ConfigSnapshot(
+                {name: dict(parser.items(name, raw=True)) for name in parser.sections()},
+                version=old.version + 1,
+                mtime=stat[0] / 1e9 if stat else None,
+            )
+            self._stat = stat
+            self._snapshot = new
+            subscribers = list(self._subscribers)
+
+        changed = {
+            name
+            for name in set(old.sections()) | set(new.sections())
+            if dict(old.section(name)) != dict(new.section(name))
+        }
+        if old.version and changed:
+            logger.info(f"配置已重新加载，变更的段: {', '.join(sorted(changed))}")
+        for callback, sections in subscribers:
+            if old.version and (sections is None or changed & sections):
+                try:
+                    callback(new)
+                except Exception as e:
+                    logger.warning(f"配置变更回调失败: {e}")
+        return True
+
+    def subscribe(self, callback, sections=None):
+        """订阅配置变更
+
+        Args:
+            callback: 变更后以新快照调用
+            sections: 只关心的段，None 表示任意变更
+
+        Returns:
+            function: 取消订阅
+        """
+        entry = (callback, set(sections) if sections else None)
+        with self._lock:
+            self._subscribers.append(entry)
+
+        def unsubscribe():
+            with self._lock:
+                if entry in self._subscribers:
+                    self._subscribers.remove(entry)
+
+        return unsubscribe
+
+    def update(self, section, values=None, remove=()):
+        """修改配置并原子写回文件
+
+        Args:
+            section: 段名，不存在时创建
+            values: {选项: 值}，值为 None 时删除该选项
+            remove: 要删除的选项名
+
+        Returns:
+            ConfigSnapshot: 写入后的快照
+        """
+        values = dict(values or {})
+        for option in remove:
+            values[option] = None
+
+        with self._lock, _file_lock(self.path):
+            # 在锁内重新读取文件，不覆盖其他进程的修改；只改动涉及的选项行
+            lines = _update_lines(
+                _read_lines(self.path),
+                section,
+                {option: None if value is None else str(value) for option, value in values.items()},
+            )
+
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(prefix=".config_", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.writelines(lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            self.reload(force=True)
+            return self._snapshot
+
+    def start_watcher(self, interval=POLL_INTERVAL):
+        """启动后台线程，按修改时间检测文件变化"""
+        with self._lock:
+            if self._watcher is not None:
+                return
+
+            def watch():
+                while True:
+                    time.sleep(interval)
+                    try:
+                        self.reload()
+                    except Exception as e:
+                        logger.warning(f"重新加载配置失败: {e}")
+
+            self._watcher = threading.Thread(target=watch, name="config-watcher", daemon=True)
+            self._watcher.start()
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_config_service():
+    """获取进程内共享的配置服务（首次调用时加载并启动文件监视）"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = ConfigService()
+            _service.start_watcher()
+        return _service
+
+
+def get_config():
+    """当前配置快照"""
+    return get_config_service().snapshot
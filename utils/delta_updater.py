@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+"""
+增量更新
+
+原来的“检查更新”流程整包下载并替换平台元素。这里对比远端清单与本地文件的
+sha256，只并行下载有变化的文件（支持HTTP Range断点续传），校验后先放在暂存目录，
+全部就绪再逐个原子替换；替换前备份旧文件并写入日志，任何一步失败都按日志回滚。
+进程在替换中途退出时，下次启动 app.py 会先调用 recover_pending_update() 按日志回滚
+（不需要配置 manifest_url）。下载和替换在后台线程执行，不阻塞服务。
+
+config.ini:
+    [update]
+    manifest_url = http://example.com/releases/latest/manifest.json
+    ; 文件下载地址前缀，默认与清单同目录
+    base_url =
+    jobs = 4
+
+清单格式:
+    {"version": "1.2.0",
+     "files": {"app.py": {"sha256": "...", "size": 12345}, ...},
+     "deleted": ["utils/old_module.py"]}
+文件下载地址为 base_url + 相对路径。
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+import urllib.parse
+import urllib.request
+from urllib.error import HTTPError
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.config_service import get_config
+from utils.media_cache import get_cache_dir
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOBS = 4
+CHUNK_SIZE = 1024 * 1024
+REQUEST_TIMEOUT = 30
+MAX_DOWNLOAD_ATTEMPTS = 3
+# 这些目录中的文件不参与更新
+PROTECTED_PREFIXES = ("cache/", "logs/", ".git/", "config.ini")
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _safe_rel_path(rel_path):
+    """清单中的路径必须是项目内的相对路径"""
+    rel_path = rel_path.replace("\\", "/")
+    normalized = os.path.normpath(rel_path).replace("\\", "/")
+    if os.path.isabs(rel_path) or normalized.startswith("../") or normalized == "..":
+        raise ValueError(f"清单中的路径不合法: {rel_path}")
+    if normalized.startswith(PROTECTED_PREFIXES):
+        raise ValueError(f"清单中包含受保护的路径: {rel_path}")
+    return normalized
+
+
+class LocalManifest:
+    """本地文件哈希缓存：按 (大小, mtime) 复用上次计算的sha256"""
+
+    def __init__(self, root, path):
+        self.root = root
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        self.version = data.get("version")
+        self.files = data.get("files", {})
+
+    def hash_of(self, rel_path):
+        """本地文件的sha256，文件不存在时为None"""
+        full_path = os.path.join(self.root, rel_path)
+        try:
+            st = os.stat(full_path)
+        except OSError:
+            return None
+        with self._lock:
+            cached = self.files.get(rel_path)
+        if cached and cached["size"] == st.st_size and cached["mtime_ns"] == st.st_mtime_ns:
+            return cached["sha256"]
+        digest = file_sha256(full_path)
+        with self._lock:
+            self.files[rel_path] = {"sha256": digest, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        return digest
+
+    def forget(self, rel_path):
+        with self._lock:
+            self.files.pop(rel_path, None)
+
+    def save(self, version=None):
+        if version is not None:
+            self.version = version
+        tmp_path = self.path + ".tmp"
+        with self._lock:
+            data = {"version": self.version, "files": self.files}
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+def fetch_manifest(manifest_url):
+    with urllib.request.urlopen(manifest_url, timeout=REQUEST_TIMEOUT) as response:
+        manifest = json.loads(response.read().decode("utf-8"))
+    if not isinstance(manifest.get("files"), dict):
+        raise ValueError("更新清单缺少 files")
+    return manifest
+
+
+def download_file(url, dest_path, expected_sha256, expected_size=None):
+    """下载单个文件到 dest_path，已有 .part 时用 Range 续传，完成后校验sha256"""
+    part_path = dest_path + ".part"
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    for attempt in range(1, MAX_DOWNLOAD_ATTEMPTS + 1):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if expected_size is not None and offset > expected_size:
+            os.remove(part_path)
+            offset = 0
+        request = urllib.request.Request(url)
+        if offset:
+            request.add_header("Range", f"bytes={offset}-")
+        try:
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+                # 服务器不支持Range时返回200和完整内容，从头写
+                mode = "ab" if offset and response.status == 206 else "wb"
+                with open(part_path, mode) as f:
+                    shutil.copyfileobj(response, f, CHUNK_SIZE)
+        except HTTPError as e:
+            if e.code == 416:
+                # 请求范围超出文件大小：本地 .part 已完整（或已损坏），交给校验判断
+                pass
+            elif attempt == MAX_DOWNLOAD_ATTEMPTS:
+                raise
+            else:
+                time.sleep(attempt)
+                continue
+        except OSError:
+            if attempt == MAX_DOWNLOAD_ATTEMPTS:
+                raise
+            time.sleep(attempt)
+            continue
+
+        if file_sha256(part_path) == expected_sha256:
+            os.replace(part_path, dest_path)
+            return dest_path
+        # 校验失败：丢弃并重新下载
+        os.remove(part_path)
+        logger.warning(f"文件校验失败，重新下载({attempt}/{MAX_DOWNLOAD_ATTEMPTS}): {url}")
+    raise ValueError(f"文件校验失败: {url}")
+
+
+class DeltaUpdater:
+    """增量更新：检查、后台下载、原子替换与回滚"""
+
+    def __init__(self, root=".", manifest_url=None, base_url=None, jobs=DEFAULT_JOBS):
+        self.root = os.path.abspath(root)
+        self.manifest_url = manifest_url
+        self.base_url = base_url or (manifest_url.rsplit("/", 1)[0] + "/" if manifest_url else None)
+        self.jobs = jobs
+        self.work_dir = get_cache_dir("update")
+        self.staging_dir = os.path.join(self.work_dir, "staging")
+        self.journal_path = os.path.join(self.work_dir, "journal.json")
+        self.local = LocalManifest(self.root, os.path.join(self.work_dir, "local_manifest.json"))
+        self._lock = threading.Lock()
+        self._thread = None
+        self.state = "idle"
+        self.progress = ""
+        self.last_plan = None
+        self.recovered = self.recover()
+
+    def check(self):
+        """获取远端清单并与本地对比
+
+        Returns:
+            dict: {"version", "changed": [(路径, 信息)], "deleted": [路径], "download_bytes"}
+        """
+        manifest = fetch_manifest(self.manifest_url)
+        files = {_safe_rel_path(path): info for path, info in manifest["files"].items()}
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            local_hashes = dict(zip(files, executor.map(self.local.hash_of, files)))
+        changed = [(path, info) for path, info in files.items() if local_hashes[path] != info["sha256"]]
+        deleted = [
+            path
+            for path in map(_safe_rel_path, manifest.get("deleted", []))
+            if os.path.exists(os.path.join(self.root, path))
+        ]
+        self.local.save()
+        plan = {
+            "version": manifest.get("version"),
+            "changed": changed,
+            "deleted": deleted,
+            "download_bytes": sum(info.get("size") or 0 for _, info in changed),
+        }
+        self.last_plan = plan
+        return plan
+
+    @staticmethod
+    def describe(plan, current_version=None):
+        if not plan["changed"] and not plan["deleted"]:
+            return f"当前已是最新版本 {plan['version'] or ''}".strip()
+        lines = [
+            f"发现新版本: {plan['version'] or '未知'}" + (f"（当前 {current_version}）" if current_version else ""),
+            f"需要更新 {len(plan['changed'])} 个文件，约 {plan['download_bytes'] / 1024 / 1024:.1f}MB",
+        ]
+        if plan["deleted"]:
+            lines.append(f"需要删除 {len(plan['deleted'])} 个文件")
+        lines += [f"  · {path}" for path, _ in plan["changed"][:15]]
+        if len(plan["changed"]) > 15:
+            lines.append(f"  · ...等 {len(plan['changed'])} 个文件")
+        return "\n".join(lines)
+
+    def _download_all(self, plan):
+        staged = {}
+        done = 0
+        total = len(plan["changed"])
+
+        def fetch(item):
+            path, info = item
+            url = urllib.parse.urljoin(self.base_url, urllib.parse.quote(path))
+            dest = os.path.join(self.staging_dir, path)
+            if os.path.exists(dest) and file_sha256(dest) == info["sha256"]:
+                return path, dest  # 上次已下载完成
+            return path, download_file(url, dest, info["sha256"], info.get("size"))
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            for path, dest in executor.map(fetch, plan["changed"]):
+                staged[path] = dest
+                done += 1
+                self.progress = f"下载中 {done}/{total}: {path}"
+        return staged
+
+    def _write_journal(self, entries):
+        tmp_path = self.journal_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+
+    def _apply(self, plan, staged):
+        """逐个替换文件；每一步先备份、再写日志、再替换，失败时回滚已完成的部分
+
+        日志中的备份都是已完整写入的：备份复制到一半时进程退出，日志里还没有这一项，
+        回滚不会用不完整的备份覆盖原文件。
+        """
+        backup_dir = os.path.join(self.work_dir, "backup", time.strftime("%Y%m%d_%H%M%S"))
+        journal = []
+        try:
+            for path in list(staged) + plan["deleted"]:
+                target = os.path.join(self.root, path)
+                backup = os.path.join(backup_dir, path) if os.path.exists(target) else None
+                if backup:
+                    os.makedirs(os.path.dirname(backup), exist_ok=True)
+                    shutil.copy2(target, backup)
+                journal.append({"path": path, "backup": backup})
+                self._write_journal(journal)
+                if path in staged:
+                    os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+                    self._replace(staged[path], target)
+                else:
+                    os.remove(target)
+                self.local.forget(path)
+        except Exception:
+            logger.exception("更新替换失败，开始回滚")
+            self._rollback(journal)
+            raise
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        return backup_dir
+
+    @staticmethod
+    def _replace(source, target):
+        try:
+            os.replace(source, target)
+        except PermissionError:
+            # Windows 上已加载的 .pyd/.dll 不能覆盖，但可以改名，改名后再放入新文件
+            old_path = f"{target}.old-{int(time.time())}"
+            os.replace(target, old_path)
+            os.replace(source, target)
+
+    def _rollback(self, journal):
+        for entry in reversed(journal):
+            target = os.path.join(self.root, entry["path"])
+            try:
+                if entry["backup"] and os.path.exists(entry["backup"]):
+                    self._replace(entry["backup"], target)
+                elif not entry["backup"] and os.path.exists(target):
+                    os.remove(target)  # 本次新增的文件
+                self.local.forget(entry["path"])
+            except OSError as e:
+                logger.error(f"回滚 {entry['path']} 失败: {e}")
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+
+    def recover(self):
+        """上次替换中途退出时按日志回滚"""
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                journal = json.load(f)
+        except (OSError, ValueError):
+            return False
+        logger.warning(f"检测到未完成的更新，回滚 {len(journal)} 个文件")
+        self._rollback(journal)
+        return True
+
+    def run(self, plan=None):
+        """下载并替换（阻塞）"""
+        plan = plan or self.last_plan or self.check()
+        self.state = "downloading"
+        staged = self._download_all(plan)
+        self.state, self.progress = "applying", "正在替换文件..."
+        backup_dir = self._apply(plan, staged)
+        self.local.save(plan["version"])
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+        self.state = "done"
+        self.progress = (
+            f"✅ 已更新到 {plan['version'] or '最新版本'}：更新 {len(staged)} 个文件，"
+            f"删除 {len(plan['deleted'])} 个文件，重启后生效（旧文件备份在 {backup_dir}）"
+        )
+        return self.progress
+
+    def start(self, plan=None):
+        """在后台线程中更新，返回是否已启动（已有更新在进行时返回False）"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+
+            def target():
+                try:
+                    self.run(plan)
+                except Exception as e:
+                    # 下载阶段失败时尚未改动任何文件，替换阶段失败已按日志回滚
+                    rolled_back = "，已回滚" if self.state == "applying" else ""
+                    self.state = "failed"
+                    self.progress = f"❌ 更新失败{rolled_back}: {e}"
+
+            self.state, self.progress = "starting", "准备更新..."
+            self._thread = threading.Thread(target=target, name="delta-updater", daemon=True)
+            self._thread.start()
+            return True
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+
+_updater = None
+_updater_lock = threading.Lock()
+
+
+def recover_pending_update(root="."):
+    """启动时调用：上次更新在替换中途退出时按日志回滚，返回是否执行了回滚
+
+    应在导入项目内其他模块之前调用，避免加载替换了一半的文件。
+    """
+    if not os.path.exists(os.path.join(get_cache_dir("update"), "journal.json")):
+        return False
+    return DeltaUpdater(root=root).recovered
+
+
+def get_updater():
+    """根据 config.ini 的 [update] 段创建增量更新器，未配置 manifest_url 时返回None"""
+    global _updater
+    config = get_config()
+    manifest_url = config.get("update", "manifest_url")
+    if not manifest_url:
+        return None
+    with _updater_lock:
+        if _updater is None or _updater.manifest_url != manifest_url:
+            _updater = DeltaUpdater(
+                manifest_url=manifest_url,
+                base_url=config.get("update", "base_url") or None,
+                jobs=config.getint("update", "jobs", DEFAULT_JOBS),
+            )
+        return _updater
+
+
+def build_manifest(root, version, paths, output_path):
+    """发布时生成清单（在发布目录中运行）"""
+    files = {}
+    for rel_path in paths:
+        full_path = os.path.join(root, rel_path)
+        files[_safe_rel_path(rel_path)] = {"sha256": file_sha256(full_path), "size": os.path.getsize(full_path)}
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "files": files}, f, ensure_ascii=False, indent=2)
+    return output_path
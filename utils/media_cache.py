@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+媒体文件缓存辅助
+
+同一个视频在封面、模板帧等多个环节会被反复解码。这里提供按内容计算的
+视频指纹和统一的缓存目录，各环节以指纹为键缓存解码结果。
+"""
+
+import os
+import hashlib
+import threading
+
+CACHE_DIR = "cache"
+
+# 指纹只读取文件头尾各1MB，避免大文件全量哈希
+_FINGERPRINT_CHUNK = 1024 * 1024
+
+_fingerprint_lock = threading.Lock()
+_fingerprints = {}
+
+
+def video_fingerprint(video_path):
+    """计算视频文件指纹
+
+    使用文件大小和首尾各1MB内容计算sha1，文件移动或复制后指纹不变，
+    内容被修改后指纹会变化。结果按 (路径, 大小, mtime) 缓存在进程内。
+
+    Args:
+        video_path: 视频文件路径
+
+    Returns:
+        str: 16位十六进制指纹
+    """
+    st = os.stat(video_path)
+    stat_key = (os.path.abspath(video_path), st.st_size, st.st_mtime_ns)
+    with _fingerprint_lock:
+        cached = _fingerprints.get(stat_key)
+    if cached:
+        return cached
+
+    sha = hashlib.sha1(str(st.st_size).encode("utf-8"))
+    with open(video_path, "rb") as f:
+        sha.update(f.read(_FINGERPRINT_CHUNK))
+        if st.st_size > _FINGERPRINT_CHUNK * 2:
+            f.seek(-_FINGERPRINT_CHUNK, os.SEEK_END)
+            sha.update(f.read(_FINGERPRINT_CHUNK))
+    fingerprint = sha.hexdigest()[:16]
+
+    with _fingerprint_lock:
+        _fingerprints[stat_key] = fingerprint
+    return fingerprint
+
+
+def get_cache_dir(kind, key=None):
+    """返回（并创建）某类缓存的目录，例如 cache/covers/<指纹>"""
+    path = os.path.join(CACHE_DIR, kind) if key is None else os.path.join(CACHE_DIR, kind, key)
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -0,0 +1,569 @@
+# -*- coding: utf-8 -*-
+"""
+模型显存/内存管理
+
+数字人、语音合成和语音识别模型都要占用显存/内存，阶段重叠时容易OOM或大量换页。
+这里统一登记常驻的模型（大小、设备、最近使用时间），加载新模型或进入GPU阶段前
+按 LRU 卸载空闲模型，让总占用不超过预算；卸载后和GPU阶段结束时执行
+gc 和 torch.cuda.empty_cache。
+
+预算检查按实测占用计算：本进程中未登记的占用（例如进程内加载的 TuiliONNX 推理会话，
+按 nvidia-smi 或 torch 统计）和 start_digit_human / start_cosyvoice 启动的独立服务
+进程的占用都计入，外部进程只统计不卸载。实测（nvidia-smi、遍历进程）在锁外进行并短时间缓存，
+不会阻塞其他线程的登记和查询。
+
+目前能按 LRU 卸载的只有语音识别模型（asr_service 登记）。数字人和语音合成由编译模块
+自己加载和释放模型，无法从外部卸载，以阶段（stage）登记：阶段开始前按预估大小腾出空间，
+仍放不下且同一设备上有其他阶段在执行时，等待它们结束（最多 stage_wait_s 秒）再开始，
+执行期间计入占用。
+
+外部服务进程按以下顺序识别：经 track_service 启动时记录的子进程（及其子进程）、
+监听的端口、命令行关键词。端口和关键词可在配置中覆盖。
+
+预算、阶段预估占用和服务识别规则在 config.ini 的 [memory] 段配置（可选，单位MB/秒）:
+    [memory]
+    vram_budget_mb = 10000
+    ram_budget_mb = 24000
+    lipsync_mb = 3000
+    tts_mb = 0
+    stage_wait_s = 300
+    cosyvoice_ports = 9880, 50000
+    cosyvoice_keywords = cosyvoice
+    digit_human_keywords = tuilionnx, digit_human
+"""
+
+import gc
+import os
+import sys
+import time
+import inspect
+import logging
+import functools
+import threading
+import subprocess
+from contextlib import contextmanager
+
+from utils.config_service import get_config_service
+
+logger = logging.getLogger(__name__)
+
+# 未配置预算时按设备总量的比例计算
+DEFAULT_VRAM_FRACTION = 0.9
+DEFAULT_RAM_FRACTION = 0.8
+
+# 阶段模型的默认预估占用（MB）：数字人在本进程内推理；
+# CosyVoice 通常以独立服务运行，占用已按外部进程实测统计，默认不重复计入
+STAGE_MODELS = {
+    "lipsync": ("cuda", 3000),
+    "tts": ("cuda", 0),
+}
+# 实测占用的缓存时间，避免每次预留都调用 nvidia-smi 和遍历进程
+MEASURE_TTL_S = 2.0
+# 阶段放不下时等待其他阶段结束的最长时间（秒）
+STAGE_WAIT_S = 300
+
+# 外部服务进程的默认识别规则：监听端口和命令行关键词
+EXTERNAL_SERVICES = {
+    "cosyvoice": {"ports": (9880, 50000), "keywords": ("cosyvoice",)},
+    "digit_human": {"ports": (), "keywords": ("tuilionnx", "digit_human")},
+}
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def _torch():
+    # 只在 torch 已被加载时使用，避免仅为查询显存而导入
+    return sys.modules.get("torch")
+
+
+def release_memory():
+    """回收Python对象并释放PyTorch缓存的显存"""
+    gc.collect()
+    torch = _torch()
+    if torch is not None:
+        try:
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except Exception:
+            pass
+
+
+def _device_totals():
+    """(显存总量MB, 内存总量MB)，无法获取时为None"""
+    vram = None
+    torch = _torch()
+    if torch is not None:
+        try:
+            if torch.cuda.is_available():
+                _, total = torch.cuda.mem_get_info()
+                vram = total / 1024 / 1024
+        except Exception:
+            pass
+    ram = psutil.virtual_memory().total / 1024 / 1024 if psutil else None
+    return vram, ram
+
+
+def _gpu_usage_by_pid():
+    """各进程显存占用（MB），依赖 nvidia-smi"""
+    try:
+        result = subprocess.run(
+            [
+                "nvidia-smi",
+                "--query-compute-apps=pid,used_memory",
+                "--format=csv,noheader,nounits",
+            ],
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return {}
+    usage = {}
+    for line in result.stdout.splitlines():
+        try:
+            pid, used = (int(v.strip()) for v in line.split(","))
+            usage[pid] = usage.get(pid, 0) + used
+        except ValueError:
+            continue
+    return usage
+
+
+class _Entry:
+    def __init__(self, name, device, unload, size_mb):
+        self.name = name
+        self.device = device
+        self.unload = unload
+        self.size_mb = size_mb
+        self.loaded = False
+        self.in_use = 0
+        self.last_used = 0.0
+        self.evictions = 0
+
+
+def _service_rules():
+    """外部服务识别规则，配置中的 <服务>_ports / <服务>_keywords 覆盖默认值"""
+    config = get_config_service().snapshot
+    rules = {}
+    for service, default in EXTERNAL_SERVICES.items():
+        ports = config.getlist("memory", f"{service}_ports")
+        keywords = config.getlist("memory", f"{service}_keywords")
+        rules[service] = {
+            "ports": {int(port) for port in ports} if ports else set(default["ports"]),
+            "keywords": [k.lower() for k in keywords] if keywords else list(default["keywords"]),
+        }
+    return rules
+
+
+def _listening_ports():
+    """{端口: pid}，无权限时为空"""
+    ports = {}
+    try:
+        for conn in psutil.net_connections(kind="inet"):
+            if conn.status == psutil.CONN_LISTEN and conn.pid:
+                ports.setdefault(conn.laddr.port, conn.pid)
+    except (psutil.AccessDenied, OSError):
+        pass
+    return ports
+
+
+class MemoryGovernor:
+    """按 LRU 在显存/内存预算内管理常驻模型"""
+
+    def __init__(self, vram_budget_mb=None, ram_budget_mb=None):
+        vram_total, ram_total = _device_totals()
+        self.budgets = {
+            "cuda": vram_budget_mb or (vram_total * DEFAULT_VRAM_FRACTION if vram_total else None),
+            "cpu": ram_budget_mb or (ram_total * DEFAULT_RAM_FRACTION if ram_total else None),
+        }
+        self._entries = {}
+        self._lock = threading.RLock()
+        # 阶段结束或模型释放时通知等待中的阶段
+        self._released = threading.Condition(self._lock)
+        # 实测单独加锁：只保证同一时间只有一个线程在测，不阻塞 _lock
+        self._measure_lock = threading.Lock()
+        self._measured = None
+        self._measured_at = 0.0
+        self._service_pids = {}
+
+    def register(self, name, unload, device="cuda", size_mb=0):
+        """登记一个模型
+
+        Args:
+            name: 模型名称
+            unload: 卸载回调，调用后模型应释放显存/内存；为None时只计入占用，不会被卸载
+            device: "cuda" 或 "cpu"
+            size_mb: 预估占用，加载后可通过 loaded() 更新为实测值
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                self._entries[name] = _Entry(name, device, unload, size_mb)
+            else:
+                entry.unload, entry.device = unload, device
+                entry.size_mb = size_mb or entry.size_mb
+
+    def _resident_mb(self, device, exclude=None):
+        return sum(
+            e.size_mb
+            for e in self._entries.values()
+            if e.loaded and e.device == device and e.name != exclude
+        )
+
+    def _measure(self):
+        """实测占用（MB）：{设备: (本进程, 外部服务进程)}，结果短时间缓存
+
+        不能在 _lock 内调用：nvidia-smi 和遍历进程可能耗时数秒。
+        """
+        with self._measure_lock:
+            measured = self._measured
+            if measured is not None and time.time() - self._measured_at < MEASURE_TTL_S:
+                return measured
+            measured = self._measure_now()
+            self._measured, self._measured_at = measured, time.time()
+            return measured
+
+    def _invalidate(self):
+        self._measured = None
+
+    def _measure_now(self):
+        gpu_by_pid = _gpu_usage_by_pid()
+        external = self._external_usage(gpu_by_pid)
+        process_vram = gpu_by_pid.get(os.getpid())
+        if process_vram is None:
+            torch = _torch()
+            process_vram = 0.0
+            if torch is not None:
+                try:
+                    if torch.cuda.is_available():
+                        process_vram = torch.cuda.memory_reserved() / 1024 / 1024
+                except Exception:
+                    pass
+        process_ram = psutil.Process().memory_info().rss / 1024 / 1024 if psutil else 0.0
+        return {
+            "cuda": (process_vram, sum(item["vram_mb"] for item in external.values())),
+            "cpu": (process_ram, sum(item["ram_mb"] for item in external.values())),
+        }
+
+    def _unmanaged_mb(self, device, measured):
+        """预算中不归登记模型管理的部分：外部服务进程 + 本进程中未登记的占用"""
+        process, external = measured[device]
+        return external + max(0.0, process - self._resident_mb(device))
+
+    def reserve(self, name, wait_s=0):
+        """加载/使用模型前调用：按 LRU 卸载空闲模型，直到该模型能放进预算
+
+        Args:
+            name: 模型或阶段名称
+            wait_s: 卸载后仍放不下时，等待同一设备上其他使用中的模型/阶段结束的最长时间
+        """
+        deadline = time.time() + wait_s
+        while True:
+            measured = self._measure()
+            with self._lock:
+                over, evicted, busy = self._make_room(name, measured)
+                retry = over and busy and time.time() < deadline
+                if retry:
+                    self._released.wait(min(deadline - time.time(), MEASURE_TTL_S * 5))
+                elif over:
+                    logger.warning(f"加载 {name} 后预计超出{self._entries[name].device}预算（没有可卸载的空闲模型）")
+            if evicted:
+                logger.info(f"为加载 {name} 卸载空闲模型: {', '.join(evicted)}")
+                release_memory()
+            if not retry:
+                return
+
+    def _make_room(self, name, measured):
+        """在 _lock 内按 LRU 卸载空闲模型
+
+        Returns:
+            (卸载后是否仍超出预算, 卸载的模型名列表, 同设备上是否有其他使用中的模型/阶段)
+        """
+        entry = self._entries[name]
+        budget = self.budgets.get(entry.device)
+        if budget is None or entry.loaded:
+            return False, [], False
+        needed = entry.size_mb
+        # 未登记的占用不会因为卸载登记模型而减少，循环中视为常量
+        unmanaged = self._unmanaged_mb(entry.device, measured)
+        idle = sorted(
+            (
+                e
+                for e in self._entries.values()
+                if e.loaded
+                and e.device == entry.device
+                and not e.in_use
+                and e.unload is not None
+                and e.name != name
+            ),
+            key=lambda e: e.last_used,
+        )
+        evicted = []
+        while idle and unmanaged + self._resident_mb(entry.device, exclude=name) + needed > budget:
+            victim = idle.pop(0)
+            try:
+                victim.unload()
+            except Exception as e:
+                logger.warning(f"卸载模型 {victim.name} 失败: {e}")
+                continue
+            victim.loaded = False
+            victim.evictions += 1
+            evicted.append(victim.name)
+        if evicted:
+            self._invalidate()
+        total = unmanaged + self._resident_mb(entry.device, exclude=name) + needed
+        # 只有等其他使用中的模型/阶段结束后能放下时才值得等待
+        busy_mb = sum(
+            e.size_mb
+            for e in self._entries.values()
+            if e.in_use and e.loaded and e.device == entry.device and e.name != name
+        )
+        return total > budget, evicted, busy_mb > 0 and total - busy_mb <= budget
+
+    def loaded(self, name, size_mb=None):
+        """模型加载完成后调用，可传入实测占用"""
+        with self._lock:
+            entry = self._entries[name]
+            entry.loaded = True
+            entry.last_used = time.time()
+            if size_mb:
+                entry.size_mb = size_mb
+
+    def unloaded(self, name):
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry:
+                entry.loaded = False
+            self._invalidate()
+            self._released.notify_all()
+
+    @contextmanager
+    def using(self, name):
+        """使用模型期间不会被卸载"""
+        self.reserve(name)
+        with self._lock:
+            entry = self._entries[name]
+            entry.in_use += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+                entry.last_used = time.time()
+                self._released.notify_all()
+
+    @contextmanager
+    def stage(self, name):
+        """执行自行加载/释放模型的阶段（数字人、语音合成）
+
+        开始前按预估占用卸载空闲模型，仍放不下时等待同一设备上的其他阶段结束；
+        执行期间计入占用，结束后不再计入（残留的占用会在之后的实测中体现）。
+        """
+        config = get_config_service().snapshot
+        with self._lock:
+            if name not in self._entries:
+                device, size_mb = STAGE_MODELS.get(name, ("cuda", 0))
+                size_mb = config.getfloat("memory", f"{name}_mb", size_mb)
+                self.register(name, None, device, size_mb)
+        self.reserve(name, wait_s=config.getfloat("memory", "stage_wait_s", STAGE_WAIT_S))
+        with self._lock:
+            entry = self._entries[name]
+            entry.loaded = True
+            entry.in_use += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+                entry.last_used = time.time()
+                if not entry.in_use:
+                    entry.loaded = False
+                self._invalidate()
+                self._released.notify_all()
+
+    def track_service(self, service, pids):
+        """记录某个外部服务的进程（其子进程也会计入）"""
+        with self._lock:
+            self._service_pids.setdefault(service, set()).update(pids)
+        self._invalidate()
+
+    def _tracked_pids(self):
+        """{pid: 服务}：track_service 记录的仍在运行的进程及其子进程"""
+        with self._lock:
+            tracked = {service: set(pids) for service, pids in self._service_pids.items()}
+        owners = {}
+        for service, pids in tracked.items():
+            alive = set()
+            for pid in pids:
+                try:
+                    proc = psutil.Process(pid)
+                    children = proc.children(recursive=True)
+                except psutil.Error:
+                    continue
+                alive.add(pid)
+                owners[pid] = service
+                for child in children:
+                    owners.setdefault(child.pid, service)
+            with self._lock:
+                self._service_pids[service] = alive
+        return owners
+
+    def _external_usage(self, gpu_by_pid=None):
+        """外部服务进程的内存/显存占用
+
+        依次按 track_service 记录的进程、监听端口、命令行关键词识别，不计入本进程。
+        """
+        if psutil is None:
+            return {}
+        if gpu_by_pid is None:
+            gpu_by_pid = _gpu_usage_by_pid()
+        rules = _service_rules()
+        owners = self._tracked_pids()
+        watched_ports = {port for rule in rules.values() for port in rule["ports"]}
+        if watched_ports:
+            for port, pid in _listening_ports().items():
+                for service, rule in rules.items():
+                    if port in rule["ports"]:
+                        owners.setdefault(pid, service)
+        own_pid = os.getpid()
+        services = {}
+        for proc in psutil.process_iter(["pid", "cmdline", "memory_info"]):
+            pid = proc.info["pid"]
+            if pid == own_pid:
+                continue
+            service = owners.get(pid)
+            if service is None:
+                cmdline = " ".join(proc.info.get("cmdline") or []).lower()
+                if not cmdline:
+                    continue
+                service = next(
+                    (s for s, rule in rules.items() if any(k in cmdline for k in rule["keywords"])),
+                    None,
+                )
+                if service is None:
+                    continue
+            item = services.setdefault(service, {"pids": [], "ram_mb": 0.0, "vram_mb": 0.0})
+            item["pids"].append(pid)
+            if proc.info.get("memory_info"):
+                item["ram_mb"] += proc.info["memory_info"].rss / 1024 / 1024
+            item["vram_mb"] += gpu_by_pid.get(pid, 0)
+        return services
+
+    def usage(self):
+        """当前占用情况"""
+        with self._lock:
+            models = {
+                e.name: {
+                    "device": e.device,
+                    "size_mb": round(e.size_mb, 1),
+                    "loaded": e.loaded,
+                    "in_use": e.in_use,
+                    "last_used": e.last_used or None,
+                    "evictions": e.evictions,
+                }
+                for e in self._entries.values()
+            }
+            resident = {device: round(self._resident_mb(device), 1) for device in ("cuda", "cpu")}
+
+        process = {}
+        torch = _torch()
+        if torch is not None:
+            try:
+                if torch.cuda.is_available():
+                    process["cuda_allocated_mb"] = round(torch.cuda.memory_allocated() / 1024 / 1024, 1)
+                    process["cuda_reserved_mb"] = round(torch.cuda.memory_reserved() / 1024 / 1024, 1)
+            except Exception:
+                pass
+        if psutil is not None:
+            process["rss_mb"] = round(psutil.Process().memory_info().rss / 1024 / 1024, 1)
+            process["system_ram_available_mb"] = round(psutil.virtual_memory().available / 1024 / 1024, 1)
+
+        return {
+            "budgets_mb": {k: round(v, 1) if v else None for k, v in self.budgets.items()},
+            "resident_mb": resident,
+            "models": models,
+            "process": process,
+            "external_services": self._external_usage(),
+        }
+
+
+_governor = None
+_governor_lock = threading.Lock()
+
+
+def _apply_memory_config(config):
+    """配置修改后按新预算更新（未配置的设备保留按总量计算的预算）"""
+    governor = _governor
+    vram_budget = config.getfloat("memory", "vram_budget_mb")
+    ram_budget = config.getfloat("memory", "ram_budget_mb")
+    with governor._lock:
+        if vram_budget:
+            governor.budgets["cuda"] = vram_budget
+        if ram_budget:
+            governor.budgets["cpu"] = ram_budget
+
+
+def get_governor():
+    """获取进程内共享的内存管理器，预算来自 config.ini 的 [memory] 段（可选，修改后自动生效）"""
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            service = get_config_service()
+            config = service.snapshot
+            _governor = MemoryGovernor(
+                vram_budget_mb=config.getfloat("memory", "vram_budget_mb"),
+                ram_budget_mb=config.getfloat("memory", "ram_budget_mb"),
+            )
+            service.subscribe(_apply_memory_config, sections=("memory",))
+        return _governor
+
+
+def track_service(service):
+    """装饰器：记录启动函数执行期间新建的子进程，作为外部服务 service 的进程
+
+    用于 start_digit_human / start_cosyvoice 等启动独立服务的函数，
+    比按命令行关键词识别可靠。
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if psutil is None:
+                return fn(*args, **kwargs)
+            me = psutil.Process()
+            before = {child.pid for child in me.children(recursive=True)}
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                started = {child.pid for child in me.children(recursive=True)} - before
+                if started:
+                    get_governor().track_service(service, started)
+
+        return wrapper
+
+    return decorator
+
+
+def governed(name):
+    """装饰器：函数作为 name 阶段执行（见 MemoryGovernor.stage），支持生成器函数"""
+
+    def decorator(fn):
+        if inspect.isgeneratorfunction(fn):
+
+            @functools.wraps(fn)
+            def gen_wrapper(*args, **kwargs):
+                with get_governor().stage(name):
+                    yield from fn(*args, **kwargs)
+
+            return gen_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with get_governor().stage(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
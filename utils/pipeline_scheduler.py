@@ -0,0 +1,397 @@
+# -*- coding: utf-8 -*-
+"""
+流水线调度
+
+一个作业依次经过 文案(LLM/网络) → 语音合成(GPU) → 数字人(GPU) → 后期(CPU) → 发布(浏览器)，
+按作业串行执行时，发布走浏览器的几分钟里GPU空闲，渲染时浏览器又空闲。
+这里按资源类别给每个阶段建工作线程和等待队列，作业的一个步骤完成后进入下一个步骤
+所在资源类别的队列，于是作业N还在后期/发布时，作业N+1的前几个步骤已经在跑。
+
+- 各资源类别的等待队列有上限：步骤完成后要进入的下游队列已满时，上游不再领取
+  新步骤（背压），避免例如语音合成远远跑在数字人前面堆积大量中间文件
+- 同一资源类别内按作业提交顺序执行，先提交的作业先完成
+- 语音合成和数字人通常共用一块GPU，同属 "gpu" 组，组内同时运行的步骤数受 gpu_slots 限制
+
+一键流程（编译模块中的 auto_publishing_videos_DY_ALL）在一个函数里依次调用各阶段函数，
+无法拆成步骤提交。用 staged_flow 包装流程函数、用 pipeline_stage 包装各阶段函数后，
+流程执行期间调用的阶段会作为单步作业交给对应资源类别的工作线程执行，流程线程只负责
+串联等待；多个一键流程同时进行时，前一个的发布与后一个的音频/数字人阶段自然重叠。
+整条流程作为 REST 步骤提交时使用 "pipeline" 资源类别，不占用各阶段的工作线程。
+
+config.ini（可选）:
+    [scheduler]
+    queue_size = 2
+    gpu_slots = 1
+"""
+
+import time
+import uuid
+import inspect
+import logging
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from utils.config_service import get_config
+from utils.task_runner import RESOURCE_LIMITS
+
+logger = logging.getLogger(__name__)
+
+# 资源类别 → 工作线程数
+RESOURCE_CLASSES = {
+    "llm": 2,
+    "tts_gpu": 1,
+    "lipsync_gpu": 1,
+    "encode_cpu": 2,
+    "browser": 1,
+    # 整条一键流程（内部各阶段再分别交给上面的资源类别），名额与界面一致
+    "pipeline": RESOURCE_LIMITS["pipeline"],
+}
+# 共享同一设备的资源类别
+RESOURCE_GROUPS = {
+    "tts_gpu": "gpu",
+    "lipsync_gpu": "gpu",
+}
+DEFAULT_QUEUE_SIZE = 2
+DEFAULT_GPU_SLOTS = 1
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+
+class Step:
+    """流水线中的一个步骤
+
+    Args:
+        name: 步骤名称
+        resource: 资源类别，见 RESOURCE_CLASSES
+        fn: fn(context) 执行该步骤，异常表示失败
+    """
+
+    def __init__(self, name, resource, fn):
+        if resource not in RESOURCE_CLASSES:
+            raise ValueError(f"未知资源类别: {resource}")
+        self.name = name
+        self.resource = resource
+        self.fn = fn
+
+
+class PipelineJob:
+    def __init__(self, seq, steps, context, on_event):
+        self.id = uuid.uuid4().hex
+        self.seq = seq
+        self.steps = steps
+        self.context = context
+        self.on_event = on_event
+        self.index = 0
+        self.status = QUEUED
+        self.error = None
+        self.cancel_requested = False
+        self.done_event = threading.Event()
+        self.timings = []  # [(步骤名, 开始排队, 开始执行, 结束)]
+        self.enqueued = time.time()
+
+    @property
+    def step(self):
+        return self.steps[self.index]
+
+    def next_resource(self):
+        """当前步骤完成后要进入的资源类别，已是最后一步时为None"""
+        if self.index + 1 < len(self.steps):
+            return self.steps[self.index + 1].resource
+        return None
+
+    def wait(self, timeout=None):
+        self.done_event.wait(timeout)
+        return self
+
+
+class PipelineScheduler:
+    """按资源类别并行推进多个作业的步骤"""
+
+    def __init__(self, queue_size=DEFAULT_QUEUE_SIZE, gpu_slots=DEFAULT_GPU_SLOTS, resources=None):
+        self.queue_size = queue_size
+        self.resources = dict(resources or RESOURCE_CLASSES)
+        self.group_slots = {"gpu": gpu_slots}
+        self._cond = threading.Condition()
+        self._backlog = []  # 尚未进入流水线的作业
+        self._waiting = {resource: [] for resource in self.resources}
+        self._running = {resource: 0 for resource in self.resources}
+        self._group_running = {group: 0 for group in self.group_slots}
+        self._seq = 0
+        self._busy_seconds = {resource: 0.0 for resource in self.resources}
+        self._started = time.time()
+        for resource, workers in self.resources.items():
+            for i in range(workers):
+                threading.Thread(
+                    target=self._worker, args=(resource,), name=f"pipeline-{resource}-{i}", daemon=True
+                ).start()
+
+    def submit(self, steps, context=None, on_event=None):
+        """提交作业
+
+        Args:
+            steps: [Step]
+            context: 各步骤共享的上下文
+            on_event: on_event(job, 事件名, 步骤名) 回调，事件为 queued/started/step_done/done/failed/cancelled
+
+        Returns:
+            PipelineJob
+        """
+        if not steps:
+            raise ValueError("作业至少需要一个步骤")
+        with self._cond:
+            self._seq += 1
+            job = PipelineJob(self._seq, list(steps), context, on_event)
+            self._backlog.append(job)
+            self._admit()
+            self._cond.notify_all()
+        self._emit(job, "queued")
+        return job
+
+    def cancel(self, job):
+        """取消作业；正在执行的步骤会执行完，之后的步骤不再执行
+
+        Returns:
+            bool: 作业是否还未结束
+        """
+        with self._cond:
+            if job.done_event.is_set():
+                return False
+            job.cancel_requested = True
+            if job in self._backlog:
+                self._backlog.remove(job)
+            elif job in self._waiting[job.step.resource]:
+                self._waiting[job.step.resource].remove(job)
+            else:
+                return True  # 运行中，步骤结束后处理
+            self._admit()
+            self._cond.notify_all()
+        self._finish(job, CANCELLED)
+        return True
+
+    def _admit(self):
+        """按提交顺序把作业放入第一个步骤的队列
+
+        队列已满的作业留在积压中，但不挡住后面第一个步骤在其他资源类别上的作业；
+        同一资源类别的作业仍按提交顺序进入队列。
+        """
+        for job in list(self._backlog):
+            if len(self._waiting[job.step.resource]) >= self.queue_size:
+                continue
+            self._backlog.remove(job)
+            job.enqueued = time.time()
+            self._waiting[job.step.resource].append(job)
+
+    def _group_free(self, resource):
+        group = RESOURCE_GROUPS.get(resource)
+        return group is None or self._group_running[group] < self.group_slots[group]
+
+    def _first_runnable(self, resource):
+        """某资源类别中按正常规则（组内有空位、下游队列未满）可执行的第一个步骤"""
+        if not self._waiting[resource] or not self._group_free(resource):
+            return None
+        for job in sorted(self._waiting[resource], key=lambda job: job.seq):
+            next_resource = job.next_resource()
+            # 下游队列已满时先不执行，等下游消化
+            if next_resource is None or len(self._waiting[next_resource]) < self.queue_size:
+                return job
+        return None
+
+    def _pick(self, resource):
+        """为某资源类别选出下一个可执行的步骤（调用方持有锁）"""
+        job = self._first_runnable(resource)
+        if job is not None or not self._waiting[resource] or not self._group_free(resource):
+            return job
+        if any(self._running.values()) or any(self._first_runnable(r) for r in self.resources):
+            return None
+        # 没有运行中的步骤，任何资源类别都没有可执行的步骤，说明各队列互相等待
+        # （步骤在资源间来回时可能出现），此时才忽略下游上限避免卡死
+        return min(self._waiting[resource], key=lambda job: job.seq)
+
+    def _worker(self, resource):
+        while True:
+            with self._cond:
+                job = self._pick(resource)
+                while job is None:
+                    self._cond.wait()
+                    job = self._pick(resource)
+                self._waiting[resource].remove(job)
+                self._running[resource] += 1
+                group = RESOURCE_GROUPS.get(resource)
+                if group:
+                    self._group_running[group] += 1
+                self._admit()
+                # 队列腾出位置、积压作业进入其他资源的队列，唤醒等待的工作线程
+                self._cond.notify_all()
+
+            step = job.step
+            if job.status == QUEUED:
+                job.status = RUNNING
+                self._emit(job, "started")
+            start = time.time()
+            error = None
+            try:
+                step.fn(job.context)
+            except Exception as e:
+                logger.error(f"作业 {job.id} 步骤 {step.name} 失败: {e}")
+                error = str(e) or repr(e)
+            end = time.time()
+            job.timings.append((step.name, job.enqueued, start, end))
+
+            with self._cond:
+                self._running[resource] -= 1
+                if group:
+                    self._group_running[group] -= 1
+                self._busy_seconds[resource] += end - start
+                self._cond.notify_all()
+
+            if error is not None:
+                self._finish(job, FAILED, error)
+                continue
+            if job.cancel_requested:
+                self._finish(job, CANCELLED)
+                continue
+            self._emit(job, "step_done", step.name)
+            if job.next_resource() is None:
+                self._finish(job, DONE)
+                continue
+            with self._cond:
+                # 取消可能发生在上一步结束之后、进入下一个队列之前
+                cancelled = job.cancel_requested
+                if not cancelled:
+                    job.index += 1
+                    job.enqueued = time.time()
+                    self._waiting[job.step.resource].append(job)
+                    self._cond.notify_all()
+            if cancelled:
+                self._finish(job, CANCELLED)
+
+    def call(self, name, resource, fn, *args, **kwargs):
+        """把一次函数调用作为单步作业交给某资源类别执行，等待完成后返回结果
+
+        调用方的 contextvars（例如追踪的任务ID）会带到执行线程；函数抛出的异常原样抛出。
+        """
+        context = contextvars.copy_context()
+        outcome = {}
+
+        def run(_):
+            try:
+                outcome["result"] = context.run(fn, *args, **kwargs)
+            except Exception as e:
+                outcome["error"] = e
+
+        job = self.submit([Step(name, resource, run)]).wait()
+        if "error" in outcome:
+            raise outcome["error"]
+        if job.status != DONE:
+            raise RuntimeError(f"步骤 {name} 未执行: {job.status}")
+        return outcome.get("result")
+
+    def _emit(self, job, event, step_name=None):
+        if job.on_event is None:
+            return
+        try:
+            job.on_event(job, event, step_name)
+        except Exception as e:
+            logger.warning(f"流水线事件回调失败: {e}")
+
+    def _finish(self, job, status, error=None):
+        job.status = status
+        job.error = error
+        job.done_event.set()
+        self._emit(job, status)
+
+    def stats(self):
+        """各资源类别的排队数、运行数和利用率"""
+        with self._cond:
+            elapsed = max(time.time() - self._started, 1e-6)
+            return {
+                "backlog": len(self._backlog),
+                "resources": {
+                    resource: {
+                        "workers": workers,
+                        "waiting": len(self._waiting[resource]),
+                        "running": self._running[resource],
+                        "utilization": round(self._busy_seconds[resource] / (elapsed * workers), 3),
+                    }
+                    for resource, workers in self.resources.items()
+                },
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """获取进程内共享的流水线调度器，参数来自 config.ini 的 [scheduler] 段（可选）"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            config = get_config()
+            _scheduler = PipelineScheduler(
+                queue_size=config.getint("scheduler", "queue_size", DEFAULT_QUEUE_SIZE),
+                gpu_slots=config.getint("scheduler", "gpu_slots", DEFAULT_GPU_SLOTS),
+            )
+        return _scheduler
+
+
+_flow_local = threading.local()
+
+
+def staged_flow(fn):
+    """装饰器：函数执行期间，其中调用的 pipeline_stage 阶段交给调度器执行
+
+    支持普通函数和生成器函数；标记只对当前线程有效，阶段在工作线程中
+    再调用的其他阶段直接执行，不会重复提交。
+    """
+
+    @contextmanager
+    def active():
+        previous = getattr(_flow_local, "active", False)
+        _flow_local.active = True
+        try:
+            yield
+        finally:
+            _flow_local.active = previous
+
+    if inspect.isgeneratorfunction(fn):
+
+        @functools.wraps(fn)
+        def gen_wrapper(*args, **kwargs):
+            with active():
+                yield from fn(*args, **kwargs)
+
+        return gen_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with active():
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def pipeline_stage(resource, name=None):
+    """装饰器：在 staged_flow 流程中调用时，作为单步作业交给 resource 资源类别执行
+
+    不在流程中调用（界面按钮、REST 单独的步骤）时直接执行。生成器函数的调用方要逐步
+    取值，无法整体交给工作线程，保持直接执行。
+    """
+    if resource not in RESOURCE_CLASSES:
+        raise ValueError(f"未知资源类别: {resource}")
+
+    def decorator(fn):
+        if inspect.isgeneratorfunction(fn):
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not getattr(_flow_local, "active", False):
+                return fn(*args, **kwargs)
+            return get_scheduler().call(name or fn.__name__, resource, fn, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,554 @@
+# -*- coding: utf-8 -*-
+"""
+REST/JSON 批量任务接口
+
+界面之外的集成方原来只能走 Gradio 的逐组件事件协议（/queue/join），
+一个流程要按组件顺序拼参数、逐个事件调用。这里在同一个 demo.app 上提供
+/api/v1 路由：按任务名提交批量作业（每个作业是若干步骤，后面的步骤可以
+引用前面步骤的输出），分页查询状态，下载产物，取消，以及通过 SSE 推送进度。
+各步骤由 pipeline_scheduler 按资源类别调度，同一批的多个作业在不同资源上重叠执行；
+步骤本身仍通过 task_runner 的资源线程池执行，与界面共享 GPU/CPU/网络 并发限制。
+登记了 worker_kind 的任务（语音合成/数字人/转码）在有对应阶段的在线渲染节点时
+改为提交到 worker_queue，由渲染节点执行，产物回传后作为该步骤的输出；
+节点在领取任务前全部失联时改回本机执行。
+
+接口:
+    GET  /api/v1/tasks                        可用任务及参数
+    GET  /api/v1/scheduler                    各资源类别的排队与利用率
+    POST /api/v1/jobs                         提交作业（单个或批量）
+    GET  /api/v1/jobs?status=&batch_id=&page=&page_size=   分页列表
+    GET  /api/v1/jobs/{job_id}                作业状态
+    GET  /api/v1/jobs/{job_id}/events         进度（text/event-stream）
+    GET  /api/v1/jobs/{job_id}/artifacts      产物列表
+    GET  /api/v1/jobs/{job_id}/artifacts/{name}  下载产物
+    POST /api/v1/jobs/{job_id}/cancel         取消
+
+提交示例:
+    {"items": [{"steps": [
+        {"task": "audio", "params": {"text": "大家好", "voice": "女声.pt"}},
+        {"task": "lipsync", "params": {"face": "主播A", "audio": "$audio"}},
+        {"task": "publish_all", "params": {"video": "$video", "text": "标题"}}
+    ]}]}
+参数值为 "$输出名" 时引用本作业前面步骤的同名输出，以 "$" 开头的字面字符串写作 "$$..."。
+
+所有接口需要在请求头 X-API-Token（或 Authorization: Bearer ...）中携带
+config.ini 的 [api] token；未设置令牌时不挂载本路由。
+"""
+
+import os
+import json
+import time
+import hmac
+import uuid
+import shutil
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+
+from utils.config_service import get_config
+from utils.media_cache import get_cache_dir
+from utils.pipeline_scheduler import Step, get_scheduler
+from utils.task_runner import run_stage
+from utils.worker_queue import DONE as WORKER_DONE, QUEUED as WORKER_QUEUED, get_job_queue
+
+logger = logging.getLogger(__name__)
+
+API_PREFIX = "/api/v1"
+MAX_JOBS = 500  # 内存中保留的作业数，超出后丢弃最早结束的
+JOB_TTL = 24 * 3600  # 结束超过该时长的作业也会丢弃
+TRIM_INTERVAL = 60
+MAX_EVENTS = 200  # 每个作业保留的最近事件数（SSE 断线重连时更早的事件不再补发）
+MAX_PAGE_SIZE = 100
+SSE_POLL_INTERVAL = 0.5
+REMOTE_POLL_INTERVAL = 1.0
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+REQUIRED = object()
+
+# task_runner 资源类别 → 流水线资源类别（登记任务时未指定时使用）
+PIPELINE_RESOURCES = {
+    "gpu": "lipsync_gpu",
+    "cpu": "encode_cpu",
+    "network": "llm",
+    "pipeline": "pipeline",
+}
+
+
+class TaskSpec:
+    """可通过接口调用的处理函数
+
+    Args:
+        name: 任务名
+        stage: 阶段名称（进度显示和耗时统计）
+        resource: 资源类别，见 task_runner.RESOURCE_LIMITS
+        fn: 处理函数
+        params: [(参数名, 默认值)]，按处理函数的位置参数顺序；默认值为 REQUIRED 表示必填
+        outputs: 返回值各项的名称
+        pipeline_resource: 流水线资源类别，见 pipeline_scheduler.RESOURCE_CLASSES
+        worker_kind: 渲染节点的任务类型（见 worker_node.HANDLERS），有在线节点时交给节点执行
+        file_params: 值为本地文件的参数，交给节点时作为输入文件下发
+        file_outputs: 必须是已存在文件的输出（{键: 文件} 形式的输出要求非空且各项都存在），
+            处理函数未抛异常但没有生成文件时该步骤按失败处理
+    """
+
+    def __init__(
+        self, name, stage, resource, fn, params, outputs,
+        pipeline_resource=None, worker_kind=None, file_params=(), file_outputs=(),
+    ):
+        self.name = name
+        self.stage = stage
+        self.resource = resource
+        self.fn = fn
+        self.params = params
+        self.outputs = outputs
+        self.pipeline_resource = pipeline_resource or PIPELINE_RESOURCES[resource]
+        self.worker_kind = worker_kind
+        self.file_params = tuple(file_params)
+        self.file_outputs = tuple(file_outputs)
+
+    def build_args(self, params, context):
+        args = []
+        for name, default in self.params:
+            value = params.get(name, default)
+            if isinstance(value, str) and value.startswith("$$"):
+                value = value[1:]
+            elif isinstance(value, str) and value.startswith("$"):
+                ref = value[1:]
+                if ref not in context:
+                    raise ValueError(f"{self.name}.{name} 引用的输出 {ref} 不存在")
+                value = context[ref]
+            if value is REQUIRED:
+                raise ValueError(f"{self.name} 缺少参数 {name}")
+            args.append(value)
+        return args
+
+    def name_outputs(self, result):
+        if len(self.outputs) == 1:
+            return {self.outputs[0]: result}
+        result = list(result) if isinstance(result, (list, tuple)) else [result]
+        return dict(zip(self.outputs, result))
+
+    def check_outputs(self, outputs):
+        """确认 file_outputs 中的输出都是已存在的文件，否则抛出 RuntimeError"""
+        for name in self.file_outputs:
+            value = outputs.get(name)
+            paths = list(value.values()) if isinstance(value, dict) else [value]
+            if not paths or not all(isinstance(p, str) and os.path.isfile(p) for p in paths):
+                raise RuntimeError(f"❌ {self.stage}未生成有效的 {name} 文件: {value}")
+
+    @staticmethod
+    def _param_dict(name, default):
+        if default is REQUIRED:
+            return {"name": name, "required": True}
+        return {"name": name, "required": False, "default": default}
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "stage": self.stage,
+            "resource": self.resource,
+            "pipeline_resource": self.pipeline_resource,
+            "worker_kind": self.worker_kind,
+            "params": [self._param_dict(name, default) for name, default in self.params],
+            "outputs": self.outputs,
+        }
+
+
+_tasks = OrderedDict()
+
+
+def register_task(
+    name, stage, resource, fn, params, outputs,
+    pipeline_resource=None, worker_kind=None, file_params=(), file_outputs=(),
+):
+    """登记接口可调用的任务，params 中的元素可以是参数名（必填）或 (参数名, 默认值)"""
+    params = [(p, REQUIRED) if isinstance(p, str) else tuple(p) for p in params]
+    _tasks[name] = TaskSpec(
+        name, stage, resource, fn, params, list(outputs),
+        pipeline_resource, worker_kind, file_params, file_outputs,
+    )
+
+
+class ApiJob:
+    def __init__(self, batch_id, steps, label=None):
+        self.id = uuid.uuid4().hex
+        self.batch_id = batch_id
+        self.label = label
+        self.steps = steps
+        self.status = QUEUED
+        self.current_step = None
+        self.message = None
+        self.outputs = {}
+        self.artifacts = {}
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.events = []  # [(序号, 事件名, 数据)]，只保留最近 MAX_EVENTS 个
+        self.dropped_events = 0
+        self.pipeline_job = None
+
+    def emit(self, event, **data):
+        self.events.append((self.dropped_events + len(self.events), event, data))
+        excess = len(self.events) - MAX_EVENTS
+        if excess > 0:
+            del self.events[:excess]
+            self.dropped_events += excess
+
+    def events_since(self, seq):
+        """序号不小于 seq 的事件"""
+        events = self.events
+        return events[max(0, seq - self.dropped_events):] if events else []
+
+    @property
+    def next_seq(self):
+        return self.dropped_events + len(self.events)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "batch_id": self.batch_id,
+            "label": self.label,
+            "status": self.status,
+            "steps": [step["task"] for step in self.steps],
+            "current_step": self.current_step,
+            "message": self.message,
+            "outputs": {k: v for k, v in self.outputs.items() if _is_json_scalar(v)},
+            "artifacts": sorted(self.artifacts),
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+def _is_json_scalar(value):
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+class ApiJobStore:
+    """作业登记与执行"""
+
+    def __init__(self, scheduler=None):
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._scheduler = scheduler or get_scheduler()
+        self._trimmer = threading.Thread(target=self._trim_loop, name="api-job-trim", daemon=True)
+        self._trimmer.start()
+
+    def validate(self, steps):
+        if not steps:
+            raise ValueError("作业至少需要一个步骤")
+        for step in steps:
+            if step.get("task") not in _tasks:
+                raise ValueError(f"未知任务: {step.get('task')}")
+
+    def submit(self, items):
+        """提交一批作业
+
+        Args:
+            items: [{"steps": [{"task", "params"}], "label": 可选}]
+
+        Returns:
+            tuple: (批次ID, [ApiJob])
+        """
+        for item in items:
+            self.validate(item.get("steps") or [])
+        batch_id = uuid.uuid4().hex[:12]
+        jobs = [ApiJob(batch_id, item["steps"], item.get("label")) for item in items]
+        with self._lock:
+            for job in jobs:
+                self._jobs[job.id] = job
+            self._trim()
+        for job in jobs:
+            job.emit("queued")
+            steps = [
+                Step(step["task"], _tasks[step["task"]].pipeline_resource, self._step_runner(index, step))
+                for index, step in enumerate(job.steps)
+            ]
+            job.pipeline_job = self._scheduler.submit(steps, context=job, on_event=self._on_event)
+        return batch_id, jobs
+
+    def _trim(self):
+        """丢弃结束超过 JOB_TTL 的作业，以及超出 MAX_JOBS 时最早结束的作业（调用方持有锁）"""
+        finished = [j for j in self._jobs.values() if j.finished]
+        excess = max(0, len(self._jobs) - MAX_JOBS)
+        expired = time.time() - JOB_TTL
+        for index, job in enumerate(finished):
+            if index >= excess and job.finished > expired:
+                continue
+            job_id = job.id
+            del self._jobs[job_id]
+            # 渲染节点回传的产物
+            shutil.rmtree(os.path.join(get_cache_dir("api"), job_id), ignore_errors=True)
+
+    def _trim_loop(self):
+        while True:
+            time.sleep(TRIM_INTERVAL)
+            with self._lock:
+                self._trim()
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def list(self, status=None, batch_id=None, page=1, page_size=20):
+        with self._lock:
+            jobs = [
+                job
+                for job in reversed(self._jobs.values())
+                if (status is None or job.status == status) and (batch_id is None or job.batch_id == batch_id)
+            ]
+        start = (page - 1) * page_size
+        return len(jobs), jobs[start : start + page_size]
+
+    def cancel(self, job_id):
+        """请求取消；等待中的作业直接取消，正在执行的步骤结束后停止"""
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return False
+        return self._scheduler.cancel(job.pipeline_job)
+
+    def _finish(self, job, status, error=None):
+        job.status = status
+        job.error = error
+        job.current_step = None
+        job.finished = time.time()
+        job.emit(status, error=error, artifacts=sorted(job.artifacts))
+
+    def scheduler_stats(self):
+        return self._scheduler.stats()
+
+    def _on_event(self, pipeline_job, event, step_name):
+        job = pipeline_job.context
+        if event == "started":
+            job.status = RUNNING
+            job.started = time.time()
+            job.emit("started")
+        elif event in (DONE, FAILED, CANCELLED):
+            self._finish(job, event, pipeline_job.error)
+
+    def _step_runner(self, index, step):
+        spec = _tasks[step["task"]]
+
+        def run(job):
+            job.current_step = spec.name
+            args = spec.build_args(step.get("params") or {}, job.outputs)
+            job.emit("step", step=spec.name, index=index)
+
+            outputs = None
+            if spec.worker_kind and get_job_queue().has_worker(spec.worker_kind):
+                outputs = self._run_remote(job, spec, args)
+            if outputs is None:
+                result = None
+                for message, done, value in run_stage(spec.stage, spec.resource, spec.fn, *args):
+                    job.message = message
+                    job.emit("progress", step=spec.name, message=message)
+                    if done:
+                        result = value
+                if job.message.startswith("❌"):
+                    raise RuntimeError(job.message)
+                outputs = spec.name_outputs(result)
+
+            if job.pipeline_job is not None and job.pipeline_job.cancel_requested:
+                return
+            spec.check_outputs(outputs)
+            job.outputs.update(outputs)
+            # 与渲染节点产物同样命名：单个文件为 "<输出名>.<扩展名>"，{键: 文件} 为 "<输出名>.<键>.<扩展名>"
+            for name, value in outputs.items():
+                items = value.items() if isinstance(value, dict) else [(None, value)]
+                for key, path in items:
+                    if isinstance(path, str) and os.path.isfile(path):
+                        prefix = name if key is None else f"{name}.{key}"
+                        job.artifacts[prefix + os.path.splitext(path)[1]] = path
+
+        return run
+
+    def _run_remote(self, job, spec, args):
+        """把步骤提交给渲染节点执行，等待完成后把产物和结果映射为步骤输出
+
+        Returns:
+            dict: 步骤输出；节点在领取任务前全部失联时返回None，由调用方改为本机执行
+        """
+        queue = get_job_queue()
+        params = dict(zip((name for name, _ in spec.params), args))
+        inputs = {
+            name: params.pop(name)
+            for name in spec.file_params
+            if isinstance(params.get(name), str) and os.path.isfile(params[name])
+        }
+        remote = queue.submit(spec.worker_kind, params, inputs)
+        logger.info(f"作业 {job.id} 步骤 {spec.name} 已提交到渲染节点，任务 {remote.id}")
+
+        try:
+            last = None
+            while not remote.done_event.wait(REMOTE_POLL_INTERVAL):
+                if job.pipeline_job is not None and job.pipeline_job.cancel_requested:
+                    # 调度器在步骤返回后按取消处理
+                    queue.cancel(remote.id)
+                    return {}
+                if remote.status == WORKER_QUEUED and not queue.has_worker(spec.worker_kind):
+                    # 节点已全部失联（租约超时的任务也会回到排队状态），取消成功说明还没有节点领取
+                    if queue.cancel(remote.id):
+                        logger.warning(f"作业 {job.id} 步骤 {spec.name} 没有在线的渲染节点，改为本机执行")
+                        return None
+                message = f"⏳ {spec.stage}中（渲染节点 {remote.worker_id or '排队'}）... {remote.progress or ''}".rstrip()
+                if message != last:
+                    job.message = last = message
+                    job.emit("progress", step=spec.name, message=message)
+
+            if remote.orphaned:
+                logger.warning(f"作业 {job.id} 步骤 {spec.name} 没有在线的渲染节点，改为本机执行")
+                return None
+            if remote.status != WORKER_DONE:
+                job.message = f"❌ {spec.stage}失败（渲染节点）: {remote.error}"
+                job.emit("progress", step=spec.name, message=job.message)
+                raise RuntimeError(job.message)
+            job.message = f"✅ {spec.stage}完成（渲染节点 {remote.worker_id}）"
+            job.emit("progress", step=spec.name, message=job.message)
+
+            # 产物移出任务目录（任务目录随后删除），放到本作业的目录下
+            output_dir = get_cache_dir("api", job.id)
+            values = dict(remote.result or {})
+            for name, path in remote.artifacts.items():
+                target = os.path.join(output_dir, f"{spec.name}.{name}")
+                os.replace(path, target)
+                # 产物名 "<输出名>.<扩展名>" 对应单个文件输出，"<输出名>.<键>.<扩展名>" 对应 {键: 文件} 输出
+                parts = name.split(".")
+                if len(parts) == 3:
+                    values.setdefault(parts[0], {})[parts[1]] = target
+                else:
+                    values[parts[0]] = target
+            return {name: values.get(name) for name in spec.outputs}
+        finally:
+            queue.cleanup(remote.id)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_job_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ApiJobStore()
+        return _store
+
+
+def api_token_configured():
+    """config.ini 的 [api] 段是否设置了接口令牌"""
+    return bool(get_config().get("api", "token"))
+
+
+def create_api_router(store=None):
+    """创建 /api/v1 的 FastAPI 路由（调用方应先确认已设置接口令牌）"""
+    from fastapi import APIRouter, Body, Depends, Header, HTTPException, Request
+    from fastapi.responses import FileResponse, StreamingResponse
+
+    def check_token(x_api_token: str = Header(default=None), authorization: str = Header(default=None)):
+        # 每次请求读取当前快照，修改令牌后无需重启；令牌被删除后拒绝所有请求
+        token = get_config().get("api", "token")
+        if not token:
+            raise HTTPException(status_code=403, detail="未设置接口令牌")
+        if not x_api_token and authorization and authorization.startswith("Bearer "):
+            x_api_token = authorization[len("Bearer "):].strip()
+        if not x_api_token or not hmac.compare_digest(x_api_token, token):
+            raise HTTPException(status_code=401, detail="无效的接口令牌")
+
+    store = store or get_job_store()
+    router = APIRouter(prefix=API_PREFIX, dependencies=[Depends(check_token)])
+
+    def get_job_or_404(job_id):
+        job = store.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="作业不存在")
+        return job
+
+    @router.get("/tasks")
+    async def tasks():
+        return {"tasks": [spec.to_dict() for spec in _tasks.values()]}
+
+    @router.get("/scheduler")
+    async def scheduler_stats():
+        return store.scheduler_stats()
+
+    @router.post("/jobs", status_code=202)
+    async def submit(payload: dict = Body(...)):
+        items = payload.get("items")
+        if items is None:
+            items = [{"steps": payload.get("steps"), "label": payload.get("label")}]
+        try:
+            batch_id, jobs = store.submit(items)
+        except (ValueError, TypeError, AttributeError) as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        return {"batch_id": batch_id, "jobs": [job.id for job in jobs]}
+
+    @router.get("/jobs")
+    async def list_jobs(status: str = None, batch_id: str = None, page: int = 1, page_size: int = 20):
+        page = max(1, page)
+        page_size = min(max(1, page_size), MAX_PAGE_SIZE)
+        total, jobs = store.list(status, batch_id, page, page_size)
+        return {
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "items": [job.to_dict() for job in jobs],
+        }
+
+    @router.get("/jobs/{job_id}")
+    async def job_status(job_id: str):
+        return get_job_or_404(job_id).to_dict()
+
+    @router.get("/jobs/{job_id}/events")
+    async def job_events(job_id: str, request: Request):
+        job = get_job_or_404(job_id)
+        last_id = request.headers.get("last-event-id")
+        start = int(last_id) + 1 if last_id and last_id.isdigit() else 0
+
+        async def stream():
+            position = start
+            while True:
+                for seq, event, data in job.events_since(position):
+                    yield f"id: {seq}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+                    position = seq + 1
+                if job.finished and position >= job.next_seq:
+                    return
+                if await request.is_disconnected():
+                    return
+                await asyncio.sleep(SSE_POLL_INTERVAL)
+
+        return StreamingResponse(
+            stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"}
+        )
+
+    @router.get("/jobs/{job_id}/artifacts")
+    async def artifacts(job_id: str):
+        job = get_job_or_404(job_id)
+        return {
+            "artifacts": [
+                {
+                    "name": name,
+                    "size": os.path.getsize(path) if os.path.exists(path) else None,
+                    "url": f"{API_PREFIX}/jobs/{job_id}/artifacts/{name}",
+                }
+                for name, path in sorted(job.artifacts.items())
+            ]
+        }
+
+    @router.get("/jobs/{job_id}/artifacts/{name}")
+    async def artifact(job_id: str, name: str):
+        job = get_job_or_404(job_id)
+        path = job.artifacts.get(name)
+        if path is None or not os.path.exists(path):
+            raise HTTPException(status_code=404, detail="产物不存在")
+        return FileResponse(path, filename=os.path.basename(path))
+
+    @router.post("/jobs/{job_id}/cancel")
+    async def cancel(job_id: str):
+        job = get_job_or_404(job_id)
+        if not store.cancel(job_id):
+            raise HTTPException(status_code=409, detail=f"作业已结束: {job.status}")
+        return {"id": job_id, "cancel_requested": True}
+
+    return router
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+后台任务执行与进度推送
+
+耗时的处理函数（数字人生成、一键发布、音频生成、加字幕）如果直接绑定到按钮，
+会占住Gradio的工作线程数分钟，且只在结束时才更新状态。这里按资源类别
+（GPU / CPU / 网络）各建一个线程池，处理函数交给线程池执行，界面侧的生成器
+每秒推送一次阶段进度和预计剩余时间。
+"""
+
+import os
+import json
+import time
+import queue
+import inspect
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.media_cache import get_cache_dir
+from utils.memory_governor import release_memory
+
+logger = logging.getLogger(__name__)
+
+# 各资源类别允许同时运行的任务数，同时用作Gradio事件的 concurrency_limit
+RESOURCE_LIMITS = {
+    "gpu": 1,
+    "cpu": 2,
+    "network": 4,
+    # 同时进行的一键流程（文案→音频→数字人→后期→发布）数；流程内各阶段由
+    # pipeline_scheduler 按资源类别排队执行，GPU阶段另外通过 gpu_slot() 与其他GPU任务互斥
+    "pipeline": 2,
+}
+
+PROGRESS_INTERVAL = 1.0
+
+_executors = {}
+_executors_lock = threading.Lock()
+_durations_lock = threading.Lock()
+_durations = None
+
+_DONE = object()
+
+_gpu_slots = threading.BoundedSemaphore(RESOURCE_LIMITS["gpu"])
+_gpu_local = threading.local()
+
+
+def get_executor(resource):
+    """获取某资源类别的线程池"""
+    with _executors_lock:
+        if resource not in _executors:
+            _executors[resource] = ThreadPoolExecutor(
+                max_workers=RESOURCE_LIMITS[resource],
+                thread_name_prefix=f"task-{resource}",
+            )
+        return _executors[resource]
+
+
+@contextmanager
+def gpu_slot():
+    """占用一个GPU名额（同一线程内可重入）
+
+    "gpu" 线程池只能约束经由它提交的任务；一键流程在自己的线程里依次调用
+    音频生成和数字人生成，需要在这两个阶段内显式占用GPU名额，
+    发布等非GPU阶段则不占用。
+    """
+    depth = getattr(_gpu_local, "depth", 0)
+    if depth == 0:
+        _gpu_slots.acquire()
+    _gpu_local.depth = depth + 1
+    try:
+        yield
+    finally:
+        _gpu_local.depth = depth
+        if depth == 0:
+            _gpu_slots.release()
+
+
+def gpu_bound(fn):
+    """装饰器：函数执行期间占用GPU名额，支持普通函数和生成器函数"""
+    if inspect.isgeneratorfunction(fn):
+
+        @functools.wraps(fn)
+        def gen_wrapper(*args, **kwargs):
+            with gpu_slot():
+                yield from fn(*args, **kwargs)
+
+        return gen_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with gpu_slot():
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def _durations_path():
+    return os.path.join(get_cache_dir("stats"), "stage_durations.json")
+
+
+def _load_durations():
+    global _durations
+    if _durations is None:
+        try:
+            with open(_durations_path(), "r", encoding="utf-8") as f:
+                _durations = json.load(f)
+        except (OSError, ValueError):
+            _durations = {}
+    return _durations
+
+
+def estimate_duration(stage):
+    """根据历史耗时估算阶段耗时（秒），没有历史记录时返回None"""
+    with _durations_lock:
+        history = _load_durations().get(stage)
+    if not history:
+        return None
+    return sum(history) / len(history)
+
+
+def record_duration(stage, seconds, keep=20):
+    """记录阶段耗时，只保留最近 keep 次"""
+    with _durations_lock:
+        durations = _load_durations()
+        history = durations.setdefault(stage, [])
+        history.append(round(seconds, 2))
+        del history[:-keep]
+        try:
+            with open(_durations_path(), "w", encoding="utf-8") as f:
+                json.dump(durations, f, ensure_ascii=False)
+        except OSError as e:
+            logger.warning(f"保存阶段耗时失败: {e}")
+
+
+def format_progress(stage, elapsed, estimate, detail=None):
+    """拼接状态栏显示的进度文字"""
+    message = f"⏳ {stage}中... 已用时 {int(elapsed)}s"
+    if estimate:
+        remaining = estimate - elapsed
+        if remaining > 0:
+            message += f"，预计剩余 {int(remaining)}s（{min(99, int(elapsed / estimate * 100))}%）"
+        else:
+            message += "，即将完成"
+    if detail:
+        message += f"\n{detail}"
+    return message
+
+
+def run_stage(stage, resource, fn, *args, **kwargs):
+    """在资源线程池中执行处理函数，并持续产出进度
+
+    fn 为生成器函数时，其每次 yield 的内容会作为阶段细节转发出来。
+    本生成器被关闭（例如Gradio事件被取消）时：任务还在排队则直接取消；
+    生成器函数在下一次 yield 后停止；普通函数无法中断，会在后台执行完，结果被丢弃。
+
+    Yields:
+        tuple: (进度文字, 是否完成, 结果)。未完成时结果为None，
+        完成时结果为 fn 的返回值（生成器函数则为最后一次yield的值）
+    """
+    events = queue.Queue()
+    is_generator = inspect.isgeneratorfunction(fn)
+    cancelled = threading.Event()
+
+    def worker():
+        if is_generator:
+            last = None
+            gen = fn(*args, **kwargs)
+            try:
+                for last in gen:
+                    if cancelled.is_set():
+                        logger.info(f"{stage}已取消")
+                        break
+                    events.put(("detail", last))
+            finally:
+                gen.close()
+            return last
+        return fn(*args, **kwargs)
+
+    start = time.time()
+    estimate = estimate_duration(stage)
+    future = get_executor(resource).submit(worker)
+    future.add_done_callback(lambda _: events.put((_DONE, None)))
+
+    detail = None
+    try:
+        yield format_progress(stage, 0, estimate), False, None
+        while True:
+            try:
+                kind, value = events.get(timeout=PROGRESS_INTERVAL)
+            except queue.Empty:
+                yield format_progress(stage, time.time() - start, estimate, detail), False, None
+                continue
+            if kind is _DONE:
+                break
+            detail = value if isinstance(value, str) else None
+            if is_generator:
+                # 生成器的中间结果直接透传，方便界面同步更新
+                yield format_progress(stage, time.time() - start, estimate, detail), False, value
+    except GeneratorExit:
+        cancelled.set()
+        if not future.cancel() and not is_generator:
+            logger.info(f"{stage}已取消，正在执行的处理函数无法中断，将在后台执行完")
+        raise
+
+    elapsed = time.time() - start
+    if resource == "gpu":
+        # GPU阶段结束后释放缓存的显存，避免与下一个阶段的模型叠加
+        release_memory()
+    try:
+        result = future.result()
+    except Exception as e:
+        logger.error(f"{stage}失败: {e}")
+        yield f"❌ {stage}失败: {e}", True, None
+        return
+    record_duration(stage, elapsed)
+    yield f"✅ {stage}完成，耗时 {elapsed:.1f}s", True, result
+
+
+def stream_handler(stage, resource, fn, output_count, status_index=None):
+    """把同步处理函数包装成流式推送进度的生成器处理函数
+
+    Args:
+        stage: 阶段名称（用于显示和耗时统计）
+        resource: 资源类别，见 RESOURCE_LIMITS
+        fn: 原处理函数
+        output_count: 绑定的输出组件数量
+        status_index: 状态输出组件在输出中的位置；为None时表示原函数
+            不输出状态，进度追加为最后一个输出
+
+    Returns:
+        function: 可直接绑定到Gradio事件的生成器函数
+    """
+    import gradio as gr
+
+    # 原函数自身的输出数量
+    own_count = output_count if status_index is not None else output_count - 1
+    progress_index = output_count - 1 if status_index is None else status_index
+
+    def handler(*args):
+        for message, done, result in run_stage(stage, resource, fn, *args):
+            # 多输出的生成器中间也可能只 yield 一段状态文字，这时只更新进度
+            if result is None or (own_count > 1 and not isinstance(result, (tuple, list))):
+                values = [gr.update()] * output_count
+                values[progress_index] = message
+            else:
+                values = [result] if own_count == 1 else list(result)
+                if status_index is None:
+                    values.append(message)
+            yield tuple(values) if output_count > 1 else values[0]
+
+    handler.__name__ = getattr(fn, "__name__", "handler")
+    handler.__doc__ = fn.__doc__
+    return handler
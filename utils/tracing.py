@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+"""
+流水线追踪与分阶段耗时统计
+
+给各阶段函数（提取文案、仿写、音频、数字人、字幕、BGM、封面、发布）套上追踪，
+按 任务/阶段 记录墙钟时间、CPU时间、峰值内存、GPU显存和读写字节数。
+每个任务结束后导出到 logs/traces/ 下的 JSON 和 Chrome trace 文件
+（chrome://tracing 或 Perfetto 可直接打开），并提供汇总统计。
+
+只有 wall 和 cpu（本线程CPU时间）是按阶段精确测量的。以 process_ 开头的字段是
+整个进程在阶段期间的数值：同时运行的其他阶段（gpu/cpu/network 线程池、流水线调度器）
+的内存、显存和读写也会计入，overlapped_with 列出期间并发运行的阶段，
+有并发时这些数值只能作为上限参考。process_children_cpu 来自 os.times()，
+只统计已退出并被回收的子进程，Windows 上无法获取（为 None）；
+process_peak_gpu 只统计 torch 分配器的显存，ONNX Runtime 等其他框架的占用不包含在内。
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import inspect
+import logging
+import functools
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+TRACE_DIR = os.path.join("logs", "traces")
+SAMPLE_INTERVAL = 0.2
+MAX_SPANS = 5000
+
+_current_job = contextvars.ContextVar("trace_job", default=None)
+_current_span = contextvars.ContextVar("trace_span", default=None)
+
+_spans_lock = threading.Lock()
+_spans = deque(maxlen=MAX_SPANS)
+_active_lock = threading.Lock()
+_active_spans = set()
+_sampler = None
+
+try:
+    import psutil
+
+    _process = psutil.Process()
+except ImportError:
+    psutil = None
+    _process = None
+
+
+def _rss_bytes():
+    if _process is not None:
+        return _process.memory_info().rss
+    if sys.platform.startswith("linux"):
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    return 0
+
+
+def _io_bytes():
+    """进程累计读写字节数"""
+    if _process is not None:
+        try:
+            counters = _process.io_counters()
+            return counters.read_bytes, counters.write_bytes
+        except (AttributeError, OSError):
+            return 0, 0
+    if sys.platform.startswith("linux"):
+        try:
+            values = {}
+            with open("/proc/self/io") as f:
+                for line in f:
+                    key, value = line.split(":")
+                    values[key] = int(value)
+            return values.get("read_bytes", 0), values.get("write_bytes", 0)
+        except OSError:
+            return 0, 0
+    return 0, 0
+
+
+def _gpu_bytes():
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return 0
+    try:
+        if torch.cuda.is_available():
+            return torch.cuda.memory_allocated()
+    except Exception:
+        pass
+    return 0
+
+
+def _children_cpu():
+    """已回收子进程的CPU时间；Windows 上 os.times() 不提供，返回None"""
+    if sys.platform == "win32":
+        return None
+    times = os.times()
+    return times.children_user + times.children_system
+
+
+class Span:
+    """一个阶段的一次执行记录"""
+
+    def __init__(self, job_id, stage, parent):
+        self.job_id = job_id
+        self.stage = stage
+        self.parent = parent
+        self.thread_id = threading.get_ident()
+        self.start_time = time.time()
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.thread_time()
+        self._start_children_cpu = _children_cpu()
+        self._start_io = _io_bytes()
+        self.peak_rss = _rss_bytes()
+        self.peak_gpu = _gpu_bytes()
+        self.overlapped = set()  # 期间在其他线程并发运行的阶段
+        self.record = None
+
+    def sample(self, rss, gpu):
+        if rss > self.peak_rss:
+            self.peak_rss = rss
+        if gpu > self.peak_gpu:
+            self.peak_gpu = gpu
+
+    def finish(self, error=None):
+        self.sample(_rss_bytes(), _gpu_bytes())
+        read_bytes, write_bytes = _io_bytes()
+        children_cpu = _children_cpu()
+        self.record = {
+            "job_id": self.job_id,
+            "stage": self.stage,
+            "parent": self.parent.stage if self.parent else None,
+            "thread": self.thread_id,
+            "start": self.start_time,
+            "wall": time.perf_counter() - self._start_wall,
+            # 本线程CPU时间（按阶段精确）
+            "cpu": time.thread_time() - self._start_cpu,
+            # 以下为整个进程的数值，见模块说明
+            "process_children_cpu": (
+                None if children_cpu is None else children_cpu - self._start_children_cpu
+            ),
+            "process_peak_rss": self.peak_rss,
+            "process_peak_gpu": self.peak_gpu,
+            "process_read_bytes": read_bytes - self._start_io[0],
+            "process_write_bytes": write_bytes - self._start_io[1],
+            "overlapped_with": sorted(self.overlapped),
+            "error": error,
+        }
+        return self.record
+
+
+def _sampler_loop():
+    """后台采样线程：为所有进行中的阶段更新峰值内存/显存"""
+    while True:
+        time.sleep(SAMPLE_INTERVAL)
+        with _active_lock:
+            spans = list(_active_spans)
+        if not spans:
+            continue
+        rss, gpu = _rss_bytes(), _gpu_bytes()
+        for span in spans:
+            span.sample(rss, gpu)
+
+
+def _ensure_sampler():
+    global _sampler
+    with _active_lock:
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sampler_loop, name="trace-sampler", daemon=True)
+            _sampler.start()
+
+
+@contextmanager
+def trace_stage(stage):
+    """追踪一个阶段；不在任务中时自动创建一个以该阶段命名的任务"""
+    job_id = _current_job.get()
+    own_job = job_id is None
+    if own_job:
+        job_id = f"{time.strftime('%Y%m%d_%H%M%S')}_{stage}_{uuid.uuid4().hex[:6]}"
+    parent = _current_span.get()
+
+    _ensure_sampler()
+    span = Span(job_id, stage, parent)
+    job_token = _current_job.set(job_id) if own_job else None
+    span_token = _current_span.set(span)
+    with _active_lock:
+        for other in _active_spans:
+            # 同一线程中的是外层阶段，不算并发
+            if other.thread_id != span.thread_id:
+                other.overlapped.add(stage)
+                span.overlapped.add(other.stage)
+        _active_spans.add(span)
+
+    error = None
+    try:
+        yield span
+    except BaseException as e:
+        error = repr(e)
+        raise
+    finally:
+        with _active_lock:
+            _active_spans.discard(span)
+        _reset(_current_span, span_token)
+        record = span.finish(error)
+        with _spans_lock:
+            _spans.append(record)
+        if own_job:
+            _reset(_current_job, job_token)
+            export_job(job_id)
+
+
+def _reset(var, token):
+    # 生成器可能在另一个线程（另一个Context）中被继续迭代，此时无法按token还原
+    try:
+        var.reset(token)
+    except ValueError:
+        var.set(None)
+
+
+def traced(stage):
+    """阶段追踪装饰器，支持普通函数和生成器函数"""
+
+    def decorator(fn):
+        if getattr(fn, "__traced_stage__", None):
+            return fn
+
+        if inspect.isgeneratorfunction(fn):
+
+            @functools.wraps(fn)
+            def gen_wrapper(*args, **kwargs):
+                with trace_stage(stage):
+                    yield from fn(*args, **kwargs)
+
+            wrapper = gen_wrapper
+        else:
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with trace_stage(stage):
+                    return fn(*args, **kwargs)
+
+        wrapper.__traced_stage__ = stage
+        return wrapper
+
+    return decorator
+
+
+def instrument(stage_functions, decorators=None):
+    """给阶段函数套上追踪，并替换所有已加载模块中对它们的引用
+
+    一键流程在各自模块内部直接调用其他阶段函数（from ... import ...），
+    只替换 app.py 里的名字无法覆盖，所以按对象身份替换所有模块属性。
+
+    Args:
+        stage_functions: {阶段名: 函数}
+        decorators: {阶段名: 装饰器}，在追踪之内再套一层（例如占用GPU名额）
+
+    Returns:
+        dict: {阶段名: 包装后的函数}
+    """
+    decorators = decorators or {}
+    wrapped = {}
+    by_id = {}
+    for stage, fn in stage_functions.items():
+        inner = decorators[stage](fn) if stage in decorators else fn
+        wrapped[stage] = traced(stage)(inner)
+        by_id[id(fn)] = (fn, wrapped[stage])
+
+    for module in list(sys.modules.values()):
+        namespace = getattr(module, "__dict__", None)
+        if not namespace:
+            continue
+        for name, value in list(namespace.items()):
+            entry = by_id.get(id(value))
+            if entry is not None and entry[0] is value:
+                try:
+                    setattr(module, name, entry[1])
+                except (AttributeError, TypeError):
+                    pass
+    return wrapped
+
+
+def get_job_spans(job_id):
+    with _spans_lock:
+        return [record for record in _spans if record["job_id"] == job_id]
+
+
+def to_chrome_trace(records):
+    """转换为 Chrome trace 格式（complete事件，时间单位微秒）"""
+    events = []
+    for record in records:
+        events.append(
+            {
+                "name": record["stage"],
+                "cat": "pipeline",
+                "ph": "X",
+                "ts": int(record["start"] * 1e6),
+                "dur": int(record["wall"] * 1e6),
+                "pid": os.getpid(),
+                "tid": record["thread"],
+                "args": {
+                    key: record[key]
+                    for key in (
+                        "job_id",
+                        "cpu",
+                        "process_children_cpu",
+                        "process_peak_rss",
+                        "process_peak_gpu",
+                        "process_read_bytes",
+                        "process_write_bytes",
+                        "overlapped_with",
+                        "error",
+                    )
+                },
+            }
+        )
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def export_job(job_id, trace_dir=TRACE_DIR):
+    """把一个任务的追踪记录导出为 JSON 和 Chrome trace 文件"""
+    records = get_job_spans(job_id)
+    if not records:
+        return None
+    try:
+        os.makedirs(trace_dir, exist_ok=True)
+        json_path = os.path.join(trace_dir, f"{job_id}.json")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"job_id": job_id, "spans": records}, f, ensure_ascii=False, indent=2)
+        with open(os.path.join(trace_dir, f"{job_id}.trace.json"), "w", encoding="utf-8") as f:
+            json.dump(to_chrome_trace(records), f)
+        return json_path
+    except OSError as e:
+        logger.warning(f"导出追踪记录失败: {e}")
+        return None
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(records):
+    """按阶段汇总追踪记录"""
+    stages = {}
+    for record in records:
+        stages.setdefault(record["stage"], []).append(record)
+
+    summary = {}
+    for stage, items in stages.items():
+        walls = sorted(item["wall"] for item in items)
+        summary[stage] = {
+            "count": len(items),
+            "errors": sum(1 for item in items if item["error"]),
+            "wall_total": sum(walls),
+            "wall_mean": sum(walls) / len(walls),
+            "wall_p50": _percentile(walls, 0.5),
+            "wall_p95": _percentile(walls, 0.95),
+            "cpu_mean": sum(item["cpu"] for item in items) / len(items),
+            # 以下为阶段期间的进程级数值，有并发阶段时包含其他阶段的占用
+            "process_children_cpu_mean": (
+                sum(item["process_children_cpu"] or 0 for item in items) / len(items)
+                if any(item["process_children_cpu"] is not None for item in items)
+                else None
+            ),
+            "process_peak_rss": max(item["process_peak_rss"] for item in items),
+            "process_peak_gpu": max(item["process_peak_gpu"] for item in items),
+            "process_read_bytes": sum(item["process_read_bytes"] for item in items),
+            "process_write_bytes": sum(item["process_write_bytes"] for item in items),
+            "overlapped_runs": sum(1 for item in items if item["overlapped_with"]),
+        }
+    return summary
+
+
+def get_summary():
+    """内存中最近记录的分阶段汇总"""
+    with _spans_lock:
+        records = list(_spans)
+    return {
+        "jobs": len({record["job_id"] for record in records}),
+        "spans": len(records),
+        "stages": summarize(records),
+    }
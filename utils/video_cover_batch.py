@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+批量生成候选封面
+
+generate_cover_image_gui 每次只按 frame_time 抽一帧生成一张封面。这里对视频做
+一次降采样顺序解码，用清晰度/人脸可见度给帧打分，挑出N个候选时间点，
+再逐个交给 generate_cover_image_gui 渲染，候选封面与单张封面的排版完全一致。
+打分结果按视频指纹缓存，同一视频再次生成候选封面时不会重复解码。
+
+发布函数不接受封面路径，附带封面时上传的是 generate_cover_image_gui 最近一次输出的文件。
+逐个渲染候选后这个文件是最后一张候选，select_cover_candidate 把选中的候选复制回去。
+"""
+
+import os
+import json
+import math
+import shutil
+import logging
+import threading
+
+import cv2
+
+from utils.media_cache import video_fingerprint, get_cache_dir
+
+logger = logging.getLogger(__name__)
+
+COVER_OUTPUT_DIR = os.path.join("output", "covers")
+
+# 降采样解码的采样帧数与打分用缩略图宽度
+SAMPLE_FRAMES = 48
+THUMB_WIDTH = 320
+
+_score_cache_lock = threading.Lock()
+_rendered_cover_path = None
+_score_cache = {}
+_face_detector = None
+
+
+def _get_face_detector():
+    global _face_detector
+    if _face_detector is None:
+        cascade_path = os.path.join(
+            cv2.data.haarcascades, "haarcascade_frontalface_default.xml"
+        )
+        _face_detector = cv2.CascadeClassifier(cascade_path)
+    return _face_detector
+
+
+def score_frame(thumb):
+    """给缩略图打分：清晰度 + 人脸可见度 - 过暗/过曝惩罚
+
+    Args:
+        thumb: BGR缩略图
+
+    Returns:
+        dict: sharpness, face, brightness, score
+    """
+    gray = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+    sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    brightness = float(gray.mean()) / 255.0
+
+    face_ratio = 0.0
+    faces = _get_face_detector().detectMultiScale(gray, scaleFactor=1.2, minNeighbors=4)
+    if len(faces):
+        largest = max(w * h for (x, y, w, h) in faces)
+        face_ratio = largest / float(gray.shape[0] * gray.shape[1])
+
+    # 清晰度取对数压缩量级，人脸占比在 0~0.25 之间线性加分
+    score = math.log1p(sharpness) + 4.0 * min(face_ratio, 0.25) / 0.25
+    if brightness < 0.15 or brightness > 0.9:
+        score -= 2.0
+    return {
+        "sharpness": sharpness,
+        "face": face_ratio,
+        "brightness": brightness,
+        "score": score,
+    }
+
+
+def _select_candidates(scores, count, total_frames):
+    """按分数挑选候选帧，并保证候选帧之间有一定时间间隔"""
+    min_gap = max(1, total_frames // max(count * 2, 1))
+    selected = []
+    for item in sorted(scores, key=lambda s: s["score"], reverse=True):
+        if all(abs(item["frame"] - s["frame"]) >= min_gap for s in selected):
+            selected.append(item)
+        if len(selected) >= count:
+            break
+    return selected
+
+
+def _decode_and_score(video_path):
+    """一次顺序解码完成采样和打分
+
+    只对采样帧调用 retrieve()，其余帧只 grab()，避免每个候选帧单独 seek。
+    容器没有帧数信息时（CAP_PROP_FRAME_COUNT 为0）按每秒一帧采样，
+    不对每一帧都做人脸检测。
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"无法打开视频: {video_path}")
+    try:
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or 0
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        if total_frames > 0:
+            step = max(1, total_frames // SAMPLE_FRAMES)
+        else:
+            step = max(1, int(round(fps)))
+
+        scores = []
+        index = 0
+        while True:
+            if not cap.grab():
+                break
+            if index % step == 0:
+                ok, frame = cap.retrieve()
+                if ok:
+                    h, w = frame.shape[:2]
+                    thumb = cv2.resize(
+                        frame,
+                        (THUMB_WIDTH, max(1, int(h * THUMB_WIDTH / w))),
+                        interpolation=cv2.INTER_AREA,
+                    )
+                    item = score_frame(thumb)
+                    item["frame"] = index
+                    item["time"] = index / fps
+                    scores.append(item)
+            index += 1
+    finally:
+        cap.release()
+
+    return scores, index
+
+
+def get_frame_candidates(video_path, count):
+    """获取视频的候选封面帧（打分结果带缓存）
+
+    Args:
+        video_path: 视频路径
+        count: 需要的候选帧数量
+
+    Returns:
+        list: [分数信息dict]（含 frame、time），按分数从高到低排列
+    """
+    fingerprint = video_fingerprint(video_path)
+    index_path = os.path.join(get_cache_dir("covers", fingerprint), "scores.json")
+
+    with _score_cache_lock:
+        cached = _score_cache.get(fingerprint)
+    if cached is None and os.path.exists(index_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    if cached is None:
+        scores, total_frames = _decode_and_score(video_path)
+        cached = {"total_frames": total_frames, "scores": scores}
+        with open(index_path, "w", encoding="utf-8") as f:
+            json.dump(cached, f)
+        logger.info(f"视频 {video_path} 解码打分完成，采样 {len(scores)} 帧")
+
+    with _score_cache_lock:
+        _score_cache[fingerprint] = cached
+    return _select_candidates(cached["scores"], count, cached["total_frames"])
+
+
+def generate_cover_candidates(video_path, count=4, **cover_options):
+    """为视频生成N张候选封面
+
+    每个候选时间点调用一次 generate_cover_image_gui（frame_time 为该时间点），
+    排版与单张封面相同；结果复制到按视频区分的目录，避免被下一次生成覆盖。
+
+    Args:
+        video_path: 视频路径（用于挑选候选帧，应与 generate_cover_image_gui 取帧的视频一致）
+        count: 候选封面数量
+        **cover_options: 透传给 generate_cover_image_gui 的参数（frame_time 除外）
+
+    Returns:
+        list: 候选封面图片路径，按帧分数从高到低排列
+    """
+    from utils.video_cover_image import generate_cover_image_gui
+
+    output_dir = os.path.join(COVER_OUTPUT_DIR, video_fingerprint(video_path))
+    os.makedirs(output_dir, exist_ok=True)
+
+    paths = []
+    for i, info in enumerate(get_frame_candidates(video_path, int(count))):
+        image_path = generate_cover_image_gui(frame_time=round(info["time"], 2), **cover_options)
+        if not image_path or not os.path.exists(image_path):
+            logger.warning(f"第 {i + 1} 张候选封面生成失败（{info['time']:.2f}s）")
+            continue
+        path = os.path.join(
+            output_dir, f"cover_{i + 1}_{info['frame']:06d}{os.path.splitext(image_path)[1] or '.jpg'}"
+        )
+        shutil.copyfile(image_path, path)
+        paths.append(path)
+        remember_rendered_cover(image_path)
+    return paths
+
+
+def remember_rendered_cover(path):
+    """记录 generate_cover_image_gui 最近一次输出的封面（发布时上传的文件）"""
+    global _rendered_cover_path
+    _rendered_cover_path = path
+
+
+def select_cover_candidate(candidate_path):
+    """把选中的候选封面复制到 generate_cover_image_gui 的输出文件
+
+    Args:
+        candidate_path: generate_cover_candidates 返回的候选封面路径
+
+    Returns:
+        str: 发布时实际上传的封面路径；还没有渲染过封面时为候选封面本身
+    """
+    target = _rendered_cover_path
+    if not target:
+        logger.warning("还没有渲染过封面，发布时可能不会使用选中的候选封面")
+        return candidate_path
+    if os.path.abspath(target) != os.path.abspath(candidate_path):
+        shutil.copyfile(candidate_path, target)
+    return target
@@ -0,0 +1,440 @@
+# -*- coding: utf-8 -*-
+"""
+控制节点任务队列（分布式渲染）
+
+控制节点（运行 app.py 的机器）维护任务队列，额外的渲染节点（worker_node.py）
+只运行 GPU/CPU 阶段（语音合成、数字人、转码）：注册后定期心跳，通过HTTP拉取任务，
+下载输入文件、执行、把产物流式上传回控制节点。任务以租约方式分配，
+节点失联或租约超时的任务会重新入队，吞吐可以通过增加节点横向扩展。
+
+接口（挂载在 demo.app 上，前缀 /cluster）:
+    POST /cluster/workers/register            注册节点
+    POST /cluster/workers/{worker_id}/heartbeat  心跳（同时续约正在执行的任务）
+    POST /cluster/workers/{worker_id}/pull    拉取任务（长轮询）
+    GET  /cluster/jobs/{job_id}/inputs/{name}  下载输入文件
+    PUT  /cluster/jobs/{job_id}/artifacts/{name}  上传产物（请求体即文件内容）
+    POST /cluster/jobs/{job_id}/complete      完成
+    POST /cluster/jobs/{job_id}/fail          失败（可重试时重新入队）
+    GET  /cluster/workers                     节点状态
+    GET  /cluster/jobs/{job_id}               任务状态
+
+config.ini 的 [worker] 段必须设置 token，节点请求需带 X-Worker-Token 头；
+未设置 token 时控制节点不挂载 /cluster 路由（见 worker_token_configured）。
+
+REST 接口（utils.rest_api）的语音合成/数字人/转码步骤在有对应阶段的在线节点时
+通过 submit() 提交到这里，由渲染节点执行。排队中的任务在其类型已没有在线节点
+超过 WORKER_TIMEOUT 时按失败结束（orphaned=True），调用方可以改为本机执行。
+"""
+
+import os
+import hmac
+import time
+import uuid
+import shutil
+import logging
+import threading
+from collections import deque
+
+from utils.config_service import get_config
+from utils.media_cache import get_cache_dir
+
+logger = logging.getLogger(__name__)
+
+LEASE_SECONDS = 60
+WORKER_TIMEOUT = 30
+MAX_ATTEMPTS = 3
+PULL_TIMEOUT = 20
+REAP_INTERVAL = 5
+
+QUEUED, LEASED, DONE, FAILED, CANCELLED = "queued", "leased", "done", "failed", "cancelled"
+
+
+class Job:
+    def __init__(self, kind, params, inputs):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.inputs = inputs  # {名称: 本地路径}
+        self.status = QUEUED
+        self.worker_id = None
+        self.lease_expires = None
+        self.attempts = 0
+        self.progress = None
+        self.artifacts = {}  # {名称: 本地路径}
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.updated = self.created
+        self.done_event = threading.Event()
+        self.orphaned = False  # 因没有在线节点而结束
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "inputs": sorted(self.inputs),
+            "status": self.status,
+            "worker_id": self.worker_id,
+            "attempts": self.attempts,
+            "progress": self.progress,
+            "artifacts": sorted(self.artifacts),
+            "result": self.result,
+            "error": self.error,
+            "orphaned": self.orphaned,
+            "created": self.created,
+            "updated": self.updated,
+        }
+
+
+class JobQueue:
+    """带租约的任务队列"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._pending = deque()
+        self._workers = {}
+        self._cond = threading.Condition()
+        self._reaper = threading.Thread(target=self._reap_loop, name="worker-queue-reaper", daemon=True)
+        self._reaper.start()
+
+    def job_dir(self, job_id, kind):
+        return get_cache_dir(os.path.join("jobs", job_id), kind)
+
+    def submit(self, kind, params=None, inputs=None):
+        """提交任务
+
+        Args:
+            kind: 任务类型（节点按类型领取，如 "tts" / "lipsync" / "encode"）
+            params: JSON可序列化的参数
+            inputs: {名称: 本地文件路径}，节点执行前会下载
+
+        Returns:
+            Job
+        """
+        job = Job(kind, params or {}, dict(inputs or {}))
+        with self._cond:
+            self._jobs[job.id] = job
+            self._pending.append(job.id)
+            self._cond.notify_all()
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def wait(self, job_id, timeout=None):
+        job = self._jobs[job_id]
+        job.done_event.wait(timeout)
+        return job
+
+    def cancel(self, job_id):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in (DONE, FAILED, CANCELLED):
+                return False
+            if job.status == QUEUED:
+                self._pending.remove(job_id)
+            self._finish(job, CANCELLED, error="已取消")
+            return True
+
+    def register_worker(self, name, stages, host=None):
+        worker_id = uuid.uuid4().hex[:12]
+        with self._cond:
+            self._workers[worker_id] = {
+                "id": worker_id,
+                "name": name,
+                "stages": list(stages),
+                "host": host,
+                "registered": time.time(),
+                "last_seen": time.time(),
+                "online": True,
+                "current_job": None,
+                "completed": 0,
+                "failed": 0,
+            }
+        logger.info(f"渲染节点已注册: {name} ({worker_id}) 阶段: {', '.join(stages)}")
+        return worker_id
+
+    def heartbeat(self, worker_id, job_id=None, progress=None):
+        """节点心跳；正在执行任务时续约并更新进度
+
+        Returns:
+            bool: 任务是否仍应继续（已取消或租约被收回时为False）
+        """
+        with self._cond:
+            worker = self._workers.get(worker_id)
+            if worker is None:
+                raise KeyError(worker_id)
+            worker["last_seen"] = time.time()
+            worker["online"] = True
+            if job_id is None:
+                return True
+            job = self._jobs.get(job_id)
+            if job is None or job.status != LEASED or job.worker_id != worker_id:
+                return False
+            job.lease_expires = time.time() + LEASE_SECONDS
+            if progress is not None:
+                job.progress = progress
+                job.updated = time.time()
+            return True
+
+    def pull(self, worker_id, timeout=PULL_TIMEOUT):
+        """领取一个该节点支持的任务，没有任务时最多等待 timeout 秒"""
+        deadline = time.time() + timeout
+        with self._cond:
+            worker = self._workers.get(worker_id)
+            if worker is None:
+                raise KeyError(worker_id)
+            while True:
+                worker["last_seen"] = time.time()
+                for job_id in self._pending:
+                    job = self._jobs[job_id]
+                    if job.kind in worker["stages"]:
+                        self._pending.remove(job_id)
+                        job.status = LEASED
+                        job.worker_id = worker_id
+                        job.attempts += 1
+                        job.lease_expires = time.time() + LEASE_SECONDS
+                        job.updated = time.time()
+                        worker["current_job"] = job_id
+                        return job
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def _check_lease(self, job_id, worker_id):
+        job = self._jobs.get(job_id)
+        if job is None or job.status != LEASED or job.worker_id != worker_id:
+            raise PermissionError("任务租约已失效")
+        return job
+
+    def check_lease(self, job_id, worker_id):
+        """确认节点仍持有任务租约（上传产物前调用，租约失效时抛出 PermissionError）"""
+        with self._cond:
+            self._check_lease(job_id, worker_id)
+
+    def has_worker(self, kind):
+        """是否有支持该任务类型的在线节点"""
+        with self._cond:
+            return any(w["online"] and kind in w["stages"] for w in self._workers.values())
+
+    def save_artifact(self, job_id, worker_id, name, uploaded_path):
+        """登记节点上传的产物
+
+        Args:
+            uploaded_path: 已写完的上传临时文件（与产物目录在同一磁盘），原子移动到产物目录
+        """
+        with self._cond:
+            job = self._check_lease(job_id, worker_id)
+            path = os.path.join(self.job_dir(job_id, "artifacts"), os.path.basename(name))
+            os.replace(uploaded_path, path)
+            job.artifacts[os.path.basename(name)] = path
+            job.lease_expires = time.time() + LEASE_SECONDS
+        return path
+
+    def complete(self, job_id, worker_id, result=None):
+        with self._cond:
+            job = self._check_lease(job_id, worker_id)
+            job.result = result
+            job.error = None
+            self._finish(job, DONE)
+            worker = self._workers.get(worker_id)
+            if worker:
+                worker["completed"] += 1
+                worker["current_job"] = None
+
+    def fail(self, job_id, worker_id, error, retry=True):
+        """任务失败；可重试且未超过次数时重新入队"""
+        with self._cond:
+            job = self._check_lease(job_id, worker_id)
+            worker = self._workers.get(worker_id)
+            if worker:
+                worker["failed"] += 1
+                worker["current_job"] = None
+            self._requeue_or_fail(job, error, retry)
+
+    def _requeue_or_fail(self, job, error, retry=True):
+        job.error = error
+        if retry and job.attempts < MAX_ATTEMPTS:
+            logger.warning(f"任务 {job.id} ({job.kind}) 重新入队: {error}")
+            job.status = QUEUED
+            job.worker_id = None
+            job.lease_expires = None
+            job.updated = time.time()
+            self._pending.appendleft(job.id)
+            self._cond.notify_all()
+        else:
+            self._finish(job, FAILED, error=error)
+
+    def _finish(self, job, status, error=None):
+        job.status = status
+        if error is not None:
+            job.error = error
+        job.lease_expires = None
+        job.updated = time.time()
+        job.done_event.set()
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(REAP_INTERVAL)
+            self.reap()
+
+    def reap(self, now=None):
+        """回收超时的租约，标记失联的节点，结束没有节点可领取的排队任务（后台线程定期调用）"""
+        now = time.time() if now is None else now
+        with self._cond:
+            for worker in self._workers.values():
+                if worker["online"] and now - worker["last_seen"] > WORKER_TIMEOUT:
+                    worker["online"] = False
+                    logger.warning(f"渲染节点失联: {worker['name']} ({worker['id']})")
+            for job in self._jobs.values():
+                if job.status == LEASED and job.lease_expires and job.lease_expires < now:
+                    worker = self._workers.get(job.worker_id)
+                    if worker and worker["current_job"] == job.id:
+                        worker["current_job"] = None
+                    self._requeue_or_fail(job, "租约超时")
+            online = {
+                kind for w in self._workers.values() if w["online"] for kind in w["stages"]
+            }
+            for job_id in list(self._pending):
+                job = self._jobs[job_id]
+                if job.kind not in online and now - job.updated > WORKER_TIMEOUT:
+                    self._pending.remove(job_id)
+                    job.orphaned = True
+                    self._finish(job, FAILED, error=f"没有在线的 {job.kind} 渲染节点")
+
+    def list_workers(self):
+        with self._cond:
+            return [dict(w) for w in self._workers.values()]
+
+    def cleanup(self, job_id):
+        """删除任务及其文件"""
+        with self._cond:
+            self._jobs.pop(job_id, None)
+        shutil.rmtree(os.path.join(get_cache_dir("jobs"), job_id), ignore_errors=True)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
+
+
+def worker_token_configured():
+    """config.ini 的 [worker] 段是否设置了节点令牌"""
+    return bool(get_config().get("worker", "token"))
+
+
+def create_worker_router(queue=None):
+    """创建控制节点的 FastAPI 路由（调用方应先确认已设置节点令牌）"""
+    from fastapi import APIRouter, Body, Depends, Header, HTTPException, Request
+    from fastapi.responses import FileResponse
+    from starlette.concurrency import run_in_threadpool
+
+    queue = queue or get_job_queue()
+
+    def check_token(x_worker_token: str = Header(default=None)):
+        # 每次请求读取当前快照，修改令牌后无需重启；令牌被删除后拒绝所有请求
+        token = get_config().get("worker", "token")
+        if not token:
+            raise HTTPException(status_code=403, detail="控制节点未设置节点令牌")
+        if not x_worker_token or not hmac.compare_digest(x_worker_token, token):
+            raise HTTPException(status_code=401, detail="无效的节点令牌")
+
+    router = APIRouter(prefix="/cluster", dependencies=[Depends(check_token)])
+
+    # 以下阻塞型接口用普通函数定义，FastAPI 会放到线程池执行
+    @router.post("/workers/register")
+    def register(payload: dict = Body(...)):
+        worker_id = queue.register_worker(
+            payload.get("name") or "worker", payload.get("stages") or [], payload.get("host")
+        )
+        return {"worker_id": worker_id, "lease_seconds": LEASE_SECONDS, "heartbeat_seconds": WORKER_TIMEOUT / 3}
+
+    @router.post("/workers/{worker_id}/heartbeat")
+    def heartbeat(worker_id: str, payload: dict = Body(default={})):
+        try:
+            keep = queue.heartbeat(worker_id, payload.get("job_id"), payload.get("progress"))
+        except KeyError:
+            raise HTTPException(status_code=404, detail="节点未注册")
+        return {"continue": keep}
+
+    @router.post("/workers/{worker_id}/pull")
+    def pull(worker_id: str, timeout: float = PULL_TIMEOUT):
+        try:
+            job = queue.pull(worker_id, min(timeout, PULL_TIMEOUT))
+        except KeyError:
+            raise HTTPException(status_code=404, detail="节点未注册")
+        return {"job": job.to_dict() if job else None}
+
+    @router.get("/workers")
+    def workers():
+        return {"workers": queue.list_workers()}
+
+    @router.get("/jobs/{job_id}")
+    def job_status(job_id: str):
+        job = queue.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="任务不存在")
+        return job.to_dict()
+
+    @router.get("/jobs/{job_id}/inputs/{name}")
+    def job_input(job_id: str, name: str):
+        job = queue.get(job_id)
+        if job is None or name not in job.inputs:
+            raise HTTPException(status_code=404, detail="输入文件不存在")
+        return FileResponse(job.inputs[name], filename=os.path.basename(job.inputs[name]))
+
+    @router.put("/jobs/{job_id}/artifacts/{name}")
+    async def upload_artifact(job_id: str, name: str, request: Request, worker_id: str):
+        if queue.get(job_id) is None:
+            raise HTTPException(status_code=404, detail="任务不存在")
+        # 先确认租约，失效的节点不能往任务目录写任何东西
+        try:
+            queue.check_lease(job_id, worker_id)
+        except PermissionError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+
+        # 请求体按块写入文件，不在内存中缓存整个产物；磁盘读写放到线程池，不阻塞事件循环
+        artifacts_dir = await run_in_threadpool(queue.job_dir, job_id, "artifacts")
+        tmp_path = os.path.join(artifacts_dir, f".{uuid.uuid4().hex}.upload")
+        f = await run_in_threadpool(open, tmp_path, "wb")
+        try:
+            try:
+                async for chunk in request.stream():
+                    await run_in_threadpool(f.write, chunk)
+            finally:
+                await run_in_threadpool(f.close)
+            path = await run_in_threadpool(queue.save_artifact, job_id, worker_id, name, tmp_path)
+            size = await run_in_threadpool(os.path.getsize, path)
+        except PermissionError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        finally:
+            if os.path.exists(tmp_path):
+                await run_in_threadpool(os.remove, tmp_path)
+        return {"name": os.path.basename(path), "size": size}
+
+    @router.post("/jobs/{job_id}/complete")
+    def complete(job_id: str, payload: dict = Body(...)):
+        try:
+            queue.complete(job_id, payload["worker_id"], payload.get("result"))
+        except PermissionError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        return {"ok": True}
+
+    @router.post("/jobs/{job_id}/fail")
+    def fail(job_id: str, payload: dict = Body(...)):
+        try:
+            queue.fail(job_id, payload["worker_id"], payload.get("error") or "未知错误", payload.get("retry", True))
+        except PermissionError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        return {"ok": True}
+
+    return router
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+字体列表缓存
+
+subtitle_utils 导入时会枚举并解析全部系统字体生成 FONT_FAMILIES，字体多的机器上会拖慢
+app.py 启动。字幕和封面渲染只认这个列表里的名称，所以这里不自己解析字体，而是把
+subtitle_utils.FONT_FAMILIES 连同生成时各字体目录与文件的 [mtime, 大小] 缓存到
+cache/font_index.json：字体未变化时直接用缓存的列表，不导入 subtitle_utils；
+字体有变化或没有缓存时导入一次 subtitle_utils 并更新缓存。
+
+导入 subtitle_utils 的那次扫描仍会在第一次添加字幕时发生，warm_up_renderer()
+在后台线程中提前导入，不占用启动和第一次请求的时间。
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+FONT_INDEX_PATH = os.path.join("cache", "font_index.json")
+FONT_INDEX_VERSION = 2
+
+FONT_EXTENSIONS = (".ttf", ".otf", ".ttc", ".otc")
+
+_lock = threading.Lock()
+_font_families = None
+
+
+def get_font_dirs():
+    """返回需要扫描的字体目录列表（仅包含存在的目录）"""
+    dirs = [os.path.abspath("fonts")]
+    if sys.platform == "win32":
+        windir = os.environ.get("WINDIR", r"C:\Windows")
+        dirs.append(os.path.join(windir, "Fonts"))
+        local_appdata = os.environ.get("LOCALAPPDATA")
+        if local_appdata:
+            dirs.append(os.path.join(local_appdata, "Microsoft", "Windows", "Fonts"))
+    elif sys.platform == "darwin":
+        dirs.extend(
+            [
+                "/System/Library/Fonts",
+                "/Library/Fonts",
+                os.path.expanduser("~/Library/Fonts"),
+            ]
+        )
+    else:
+        dirs.extend(
+            [
+                "/usr/share/fonts",
+                "/usr/local/share/fonts",
+                os.path.expanduser("~/.fonts"),
+                os.path.expanduser("~/.local/share/fonts"),
+            ]
+        )
+    return [d for d in dirs if os.path.isdir(d)]
+
+
+def _scan_font_files(font_dirs):
+    """遍历字体目录
+
+    Returns:
+        tuple: ({目录: mtime}, {字体文件路径: [mtime, size]})
+    """
+    dir_mtimes = {}
+    file_stats = {}
+    for font_dir in font_dirs:
+        for root, dirs, files in os.walk(font_dir):
+            try:
+                dir_mtimes[root] = os.stat(root).st_mtime
+            except OSError:
+                continue
+            for file in files:
+                if not file.lower().endswith(FONT_EXTENSIONS):
+                    continue
+                path = os.path.join(root, file)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                file_stats[path] = [st.st_mtime, st.st_size]
+    return dir_mtimes, file_stats
+
+
+def _load_cached_index(index_path):
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != FONT_INDEX_VERSION:
+            return None
+        return data
+    except (OSError, ValueError):
+        return None
+
+
+def _index_unchanged(cached, font_dirs):
+    """缓存是否仍然有效
+
+    新增/删除字体文件会改变所在目录的mtime；原地覆盖同名字体文件不会，
+    所以还要逐个比较缓存中字体文件的 [mtime, size]（只stat，不解析字体）。
+    """
+    cached_dirs = cached["dirs"]
+    if not set(font_dirs) <= set(cached_dirs):
+        return False
+    for directory, mtime in cached_dirs.items():
+        if not any(directory.startswith(font_dir) for font_dir in font_dirs):
+            return False
+        try:
+            if os.stat(directory).st_mtime != mtime:
+                return False
+        except OSError:
+            return False
+    for path, stat in cached["files"].items():
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        if [st.st_mtime, st.st_size] != stat:
+            return False
+    return True
+
+
+def _renderer_families():
+    """字幕/封面渲染接受的字体名称（导入 subtitle_utils，会触发它的字体扫描）"""
+    from video_tools.subtitle_utils import FONT_FAMILIES
+
+    return list(FONT_FAMILIES)
+
+
+def load_font_families(font_dirs=None, index_path=FONT_INDEX_PATH, force=False):
+    """加载字体名称列表，字体未变化时使用缓存
+
+    Args:
+        font_dirs: 字体目录列表，默认使用系统字体目录
+        index_path: 缓存文件路径
+        force: 是否忽略缓存，重新从 subtitle_utils 获取
+
+    Returns:
+        list: 字体名称列表，与 subtitle_utils.FONT_FAMILIES 一致
+    """
+    font_dirs = font_dirs if font_dirs is not None else get_font_dirs()
+    cached = None if force else _load_cached_index(index_path)
+    if cached and _index_unchanged(cached, font_dirs):
+        return cached["families"]
+
+    start = time.time()
+    dir_mtimes, file_stats = _scan_font_files(font_dirs)
+    families = _renderer_families()
+    try:
+        os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": FONT_INDEX_VERSION,
+                    "dirs": dir_mtimes,
+                    "files": file_stats,
+                    "families": families,
+                },
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_path, index_path)
+    except OSError as e:
+        logger.warning(f"写入字体列表缓存失败: {e}")
+
+    logger.info(f"字体列表已更新: {len(families)} 个字体，耗时 {time.time() - start:.2f}s")
+    return families
+
+
+def get_font_families(refresh=False):
+    """字体下拉框使用的字体名称列表（进程内共享）"""
+    global _font_families
+    with _lock:
+        if _font_families is None or refresh:
+            _font_families = load_font_families(force=refresh)
+        return _font_families
+
+
+def warm_up_renderer():
+    """在后台线程中导入 subtitle_utils，让它的字体扫描不落在第一次添加字幕的请求上"""
+    if "video_tools.subtitle_utils" in sys.modules:
+        return
+
+    def target():
+        try:
+            _renderer_families()
+        except Exception as e:
+            logger.warning(f"预加载字幕模块失败: {e}")
+
+    threading.Thread(target=target, name="subtitle-warm-up", daemon=True).start()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+一次渲染、多平台输出
+
+各平台对上传视频的要求不同（码率上限、分辨率、画面比例），
+草稿预览只需要720p。这里用一个ffmpeg进程完成：输入只解码一次，
+通过 split 滤镜分成多路，每路各自缩放/补边后送入独立的编码输出，
+所有平台版本的成本约等于一次解码加各自编码。
+
+通过 REST 接口（transcode 任务）执行时，各平台版本作为产物 "variants.<平台>.mp4"
+提供下载，本机执行与渲染节点执行的命名一致。
+"""
+
+import os
+import logging
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+# 各平台输出规格：分辨率、码率上限、帧率；尺寸按比例缩放后居中补边
+PLATFORM_VARIANTS = {
+    "DY": {"label": "抖音", "width": 1080, "height": 1920, "bitrate": "8M", "fps": 30},
+    "XHS": {"label": "小红书", "width": 1080, "height": 1440, "bitrate": "6M", "fps": 30},
+    "SPH": {"label": "视频号", "width": 1080, "height": 1920, "bitrate": "5M", "fps": 30},
+    "draft": {"label": "草稿预览", "width": 720, "height": 1280, "bitrate": "2M", "fps": 25},
+}
+
+
+def variant_path(video_path, platform):
+    stem, _ = os.path.splitext(video_path)
+    return f"{stem}_{platform}.mp4"
+
+
+def build_transcode_command(video_path, outputs):
+    """生成单进程多路输出的ffmpeg命令
+
+    Args:
+        video_path: 源视频
+        outputs: [(规格字典, 输出路径)]
+
+    Returns:
+        list: ffmpeg 命令参数
+    """
+    count = len(outputs)
+    labels = "".join(f"[s{i}]" for i in range(count))
+    filters = [f"[0:v]split={count}{labels}"]
+    for i, (spec, _) in enumerate(outputs):
+        w, h = spec["width"], spec["height"]
+        filters.append(
+            f"[s{i}]scale={w}:{h}:force_original_aspect_ratio=decrease,"
+            f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={spec['fps']}[v{i}]"
+        )
+
+    cmd = [
+        "ffmpeg", "-y", "-nostdin", "-loglevel", "error",
+        "-i", video_path,
+        "-filter_complex", ";".join(filters),
+    ]
+    for i, (spec, output_path) in enumerate(outputs):
+        bitrate = spec["bitrate"]
+        cmd += [
+            "-map", f"[v{i}]", "-map", "0:a?",
+            "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+            "-b:v", bitrate, "-maxrate", bitrate, "-bufsize", bitrate,
+            "-c:a", "aac", "-b:a", "128k",
+            "-movflags", "+faststart",
+            output_path,
+        ]
+    return cmd
+
+
+def transcode_variants(video_path, platforms=None):
+    """把一个渲染结果转码为多个平台版本
+
+    已存在且比源文件新的版本直接复用。
+
+    Args:
+        video_path: 源视频
+        platforms: 平台列表（或逗号分隔的字符串），默认 PLATFORM_VARIANTS 中的全部
+
+    Returns:
+        dict: {平台: 输出路径}
+    """
+    if isinstance(platforms, str):
+        platforms = [p.strip() for p in platforms.split(",") if p.strip()]
+    platforms = platforms or list(PLATFORM_VARIANTS)
+    unknown = [p for p in platforms if p not in PLATFORM_VARIANTS]
+    if unknown:
+        raise ValueError(f"未知平台: {', '.join(unknown)}（可选 {', '.join(PLATFORM_VARIANTS)}）")
+    source_mtime = os.path.getmtime(video_path)
+    results = {}
+    outputs = []
+    for platform in platforms:
+        path = variant_path(video_path, platform)
+        results[platform] = path
+        if os.path.exists(path) and os.path.getmtime(path) >= source_mtime:
+            continue
+        outputs.append((PLATFORM_VARIANTS[platform], path))
+
+    if outputs:
+        cmd = build_transcode_command(video_path, outputs)
+        result = subprocess.run(cmd, capture_output=True)
+        if result.returncode != 0:
+            raise RuntimeError(
+                f"多平台转码失败: {result.stderr.decode('utf-8', errors='ignore')[-500:]}"
+            )
+        missing = [path for _, path in outputs if not os.path.exists(path)]
+        if missing:
+            raise RuntimeError(f"多平台转码未生成: {', '.join(missing)}")
+        logger.info(f"多平台转码完成: {', '.join(platforms)}")
+    return results
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+发布前检查
+
+各平台发布函数驱动的是网页上传表单，文件过大、编码不支持
+往往要等整个文件传完才报错，只能手动重新点击。这里在上传前用ffprobe
+本地检查封装格式、编码、时长、大小和封面尺寸，不符合平台限制直接返回。
+
+检查的是发布时实际上传的文件：视频为传给发布函数的路径（多平台转码时为各平台的转码结果），
+封面为 generate_cover_image_gui 的输出文件（封面预览显示的就是它，
+选择候选封面时会先复制过去，见 video_cover_batch.select_cover_candidate）。
+
+发布失败不自动重试：发布函数内部无法区分超时发生在点击发布之前还是之后，
+提交后重试会重复发布同一个作品。断点续传也没有实现：上传由发布函数驱动网页表单完成，
+没有可以接管上传过程的接口。
+"""
+
+import os
+import json
+import logging
+import functools
+import subprocess
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+# 各平台网页上传限制（按创作者中心上传说明，平台调整时在此修改）
+PLATFORM_LIMITS = {
+    "DY": {
+        "label": "抖音",
+        "formats": {"mp4", "mov", "webm"},
+        "video_codecs": {"h264", "hevc"},
+        "max_size_mb": 16 * 1024,
+        "max_duration_s": 60 * 60,
+        "min_duration_s": 1,
+        "cover_min_size": (540, 720),
+    },
+    "XHS": {
+        "label": "小红书",
+        "formats": {"mp4", "mov"},
+        "video_codecs": {"h264", "hevc"},
+        "max_size_mb": 20 * 1024,
+        "max_duration_s": 60 * 60,
+        "min_duration_s": 1,
+        "cover_min_size": (540, 720),
+    },
+    "SPH": {
+        "label": "视频号",
+        "formats": {"mp4", "mov"},
+        "video_codecs": {"h264", "hevc"},
+        "max_size_mb": 20 * 1024,
+        "max_duration_s": 60 * 60,
+        "min_duration_s": 3,
+        "cover_min_size": (540, 720),
+    },
+}
+
+def probe_video(video_path):
+    """用ffprobe读取封装格式、视频编码和时长"""
+    cmd = [
+        "ffprobe", "-v", "error",
+        "-show_entries", "format=format_name,duration:stream=codec_type,codec_name,width,height",
+        "-of", "json", video_path,
+    ]
+    result = subprocess.run(cmd, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode("utf-8", errors="ignore")[-300:])
+    info = json.loads(result.stdout or b"{}")
+    fmt = info.get("format", {})
+    video = next((s for s in info.get("streams", []) if s.get("codec_type") == "video"), {})
+    return {
+        # mov,mp4,m4a,3gp,3g2,mj2 这类组合名拆成集合
+        "formats": set(fmt.get("format_name", "").split(",")),
+        "duration": float(fmt.get("duration") or 0),
+        "video_codec": video.get("codec_name"),
+        "width": video.get("width"),
+        "height": video.get("height"),
+    }
+
+
+def preflight(video_path, platform, cover_path=None):
+    """检查视频（和封面）是否满足平台上传限制
+
+    Returns:
+        list: 问题描述列表，为空表示检查通过
+    """
+    limits = PLATFORM_LIMITS[platform]
+    if not video_path or not os.path.exists(video_path):
+        return ["视频文件不存在"]
+
+    problems = []
+    size_mb = os.path.getsize(video_path) / 1024 / 1024
+    if size_mb > limits["max_size_mb"]:
+        problems.append(f"文件大小 {size_mb:.0f}MB 超过上限 {limits['max_size_mb']}MB")
+
+    try:
+        info = probe_video(video_path)
+    except Exception as e:
+        problems.append(f"无法解析视频: {e}")
+        return problems
+    if not info["formats"] & limits["formats"]:
+        problems.append(f"不支持的封装格式 {','.join(sorted(info['formats']))}")
+    if info["video_codec"] not in limits["video_codecs"]:
+        problems.append(f"不支持的视频编码 {info['video_codec']}")
+    if info["duration"] > limits["max_duration_s"]:
+        problems.append(f"时长 {info['duration']:.0f}秒 超过上限 {limits['max_duration_s']}秒")
+    if info["duration"] < limits["min_duration_s"]:
+        problems.append(f"时长 {info['duration']:.1f}秒 过短")
+
+    if cover_path:
+        cover = cv2.imread(cover_path)
+        if cover is None:
+            problems.append("封面图片无法读取")
+        else:
+            min_w, min_h = limits["cover_min_size"]
+            h, w = cover.shape[:2]
+            if w < min_w or h < min_h:
+                problems.append(f"封面尺寸 {w}x{h} 小于 {min_w}x{min_h}")
+    return problems
+
+
+def checked_publisher(platform, publish_fn):
+    """给发布函数加上发布前检查
+
+    Args:
+        platform: PLATFORM_LIMITS 中的平台
+        publish_fn: 发布函数，参数为 (视频路径, 文案, 是否附带封面)
+
+    Returns:
+        function: 包装后的发布函数，额外接受 cover_path（发布时上传的封面，附带封面时检查）
+    """
+    label = PLATFORM_LIMITS[platform]["label"]
+
+    @functools.wraps(publish_fn)
+    def wrapper(video_path, text, with_cover, cover_path=None):
+        problems = preflight(video_path, platform, cover_path if with_cover else None)
+        if problems:
+            message = f"{label}发布前检查未通过: " + "；".join(problems)
+            logger.warning(message)
+            return message
+        return publish_fn(video_path, text, with_cover)
+
+    return wrapper
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+渲染节点
+
+在额外的GPU/CPU机器上运行，只执行渲染阶段（语音合成、数字人、转码），
+从控制节点（运行 app.py 的机器）拉取任务，产物流式上传回控制节点。
+节点失联或任务租约超时时，控制节点会把任务重新分配给其他节点。
+
+用法:
+    python worker_node.py --control http://192.168.1.10:7860 --stages tts,lipsync
+    python worker_node.py --control http://127.0.0.1:7860 --stages encode --concurrency 2
+
+节点需要与控制节点相同的项目文件（数字人模型、音色文件、编译模块等），
+任务参数中的模型/音色名称按节点本地路径解析。
+"""
+
+import os
+import time
+import socket
+import shutil
+import argparse
+import tempfile
+import threading
+import traceback
+
+import requests
+
+REQUEST_TIMEOUT = 30
+PULL_TIMEOUT = 20
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class JobCancelled(Exception):
+    """控制节点已收回任务（取消或租约失效）"""
+
+
+def run_tts(params, inputs, work_dir):
+    from utils.voice_processor import handle_audio_creation
+
+    audio_path, status = handle_audio_creation(
+        params["text"], params.get("voice"), params.get("speed", 1)
+    )
+    if not audio_path or not os.path.exists(audio_path):
+        raise RuntimeError(status or "音频生成失败")
+    return {"status": status}, {"audio" + os.path.splitext(audio_path)[1]: audio_path}
+
+
+def run_lipsync(params, inputs, work_dir):
+    from video_tools.generate_video import generate_tuilionnx_video
+
+    outputs = generate_tuilionnx_video(
+        params.get("face"),
+        inputs.get("video") or params.get("video"),
+        inputs["audio"],
+        params.get("batch_size", 4),
+        params.get("sync_offset", 0),
+        params.get("scale_h", 1.6),
+        params.get("scale_w", 3.6),
+        params.get("compress", False),
+        params.get("beautify_teeth", False),
+        params.get("silence", False),
+        params.get("watermark", True),
+        inputs.get("background_image") or params.get("background_image"),
+        params.get("background_image_list"),
+        params.get("replace_background", False),
+    )
+    video_path = outputs[0]
+    if not video_path or not os.path.exists(video_path):
+        raise RuntimeError(f"数字人视频生成失败: {outputs}")
+    return {"time": outputs[1]}, {"video" + os.path.splitext(video_path)[1]: video_path}
+
+
+def run_encode(params, inputs, work_dir):
+    from video_tools.transcode_variants import transcode_variants
+
+    results = transcode_variants(inputs["video"], params.get("platforms"))
+    return (
+        {"platforms": sorted(results)},
+        {f"variants.{platform}{os.path.splitext(path)[1]}": path for platform, path in results.items()},
+    )
+
+
+# 任务类型 → 处理函数 (params, 输入文件, 工作目录) → (结果, {产物名: 本地路径})
+HANDLERS = {
+    "tts": run_tts,
+    "lipsync": run_lipsync,
+    "encode": run_encode,
+}
+
+
+class WorkerNode:
+    def __init__(self, control_url, stages, name, token=None):
+        self.control_url = control_url.rstrip("/")
+        self.stages = stages
+        self.name = name
+        self.session = requests.Session()
+        if token:
+            self.session.headers["X-Worker-Token"] = token
+        self.worker_id = None
+        self.heartbeat_seconds = 10
+        self.current_job = None
+        self.progress = None
+        self.cancelled = threading.Event()
+        self.stopped = threading.Event()
+
+    def _url(self, path):
+        return f"{self.control_url}/cluster{path}"
+
+    def _post(self, path, timeout=REQUEST_TIMEOUT, **kwargs):
+        response = self.session.post(self._url(path), timeout=timeout, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def register(self):
+        data = self._post(
+            "/workers/register",
+            json={"name": self.name, "stages": self.stages, "host": socket.gethostname()},
+        )
+        self.worker_id = data["worker_id"]
+        self.heartbeat_seconds = data.get("heartbeat_seconds", self.heartbeat_seconds)
+        print(f"✅ [{self.name}] 已注册到 {self.control_url}，节点ID: {self.worker_id}")
+
+    def _heartbeat_loop(self):
+        while not self.stopped.wait(self.heartbeat_seconds):
+            try:
+                data = self._post(
+                    f"/workers/{self.worker_id}/heartbeat",
+                    json={"job_id": self.current_job, "progress": self.progress},
+                )
+                if self.current_job and not data.get("continue", True):
+                    self.cancelled.set()
+            except requests.HTTPError as e:
+                if e.response is not None and e.response.status_code == 404:
+                    # 控制节点重启后节点信息丢失，重新注册
+                    print(f"⚠️ [{self.name}] 控制节点不认识本节点，重新注册")
+                    self.register()
+            except requests.RequestException as e:
+                print(f"⚠️ [{self.name}] 心跳失败: {e}")
+
+    def _download_inputs(self, job, work_dir):
+        inputs = {}
+        for name in job["inputs"]:
+            path = os.path.join(work_dir, "inputs", name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with self.session.get(
+                self._url(f"/jobs/{job['id']}/inputs/{name}"), stream=True, timeout=REQUEST_TIMEOUT
+            ) as response:
+                response.raise_for_status()
+                # 保留原文件扩展名，处理函数可能依赖扩展名判断格式
+                filename = response.headers.get("content-disposition", "")
+                ext = os.path.splitext(filename.split("filename=")[-1].strip('"'))[1]
+                path += ext
+                with open(path, "wb") as f:
+                    shutil.copyfileobj(response.raw, f, UPLOAD_CHUNK_SIZE)
+            inputs[name] = path
+        return inputs
+
+    def _upload(self, job_id, name, path):
+        def chunks():
+            with open(path, "rb") as f:
+                yield from iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b"")
+
+        response = self.session.put(
+            self._url(f"/jobs/{job_id}/artifacts/{name}"),
+            params={"worker_id": self.worker_id},
+            data=chunks(),
+            timeout=REQUEST_TIMEOUT,
+        )
+        if response.status_code == 409:
+            raise JobCancelled(response.json().get("detail"))
+        response.raise_for_status()
+
+    def run_job(self, job):
+        handler = HANDLERS[job["kind"]]
+        self.current_job, self.progress = job["id"], "下载输入"
+        self.cancelled.clear()
+        work_dir = tempfile.mkdtemp(prefix=f"job_{job['id'][:8]}_")
+        try:
+            inputs = self._download_inputs(job, work_dir)
+            self.progress = "执行中"
+            result, artifacts = handler(job["params"], inputs, work_dir)
+            if self.cancelled.is_set():
+                raise JobCancelled("任务已被控制节点收回")
+            self.progress = "上传产物"
+            for name, path in artifacts.items():
+                self._upload(job["id"], name, path)
+            self._post(f"/jobs/{job['id']}/complete", json={"worker_id": self.worker_id, "result": result})
+            print(f"✅ [{self.name}] 任务完成: {job['kind']} {job['id']}")
+        except JobCancelled as e:
+            print(f"⏹️ [{self.name}] 任务 {job['id']} 已收回: {e}")
+        except Exception as e:
+            print(f"❌ [{self.name}] 任务失败: {job['kind']} {job['id']}: {e}")
+            traceback.print_exc()
+            try:
+                # 缺少模块的节点重试也没用，直接标记失败
+                self._post(
+                    f"/jobs/{job['id']}/fail",
+                    json={"worker_id": self.worker_id, "error": str(e), "retry": not isinstance(e, ImportError)},
+                )
+            except requests.RequestException as report_error:
+                print(f"⚠️ [{self.name}] 上报失败状态出错: {report_error}")
+        finally:
+            self.current_job = self.progress = None
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def serve(self):
+        while not self.stopped.is_set():
+            try:
+                self.register()
+                break
+            except requests.RequestException as e:
+                print(f"⏳ [{self.name}] 无法连接控制节点: {e}，5秒后重试")
+                time.sleep(5)
+        threading.Thread(target=self._heartbeat_loop, daemon=True).start()
+
+        while not self.stopped.is_set():
+            try:
+                data = self._post(
+                    f"/workers/{self.worker_id}/pull",
+                    params={"timeout": PULL_TIMEOUT},
+                    timeout=PULL_TIMEOUT + REQUEST_TIMEOUT,
+                )
+            except requests.RequestException as e:
+                print(f"⚠️ [{self.name}] 拉取任务失败: {e}")
+                time.sleep(5)
+                continue
+            if data.get("job"):
+                print(f"🎬 [{self.name}] 领取任务: {data['job']['kind']} {data['job']['id']}")
+                self.run_job(data["job"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="分布式渲染节点")
+    parser.add_argument("--control", required=True, help="控制节点地址，例如 http://192.168.1.10:7860")
+    parser.add_argument(
+        "--stages", default=",".join(HANDLERS), help=f"本节点执行的阶段，逗号分隔（{', '.join(HANDLERS)}）"
+    )
+    parser.add_argument("--name", default=socket.gethostname(), help="节点名称")
+    parser.add_argument("--concurrency", type=int, default=1, help="同时执行的任务数（每个并发单独注册）")
+    parser.add_argument("--token", default=os.environ.get("WORKER_TOKEN"), help="控制节点 [worker] token")
+    args = parser.parse_args(argv)
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in stages if s not in HANDLERS]
+    if unknown:
+        parser.error(f"未知阶段: {', '.join(unknown)}")
+
+    print("🚀 启动渲染节点")
+    print(f"   控制节点: {args.control}")
+    print(f"   阶段: {', '.join(stages)}  并发: {args.concurrency}")
+    nodes = [
+        WorkerNode(
+            args.control,
+            stages,
+            args.name if args.concurrency == 1 else f"{args.name}-{i}",
+            args.token,
+        )
+        for i in range(1, args.concurrency + 1)
+    ]
+    threads = [threading.Thread(target=node.serve, daemon=True) for node in nodes]
+    for thread in threads:
+        thread.start()
+    try:
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("👋 正在停止渲染节点...")
+        for node in nodes:
+            node.stopped.set()
+
+
+if __name__ == "__main__":
+    main()